@@ -0,0 +1,100 @@
+import asyncio
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+from Log import Log
+
+
+class AsyncEngine:
+    def __init__(self, scrape: Callable, insert: Callable, log: Log, concurrency: int = 16,
+                 report_interval: float = 1.0, on_failure: Callable = None):
+        """An asyncio-based engine that keeps a bounded number of page fetches in flight from a single process and feeds
+        the scraped items into an insert function.
+
+        Fetches run on a dedicated thread pool (one thread per in-flight fetch) while inserts run on the event loop
+        thread, so the database connection is only ever used by one thread. Item ids that already exist in the database
+        should be filtered out beforehand.
+
+        Args:
+            scrape: Function that scrapes a single item given its id (must be thread-safe, e.g. HttpScraper.scrape_*)
+            insert: Function that inserts a single scraped item into the database
+            log: Log object to record progress and errors to
+            concurrency: Maximum number of page fetches in flight at once
+            report_interval: Time (in seconds) between throughput reports
+            on_failure: Function called with the id of every item that could not be scraped
+        """
+        self.scrape = scrape
+        self.insert = insert
+        self.log = log
+        self.concurrency = concurrency
+        self.report_interval = report_interval
+        self.on_failure = on_failure
+        self.completed = 0  # Number of items scraped and inserted so far
+
+    def run(self, item_ids: Iterable) -> int:
+        """Scrape and insert every item in an iterable of item ids.
+
+        Args:
+            item_ids: Iterable of request ids or order numbers
+
+        Returns:
+            The number of items scraped and inserted
+        """
+        return asyncio.run(self.run_async(item_ids))
+
+    async def run_async(self, item_ids: Iterable) -> int:
+        """Coroutine version of AsyncEngine.run.
+
+        Args:
+            item_ids: Iterable of request ids or order numbers
+
+        Returns:
+            The number of items scraped and inserted
+        """
+        self.completed = 0
+        item_iterator = iter(item_ids)  # Shared by all workers (safe as workers only run on the event loop thread)
+        start_time = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            reporter = asyncio.create_task(self.report_throughput())
+            workers = [asyncio.create_task(self.worker(item_iterator, executor)) for _ in range(self.concurrency)]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                reporter.cancel()
+
+        elapsed = time.perf_counter() - start_time
+        self.log.add(f"scraped [{self.completed}] items in [{elapsed:.1f}] seconds "
+                     f"([{self.completed / max(elapsed, 1e-9):.1f}] items/s)")
+        return self.completed
+
+    async def worker(self, item_iterator, executor: ThreadPoolExecutor) -> None:
+        """Repeatedly take the next item id, fetch it on the thread pool and insert it until no ids remain.
+
+        Args:
+            item_iterator: Iterator of item ids shared by all workers
+            executor: Thread pool to run fetches on
+        """
+        loop = asyncio.get_running_loop()
+        for item_id in item_iterator:
+            try:
+                item = await loop.run_in_executor(executor, self.scrape, item_id)
+            except Exception as e:
+                self.log.add(f"failed to scrape item [{item_id}]", level='error', item_id=item_id)
+                self.log.add_quiet(f"{traceback.format_exc()}\n", level='error')
+                if self.on_failure is not None:
+                    self.on_failure(item_id)
+                continue
+
+            self.insert(item)
+            self.completed += 1
+
+    async def report_throughput(self) -> None:
+        """Log the number of items completed per second (every report_interval seconds) until cancelled."""
+        previous_completed = 0
+        while True:
+            await asyncio.sleep(self.report_interval)
+            rate = (self.completed - previous_completed) / self.report_interval
+            previous_completed = self.completed
+            self.log.add(f"throughput: [{rate:.1f}] items/s ([{self.completed}] items total)")
@@ -0,0 +1,154 @@
+import hashlib
+import time
+import traceback
+from typing import Callable
+from psycopg2.extensions import connection as Connection
+from psycopg2.extras import execute_values
+from Log import Log
+from Metrics import Metrics
+
+
+class BatchWriter:
+    def __init__(self, connection: Connection, table: str, columns: list[str], log: Log, key_column: str,
+                 batch_size: int = 100, flush_interval: float = 5.0, on_write: Callable[[tuple, bool], None] = None,
+                 hash_column: str = None, conflict_action: str = "DO NOTHING", text_columns: set[str] = frozenset()):
+        """A buffer that gathers scraped work orders or work order requests and writes them to a table with multi-row
+        parameterized inserts (one round trip and one commit per batch instead of per row). Rows whose key already
+        exists in the table are skipped, so racing processes can never create duplicates.
+
+        Args:
+            connection: Open psycopg2 connection to write to
+            table: Name of the table to write to (quoted if necessary, e.g. '"order"')
+            columns: Names of the table columns (each must be an attribute of the buffered records)
+            log: Log object to record progress and errors to
+            key_column: Column (or comma-separated columns) with a unique index that identifies each record (e.g. 'id')
+            batch_size: Number of buffered records that triggers a flush
+            flush_interval: Maximum time (in seconds) a record may wait in the buffer before the next added record
+                triggers a flush
+            on_write: Function called with each flushed row (a tuple of column values) and True if the row was
+                written or False if writing it failed
+            hash_column: Column to store a content hash of each row in (see BatchWriter.get_content_hash), if any
+            conflict_action: Action taken for rows whose key already exists (e.g. "DO UPDATE SET checked_at = now()")
+            text_columns: Columns of typed fields that are stored as TEXT (see BatchWriter.get_row_values)
+        """
+        self.connection = connection
+        self.table = table
+        self.columns = columns
+        self.log = log
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_write = on_write
+        self.hash_column = hash_column
+        self.text_columns = text_columns
+        self.buffer = []
+        self.last_flush_time = time.monotonic()
+
+        insert_columns = columns + [hash_column] if hash_column else columns
+        self.insert_query = (f"INSERT INTO {table} ({', '.join(insert_columns)}) VALUES %s "
+                             f"ON CONFLICT ({key_column}) {conflict_action}")
+
+    @staticmethod
+    def get_row_values(record, columns: list[str], text_columns: set[str] = frozenset()) -> tuple:
+        """Get the values of a record for a list of columns (missing/empty values become None).
+
+        Args:
+            record: A WorkOrderRequest or WorkOrder
+            columns: Names of the columns (attributes of the record) to get
+            text_columns: Columns of typed fields that are stored as TEXT, which get the raw text of values that could
+                not be parsed (see PageParser.set_field) instead of None
+
+        Returns:
+            Tuple of column values
+        """
+        values = (getattr(record, c) for c in columns)
+        if record.unparsed and text_columns:
+            values = (record.unparsed.get(c) if value is None and c in text_columns else value
+                      for c, value in zip(columns, values))
+        return tuple(None if value == '' else value for value in values)
+
+    @staticmethod
+    def get_content_hash(values: tuple) -> str:
+        """Get a hash of the scraped content of a row (used to detect whether a record changed since it was stored).
+
+        Args:
+            values: Tuple of column values (as returned by BatchWriter.get_row_values)
+
+        Returns:
+            Hex digest of the row's content
+        """
+        content = '\x1f'.join('' if value is None else str(value) for value in values)
+        return hashlib.md5(content.encode('utf-8')).hexdigest()
+
+    def add(self, record) -> None:
+        """Add a scraped record to the buffer (and flush the buffer if it is full or the flush interval has passed).
+
+        Args:
+            record: The scraped WorkOrderRequest or WorkOrder
+        """
+        row = BatchWriter.get_row_values(record, self.columns, self.text_columns)
+        if self.hash_column:
+            row += (BatchWriter.get_content_hash(row),)
+        self.add_row(row)
+
+    def add_row(self, row: tuple) -> None:
+        """Add a row of column values to the buffer (and flush the buffer if it is full or the flush interval has
+        passed).
+
+        Args:
+            row: Tuple of values for every column (in the order of the writer's columns)
+        """
+        self.buffer.append(row)
+
+        if len(self.buffer) >= self.batch_size or time.monotonic() - self.last_flush_time >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write all buffered records to the database in a single transaction.
+
+        If the batch fails (e.g. one malformed value), the records are retried one at a time so only the bad records
+        are lost.
+
+        Returns:
+            The number of records written
+        """
+        self.last_flush_time = time.monotonic()
+        if not self.buffer:
+            return 0
+
+        rows, self.buffer = self.buffer, []
+        try:
+            start_time = time.perf_counter()
+            with Metrics.span('insert_commit'):
+                with self.connection.cursor() as cursor:
+                    execute_values(cursor, self.insert_query, rows, page_size=len(rows))
+                self.connection.commit()
+            Metrics.count('rows_written', len(rows))
+            self.log.add(f"successfully wrote [{len(rows)}] rows to table [{self.table}]", phase='insert_commit',
+                         duration=time.perf_counter() - start_time)
+            if self.on_write is not None:
+                for row in rows:
+                    self.on_write(row[:len(self.columns)], True)
+            return len(rows)
+        except Exception as e:
+            self.connection.rollback()
+            self.log.add(f"failed to insert batch of [{len(rows)}] rows to table [{self.table}] ... retrying rows "
+                         f"individually", level='warning')
+            self.log.add_quiet(f"{traceback.format_exc()}\n", level='error')
+
+        written = 0
+        for row in rows:
+            try:
+                with self.connection.cursor() as cursor:
+                    execute_values(cursor, self.insert_query, [row])
+                self.connection.commit()
+                written += 1
+                success = True
+            except Exception as e:
+                self.connection.rollback()
+                self.log.add(f"failed to insert row [{row[0]}] to table [{self.table}]", level='error', item_id=row[0])
+                self.log.add_quiet(f"{traceback.format_exc()}\n", level='error')
+                success = False
+            if self.on_write is not None:
+                self.on_write(row[:len(self.columns)], success)
+        Metrics.count('rows_written', written)
+        return written
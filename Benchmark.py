@@ -0,0 +1,380 @@
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+import psycopg2
+from Config import Config
+from Driver import Driver
+from Log import Log
+from MaintenanceDatabase import MaintenanceDatabase
+from Menu import Menu
+from Metrics import Metrics
+from MockSite import MockSite
+from PageParser import PageParser
+from ProgressMap import ProgressMap
+from Scraper import Scraper
+from User import User, login_prompt
+from WebAutomation import WebAutomation
+
+try:  # Optional: only needed to report the memory use of parallel scrapers
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class Benchmark:
+    """Contains utilities for measuring scraper performance against the live maintenance site or a local MockSite."""
+
+    @staticmethod
+    def get_browser_paths(config: Config) -> tuple[Path, Path]:
+        """Get the paths to the Chrome and chromedriver directories of the Chrome version set in the config.
+
+        Args:
+            config: Config to read the Chrome version and platform from
+
+        Returns:
+            The Chrome directory and the chromedriver directory
+        """
+        chrome_version = config.get('Scraper', 's_chrome_version')
+        chrome_platform = config.get('Scraper', 's_chrome_platform')
+        browser_path = Path.cwd() / 'Browser' / chrome_version
+        return browser_path / ('chrome-' + chrome_platform), browser_path / ('chromedriver-' + chrome_platform)
+
+    @staticmethod
+    def create_scraper(config: Config, headless: bool = True) -> Scraper:
+        """Prompt for a Calnet login and start a logged-in Scraper using the Chrome version set in the config.
+
+        Args:
+            config: Config to read the Chrome version and platform from
+            headless: True to run the scraper's webdriver in headless mode
+
+        Returns:
+            A logged-in Scraper
+        """
+        chrome_path, chromedriver_path = Benchmark.get_browser_paths(config)
+        user = login_prompt(hidden=config.get('Options', 'b_password_inputs_hidden'))
+        return Scraper(chrome_path=chrome_path, chromedriver_path=chromedriver_path, user=user, headless=headless)
+
+    @staticmethod
+    def print_latencies(title: str, latencies: dict[str, list[float]]) -> None:
+        """Print the mean and median latency (in milliseconds) of each measured method.
+
+        Args:
+            title: Title of the benchmark
+            latencies: Dictionary mapping each method name to its list of per-item latencies (in seconds)
+        """
+        print(f"\n{title}\n")
+        for method, samples in latencies.items():
+            print(f"{method:<30} mean: {statistics.mean(samples) * 1000:9.1f} ms    "
+                  f"median: {statistics.median(samples) * 1000:9.1f} ms    items: {len(samples)}")
+
+    @staticmethod
+    def benchmark_extraction(scraper: Scraper, item_type: str, item_ids: list) -> dict[str, list[float]]:
+        """Measure the per-item latency of field extraction with one WebDriver lookup per field (before) and with a
+        single page source round trip parsed locally (after). Both methods extract from the same loaded page.
+
+        Args:
+            scraper: Logged-in Scraper to benchmark with
+            item_type: Type of item to benchmark (either 'request' or 'order')
+            item_ids: List of request ids or order numbers (WITH PREFIXES) to load
+
+        Returns:
+            Dictionary mapping each method name to its list of per-item latencies (in seconds)
+        """
+        driver = scraper.driver
+        latencies = {"per-element lookups": [], "single round trip": []}
+
+        for item_id in item_ids:
+            WebAutomation.select_item(driver, 'WR' if item_type == 'request' else 'WO')
+            WebAutomation.search_item(driver, str(item_id))
+
+            start = time.perf_counter()
+            if item_type == 'request':
+                fields = {'room': PageParser.request_room_xpath, **PageParser.request_fields}
+                WebAutomation.extract_fields_per_element(driver, fields)
+            else:
+                layout = None
+                for marker_layout, xpath in PageParser.order_layout_markers.items():
+                    if WebAutomation.find_xpath_helper(driver, xpath) == 'Facility:':
+                        layout = marker_layout
+                        break
+                if layout is not None:
+                    WebAutomation.extract_fields_per_element(driver, PageParser.order_fields[layout])
+            latencies["per-element lookups"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            page_source = WebAutomation.get_page_source(driver)
+            if item_type == 'request':
+                PageParser.parse_request(page_source, item_id)
+            else:
+                PageParser.parse_order(page_source, item_id)
+            latencies["single round trip"].append(time.perf_counter() - start)
+
+        Benchmark.print_latencies(f"FIELD EXTRACTION ({item_type})", latencies)
+        return latencies
+
+    @staticmethod
+    def benchmark_navigation(scraper: Scraper, item_type: str, item_ids: list,
+                             prefix: str = 'HM-') -> dict[str, list[float]]:
+        """Measure the per-item latency and number of WebDriver round trips (commands sent to chromedriver) of fetching
+        pages through the sidebar's dropdown menu and search box (before) and by opening their URLs directly (after).
+
+        Args:
+            scraper: Logged-in Scraper on the site's frameset to benchmark with
+            item_type: Type of item to benchmark (either 'request' or 'order')
+            item_ids: List of request ids or order numbers (WITH PREFIXES) to load
+            prefix: Prefix of work order numbers (used to discover the detail page URLs if the scraper has none yet)
+
+        Returns:
+            Dictionary mapping each method name to its list of per-item latencies (in seconds)
+        """
+        driver = scraper.driver
+        page_urls = scraper.page_urls
+        if not page_urls:
+            scraper.enable_direct_navigation(prefix=prefix)
+        methods = {"dropdown search": {}, "direct navigation": scraper.page_urls}
+        latencies = {method: [] for method in methods}
+        round_trips = {method: [] for method in methods}
+
+        commands = []
+        execute = driver.execute
+
+        def counted_execute(driver_command: str, params: dict = None) -> dict:
+            commands.append(driver_command)
+            return execute(driver_command, params)
+
+        driver.execute = counted_execute  # Count every command of this driver only
+        try:
+            for method, urls in methods.items():
+                scraper.page_urls = urls
+                driver.get(scraper.frameset_url)
+                for item_id in item_ids:
+                    commands.clear()
+                    start = time.perf_counter()
+                    scraper.fetch_item(item_type, item_id)
+                    latencies[method].append(time.perf_counter() - start)
+                    round_trips[method].append(len(commands))
+        finally:
+            del driver.execute
+            scraper.page_urls = page_urls
+            driver.get(scraper.frameset_url)
+
+        Benchmark.print_latencies(f"NAVIGATION ({item_type})", latencies)
+        for method, samples in round_trips.items():
+            print(f"{method:<30} round trips per item: {statistics.mean(samples):5.1f}")
+        saved = statistics.mean(round_trips["dropdown search"]) - statistics.mean(round_trips["direct navigation"])
+        print(f"{'saved':<30} round trips per item: {saved:5.1f}")
+        return latencies
+
+    @staticmethod
+    def create_benchmark_database(config: Config, dbname: str) -> tuple:
+        """Create a separate PostgreSQL database for benchmarks (if it does not exist yet) on the server set in the
+        config, so benchmarks never write to the real tables.
+
+        Args:
+            config: Config to read the database server and credentials from
+            dbname: Name of the benchmark database
+
+        Returns:
+            Tuple of arguments to connect to the benchmark database (see Config.get_database_args)
+        """
+        host, _, user, password, port = config.get_database_args()
+        if config.get("Database", "b_input_database_password_at_runtime"):
+            password = Menu.input_prompt(prompt="Database Password: ", hidden=True)
+
+        connection = psycopg2.connect(host=host, dbname='postgres', user=user, password=password, port=port)
+        connection.autocommit = True  # CREATE DATABASE cannot run inside a transaction
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (dbname,))
+                if cursor.fetchone() is None:
+                    cursor.execute(f'CREATE DATABASE "{dbname}"')
+        finally:
+            connection.close()
+        return host, dbname, user, password, port
+
+    @staticmethod
+    def get_memory(pid: int) -> float | None:
+        """Get the memory used by a process and all of its children (e.g. a scraper's Chrome and chromedriver).
+
+        Args:
+            pid: Process id
+
+        Returns:
+            The resident memory (in megabytes) or None if psutil is not installed
+        """
+        if psutil is None:
+            return None
+        process = psutil.Process(pid)
+        processes = [process] + process.children(recursive=True)
+        total = 0
+        for child in processes:
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:  # Exited while measuring
+                pass
+        return total / (1024 * 1024)
+
+    @staticmethod
+    def print_stage(title: str, metrics: dict, elapsed: float, memory: list[float | None] = None) -> None:
+        """Print the throughput, per-item latency and memory use of a benchmark stage measured with Metrics.
+
+        Args:
+            title: Title of the stage
+            metrics: Merged metrics of all processes of the stage (see Metrics.merge)
+            elapsed: Time (in seconds) the stage took
+            memory: Memory use (in megabytes) of each worker process (if measured)
+        """
+        counters = metrics['counters']
+        items = counters.get('items_scraped', 0) + counters.get('items_missing', 0)
+        print(f"\n{title}\n")
+        print(f"items: {items:.0f} ({counters.get('items_missing', 0):.0f} empty, "
+              f"{counters.get('items_failed', 0):.0f} failed)    items/s: {items / max(elapsed, 1e-9):.1f}")
+        # Items are fetched by the fetch_item phase of the Pipeline (or scrape_item when it is disabled)
+        histogram = metrics['histograms'].get('fetch_item', metrics['histograms'].get('scrape_item'))
+        if histogram is not None:
+            print(f"per-item latency    mean: {histogram['sum'] / max(histogram['count'], 1) * 1000:.1f} ms    "
+                  f"p50 <= {Metrics.get_quantile(histogram, 0.5) * 1000:.0f} ms    "
+                  f"p99 <= {Metrics.get_quantile(histogram, 0.99) * 1000:.0f} ms")
+        network = Metrics.get_network_summary(counters, items)
+        if network is not None:
+            print(network)
+        if memory:
+            print("memory per worker: " + ", ".join("n/a (install psutil)" if mb is None else f"{mb:.0f} MB"
+                                                    for mb in memory))
+
+    @staticmethod
+    def benchmark_mock_site(config: Config, item_type: str = 'order', num_items: int = 200, num_processes: int = 4,
+                            latency: float = 0.05, error_rate: float = 0.0, backend: str = 'browser',
+                            headless: bool = True, dbname: str = 'bwork_benchmark', lean: bool = False) -> None:
+        """Run the whole scraping pipeline end to end against a local MockSite and a separate benchmark database: a
+        single Scraper, a sequential MaintenanceDatabase range and a parallel range (Driver.add_item_range_parallel).
+
+        Args:
+            config: Config to read the Chrome version and database server from (changes are not saved)
+            item_type: Type of item to scrape (either 'request' or 'order')
+            num_items: Number of items to scrape in each stage
+            num_processes: Number of parallel processes of the parallel stage
+            latency: Time (in seconds) each page of the mock site takes to load
+            error_rate: Fraction of page loads of the mock site that fail
+            backend: Scraper backend to benchmark ('browser' or 'http')
+            headless: True to run the browsers in headless mode
+            dbname: Name of the benchmark database (created if it does not exist and emptied before each stage)
+            lean: True to run lean browsers (see LeanBrowser) with the resource rules from the config
+        """
+        site = MockSite(num_items=num_items, latency=latency, error_rate=error_rate)
+        site.start()
+        WebAutomation.set_site(site.url, site.login_url)
+
+        db_args = Benchmark.create_benchmark_database(config, dbname)
+        host, dbname, db_user, password, port = db_args
+        config.set("Scraper", "s_scraper_backend", backend)
+        config.set("Scraper", "s_request_page_url", "auto")
+        config.set("Scraper", "s_order_page_url", "auto")
+        config.set("Scraper", "b_lean_browser", "true" if lean else "false")
+        prefix = config.get('Program-Variables', 's_work_order_prefix') if item_type == 'order' else ''
+        item_ids = [prefix + str(n) if prefix else n for n in range(1, num_items + 1)]
+        chrome_path, chromedriver_path = Benchmark.get_browser_paths(config)
+        user = User('benchmark', 'benchmark')  # Any login is accepted by the mock site
+        log = Log(quiet=True)
+        driver = Driver.create_headless(config, log, user)
+
+        # Stage 1: a single scraper
+        scraper = Scraper(chrome_path=chrome_path, chromedriver_path=chromedriver_path, user=user, process_id=0,
+                          headless=headless, resource_rules=driver.get_lean_browser_rules())
+        latencies = []
+        try:
+            Benchmark.benchmark_navigation(scraper, item_type, item_ids[:50],
+                                           prefix=config.get('Program-Variables', 's_work_order_prefix'))
+            for item_id in item_ids:
+                start = time.perf_counter()
+                if item_type == 'request':
+                    scraper.scrape_request(item_id)
+                else:
+                    scraper.scrape_order(item_id)
+                latencies.append(time.perf_counter() - start)
+        finally:
+            scraper.close()
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f"\nSCRAPER ({item_type}, browser)\n")
+        print(f"items: {len(latencies)}    items/s: {len(latencies) / sum(latencies):.1f}    per-item latency    "
+              f"p50: {quantiles[49] * 1000:.0f} ms    p99: {quantiles[98] * 1000:.0f} ms")
+
+        # Stage 2: a sequential range through the primary database
+        database = MaintenanceDatabase(log=log, chrome_path=chrome_path, chromedriver_path=chromedriver_path,
+                                       calnet_user=user, host=host, dbname=dbname, user=db_user, password=password,
+                                       port=port, headless=headless, **driver.get_database_options())
+        driver.database = database
+        try:
+            database.cursor.execute('TRUNCATE request, "order", missing_item')
+            database.connection.commit()
+            Metrics.reset()
+            start = time.perf_counter()
+            if item_type == 'request':
+                database.add_requests(item_ids, skip_existing=False)
+            else:
+                database.add_orders(item_ids, skip_existing=False)
+            Benchmark.print_stage(f"MAINTENANCE DATABASE ({item_type}, {backend}, sequential)", Metrics.snapshot(),
+                                  time.perf_counter() - start)
+
+            # Stage 3: a parallel range through a warm scraper pool (started before timing)
+            database.cursor.execute('TRUNCATE request, "order", missing_item')
+            database.connection.commit()
+            scraper_pool = driver.get_scraper_pool(num_processes, headless)
+            Metrics.clear_files()
+            Metrics.reset()
+            progress_path = Path(tempfile.mkdtemp(prefix='bwork-benchmark-')) / f"{item_type}.progress"
+            ProgressMap.create(progress_path, 1, num_items + 1).close()
+            start = time.perf_counter()
+            driver.add_item_range_parallel(item_type, item_ids, num_processes, progress_path, headless=headless)
+            elapsed = time.perf_counter() - start
+            memory = [Benchmark.get_memory(process.pid) for process in scraper_pool.processes]
+            Benchmark.print_stage(f"DRIVER ({item_type}, {backend}, {num_processes} processes)",
+                                  Metrics.merge(Metrics.load_all()), elapsed, memory)
+        finally:
+            if driver.scraper_pool is not None:
+                driver.scraper_pool.close()
+            database.close()
+            site.close()
+            log.close()
+        print(f"\nmock site: {site.page_loads} page loads, {site.asset_loads} image/stylesheet loads, {site.errors} "
+              f"injected errors")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark bWork against the live maintenance site or a local mock")
+    parser.add_argument('--mock', action='store_true', help="run end to end against a local mock maintenance site")
+    parser.add_argument('--item-type', choices=['request', 'order'], default='order')
+    parser.add_argument('--items', type=int, default=200, help="items to scrape per stage (mock only)")
+    parser.add_argument('--processes', type=int, default=4, help="parallel processes (mock only)")
+    parser.add_argument('--latency', type=float, default=0.05, help="mock page latency in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of mock page loads that fail")
+    parser.add_argument('--backend', choices=['browser', 'http'], default='browser')
+    parser.add_argument('--lean', action='store_true', help="run lean browsers (mock only)")
+    parser.add_argument('--dbname', default='bwork_benchmark', help="benchmark database (never the real one)")
+    arguments = parser.parse_args()
+
+    benchmark_config = Config()
+    if arguments.mock:
+        Benchmark.benchmark_mock_site(benchmark_config, item_type=arguments.item_type, num_items=arguments.items,
+                                      num_processes=arguments.processes, latency=arguments.latency,
+                                      error_rate=arguments.error_rate, backend=arguments.backend,
+                                      dbname=arguments.dbname, lean=arguments.lean)
+    else:
+        benchmark_scraper = Benchmark.create_scraper(benchmark_config)
+        order_prefix = benchmark_config.get('Program-Variables', 's_work_order_prefix')
+        try:
+            request_start = int(input("first request id to benchmark: "))
+            order_start = int(input(f"first work order number to benchmark: {order_prefix}"))
+            Benchmark.benchmark_extraction(benchmark_scraper, 'request',
+                                           list(range(request_start, request_start + 20)))
+            Benchmark.benchmark_extraction(benchmark_scraper, 'order',
+                                           [order_prefix + str(n) for n in range(order_start, order_start + 20)])
+            Benchmark.benchmark_navigation(benchmark_scraper, 'request', list(range(request_start, request_start + 20)),
+                                           prefix=order_prefix)
+            Benchmark.benchmark_navigation(benchmark_scraper, 'order',
+                                           [order_prefix + str(n) for n in range(order_start, order_start + 20)],
+                                           prefix=order_prefix)
+        finally:
+            benchmark_scraper.close()
@@ -56,6 +56,18 @@ class Config:
         port = self.get('Database', 'i_port')
         return host, dbname, user, password, port
 
+    def get_http_scraper_args(self) -> tuple[str, str, int]:
+        """Retrieve a tuple of arguments from the config to initialize an HttpScraper (used when the 'http' scraper
+        backend is enabled, the page URLs also when direct navigation is enabled for the browser backend).
+
+        Returns:
+            A tuple of (request page URL, order page URL, connection pool size)
+        """
+        request_url = self.get('Scraper', 's_request_page_url')
+        order_url = self.get('Scraper', 's_order_page_url')
+        pool_size = self.get('Scraper', 'i_http_pool_size')
+        return request_url, order_url, pool_size
+
     def set(self, section: str, option: str, value, save=False) -> None:
         """Update an option in the config. Does not save the change by default.
 
@@ -1,13 +1,26 @@
 import PackageInstaller
 PackageInstaller.check_and_install_dependencies()  # Install package dependencies
 
-import multiprocessing
-from collections import defaultdict
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
 from MaintenanceDatabase import MaintenanceDatabase
+from Metrics import Metrics
+from ScraperPool import ScraperPool
+from ProgressMap import ProgressMap
+from TailFollower import TailFollower
+from Refresher import Refresher
+from Reextractor import Reextractor
+from Exporter import Exporter
+from OrderPlanner import OrderPlanner
+from LeaseCoordinator import LeaseCoordinator
+from RateController import RateController
+from LeanBrowser import LeanBrowser
 from Scraper import *
 from Log import *
 from Config import *
-from User import login_prompt
+from User import User, login_prompt
 from SetupUtils import SetupUtils
 from pathlib import Path
 from Menu import Menu
@@ -18,7 +31,10 @@ class Driver:
         """A driver used to organize program execution/flow. Provides a simple cli and navigates the program when run
         with <driver>.run()"""
         self.config = Config()  # Config object to load/store the program's settings
-        self.log = Log()  # Log object to record (some) progress and error codes
+        # Log object to record (some) progress and error codes
+        self.log = Log(max_bytes=self.config.get("Options", "i_log_max_megabytes") * 1024 * 1024,
+                       quiet=self.config.get("Options", "b_quiet_console"))
+        Metrics.clear_files()  # Stats files of processes from previous runs
 
         # First-time setup
         if not self.config.get('Program-Variables', 'b_first_time_setup_complete'):
@@ -30,7 +46,37 @@ class Driver:
         self.user = login_prompt(hidden=self.password_input_hidden)  # Log into the user's Calnet profile
         Menu.clear_lines(3)
 
+        metrics_port = self.config.get("Scraper", "i_metrics_port")
+        if metrics_port > 0:
+            Metrics.serve(metrics_port)
+            self.log.add(f"serving metrics at [http://127.0.0.1:{metrics_port}/metrics]")
+
         self.database = self.connect_primary_database()
+        self.scraper_pool = None  # Warm parallel scrapers (started by the first parallel scrape)
+        self.scraper_pool_settings = None
+
+    @staticmethod
+    def create_headless(config: Config, log: Log, user: User) -> 'Driver':
+        """Create a driver without the interactive startup (first-time setup, Calnet login prompt and primary
+        database), e.g. to run scrapes from a script. Its database must be set before scraping.
+
+        Args:
+            config: Config to read settings from
+            log: Log object to record progress and errors to
+            user: Calnet user for the scrapers
+
+        Returns:
+            The new driver (without a database)
+        """
+        driver = Driver.__new__(Driver)
+        driver.config = config
+        driver.log = log
+        driver.password_input_hidden = config.get("Options", "b_password_inputs_hidden")
+        driver.user = user
+        driver.database = None
+        driver.scraper_pool = None
+        driver.scraper_pool_settings = None
+        return driver
 
     def connect_primary_database(self) -> MaintenanceDatabase:
         """Connect to the database (database connection information and credentials are stored in the config).\n
@@ -46,17 +92,69 @@ class Driver:
             password = Menu.input_prompt(prompt="Database Password: ", hidden=self.password_input_hidden)
 
         headless = self.config.get("Scraper", "b_primary_scraper_headless")  # For primary scraper only
+        database_options = self.get_database_options()
+        rate_controller = self.create_rate_controller(database_options['concurrency'])
         database = MaintenanceDatabase(log=self.log, chrome_path=self.get_chrome_dir(),
                                        chromedriver_path=self.get_chromedriver_dir(), calnet_user=self.user,
                                        host=host, dbname=dbname, user=user, password=password, port=port,
-                                       headless=headless)
+                                       headless=headless, rate_controller=rate_controller, **database_options)
         return database
 
+    def create_rate_controller(self, max_concurrency: int) -> RateController | None:
+        """Create a controller that adapts the number of page fetches in flight to the maintenance site's latency (if
+        enabled in the config) and caps the number of page fetches per second (if set in the config).
+
+        Args:
+            max_concurrency: Highest number of page fetches that can be in flight at once
+
+        Returns:
+            A new RateController or None if neither adaptive concurrency nor a rate limit applies
+        """
+        max_rate = self.config.get("Scraper", "i_max_requests_per_second")
+        adaptive = self.config.get("Scraper", "b_adaptive_concurrency")
+        if max_rate <= 0 and (not adaptive or max_concurrency <= 1):
+            return None
+        return RateController(max_concurrency, self.log, max_rate=max_rate, adaptive=adaptive)
+
+    def get_database_options(self) -> dict:
+        """Get the scraping and writing options for MaintenanceDatabase objects from the config.
+
+        Returns:
+            Dictionary of keyword arguments for MaintenanceDatabase
+        """
+        return {'backend': self.config.get("Scraper", "s_scraper_backend"),
+                'http_args': self.config.get_http_scraper_args(),
+                'concurrency': self.config.get("Scraper", "i_concurrent_fetches"),
+                'batch_size': self.config.get("Database", "i_batch_size"),
+                'flush_interval': self.config.get("Database", "i_batch_flush_interval"),
+                'missing_recheck_days': self.config.get("Scraper", "i_missing_recheck_days"),
+                'archive_pages': self.config.get("Scraper", "b_archive_pages"),
+                'pipeline_queue_size': self.config.get("Scraper", "i_pipeline_queue_size"),
+                'direct_navigation': self.config.get("Scraper", "b_direct_navigation"),
+                'lean_browser': self.get_lean_browser_rules(),
+                'order_prefix': self.config.get('Program-Variables', 's_work_order_prefix')}
+
+    def get_lean_browser_rules(self) -> dict[str, str] | None:
+        """Get the resource rules of lean browsers from the config.
+
+        Returns:
+            Dictionary mapping resource types to 'allow' or 'deny' (see LeanBrowser) or None if lean mode is disabled
+        """
+        if not self.config.get("Scraper", "b_lean_browser"):
+            return None
+        return LeanBrowser.parse_rules(self.config.get("Scraper", "s_lean_resource_rules"))
+
     def main_menu(self) -> None:
         """Run the main menu loop with options to navigate the program."""
         title = "MAIN MENU"
         options = ["Scrape a range of work order requests and write to your database",
                    "Scrape a range of work orders and write to your database",
+                   "Scrape the work orders linked from work order requests in your database (only missing ones)",
+                   "Scrape new work order requests and work orders (since the newest in your database)",
+                   "Refresh open work order requests and work orders in your database",
+                   "Re-extract all work order requests and work orders from archived pages (no scraping)",
+                   "Export work order requests or work orders to a file (CSV, JSON Lines or Parquet)",
+                   "Distributed scraping (split ranges into leases that worker machines take from the database)",
                    "Settings",
                    "[EXIT]"]
 
@@ -69,8 +167,20 @@ class Driver:
                     order_prefix = self.config.get('Program-Variables', 's_work_order_prefix')
                     self.scrape_range_prompt(item_type='order', prefix=order_prefix)
                 case 2:
-                    self.config.settings_menu()
+                    self.scrape_linked_orders()
                 case 3:
+                    self.follow_prompt()
+                case 4:
+                    self.refresh_open_items()
+                case 5:
+                    self.reextract_archive()
+                case 6:
+                    self.export_prompt()
+                case 7:
+                    self.distributed_menu()
+                case 8:
+                    self.config.settings_menu()
+                case 9:
                     return None
 
     def scrape_range_prompt(self, item_type: str, prefix: str = "") -> None:
@@ -102,94 +212,342 @@ class Driver:
         print(f"Initializing process: scrape and write orders from ids [{prefix}{start}] to [{prefix}{stop}] on "
               f"[{num_processes}] processes")
 
-        if num_processes > 1:  # Multiprocessing
-            headless = self.config.get("Scraper", "b_parallel_scrapers_headless")
-            self.add_item_range_parallel(item_type, start, stop, num_processes, headless=headless, prefix=prefix)
-        else:  # Sequential processing
-            if item_type == "request":
-                self.database.add_request_range(start, stop)
-            elif item_type == "order":
-                self.database.add_order_range(start, stop, prefix)
-
+        progress, item_ids = self.get_range_progress(item_type, start, stop, prefix)
+        counts = self.scrape_range(item_type, item_ids, num_processes, progress)
         print()  # Cosmetic padding
-        print(f"Finished scraping requests from ids [{prefix}{start}] to [{prefix}{stop}]")
-
-    @staticmethod
-    def add_item_range_parallel_helper(item_type: str, item_ids: list, log: Log, chrome_path: Path,
-                                       chromedriver_path: Path, calnet_user: User, process_id: int, headless: bool,
-                                       db_args: tuple) -> None:
-        """Initialize and run a single process for scraping work order requests and adding them to a database.
+        print(f"Finished scraping requests from ids [{prefix}{start}] to [{prefix}{stop}] "
+              f"([{counts[ProgressMap.DONE]}] done, [{counts[ProgressMap.EMPTY]}] empty, "
+              f"[{counts[ProgressMap.FAILED]}] failed)")
+        self.log_metrics_summary()
 
-        A new database object is created for every process to establish a unique connection and scraper as psycopg2
-        connections and selenium webdrivers cannot be shared between processes.
+    def scrape_range(self, item_type: str, item_ids: list, num_processes: int,
+                     progress: ProgressMap) -> dict[int, int]:
+        """Scrape and add the remaining items of a range to the database (in parallel if num_processes > 1) and close
+        its progress map.
 
         Args:
             item_type: Type of item to be scraped (either 'request' or 'order')
-            item_ids: List of work order item ids to be scraped/added by this process
-            log: Log object for recording progress and error messages
-            chrome_path: Path pointing to the chrome directory to be used for Scrapers
-            chromedriver_path: Path pointing to the chromedriver directory to be used for Scrapers
-            calnet_user: Calnet user used to log into maintenance.housing.berkeley.edu
-            process_id: Unique integer id assigned to this specific process
-            headless: True if this process should be run in a headless or headful browser
-            db_args: Tuple of arguments to connect to the database
+            item_ids: List of request ids or order numbers (WITH PREFIXES) that do not exist in the database yet
+            num_processes: Number of parallel processes to use
+            progress: Progress map of the range (see Driver.get_range_progress)
+
+        Returns:
+            Number of ids in each state of the progress map once scraping finished (see ProgressMap.get_counts)
+        """
+        try:
+            if num_processes > 1:  # Multiprocessing
+                headless = self.config.get("Scraper", "b_parallel_scrapers_headless")
+                self.add_item_range_parallel(item_type, item_ids, num_processes, progress.path, headless=headless)
+            else:  # Sequential processing
+                self.database.progress = progress
+                try:
+                    if item_type == "request":
+                        self.database.add_requests(item_ids, skip_existing=False)
+                    elif item_type == "order":
+                        self.database.add_orders(item_ids, skip_existing=False)
+                finally:
+                    self.database.progress = None
+            return progress.get_counts()
+        finally:
+            progress.close()
+
+    def scrape_linked_orders(self) -> None:
+        """Scrape only the work orders that stored work order requests link to and that are not stored yet (instead of
+        a whole range of work order numbers)."""
+        order_prefix = self.config.get('Program-Variables', 's_work_order_prefix')
+        num_processes = max(1, self.config.get("Scraper", "i_parallel_process_count"))
+        self.database.request_writer.flush()  # Include the links of requests that are still buffered
+        planner = OrderPlanner(self.database, self.log, prefix=order_prefix)
+        linked, missing = planner.count_order_numbers()
+        self.log.add(f"[{linked}] work orders are linked from stored requests ... [{missing}] of them are not stored "
+                     f"yet")
+
+        if num_processes > 1:
+            order_numbers = list(planner.get_order_numbers())
+            if order_numbers:
+                # Only the linked work orders of the spanned range are scraped, so every other id starts as done
+                numbers = {ProgressMap.get_number(order_number) for order_number in order_numbers}
+                start, stop = min(numbers), max(numbers) + 1
+                progress = ProgressMap.create(ProgressMap.get_path('order', start, stop), start, stop)
+                for number in range(start, stop):
+                    if number not in numbers:
+                        progress.mark(number, ProgressMap.DONE)
+                counts = self.scrape_range('order', order_numbers, num_processes, progress)
+                done = counts[ProgressMap.DONE] - (stop - start - len(numbers))
+                self.log.add(f"finished scraping linked work orders ([{done}] done, [{counts[ProgressMap.EMPTY]}] "
+                             f"empty, [{counts[ProgressMap.FAILED]}] failed)")
+        else:  # Work order numbers are streamed from the database while they are scraped
+            self.database.add_orders(planner.get_order_numbers(), skip_existing=False)
+        self.log_metrics_summary()
+
+    def log_metrics_summary(self) -> None:
+        """Record the metrics of all processes so far (merged) in the log: throughput, empty-record rate, failures
+        and the time spent in each phase of scraping and writing."""
+        for line in Metrics.get_summary(Metrics.merge(Metrics.load_all())):
+            self.log.add(line)
+
+    def follow_prompt(self) -> None:
+        """Prompt the user to scrape all work order requests and work orders created since the newest ones in the
+        database, either once or repeatedly on an interval."""
+        order_prefix = self.config.get('Program-Variables', 's_work_order_prefix')
+        gap_tolerance = self.config.get('Scraper', 'i_follow_gap_tolerance')
+        interval_minutes = self.config.get('Scraper', 'i_follow_interval_minutes')
+        followers = [TailFollower(self.database, self.log, 'request', gap_tolerance=gap_tolerance),
+                     TailFollower(self.database, self.log, 'order', prefix=order_prefix, gap_tolerance=gap_tolerance)]
+
+        options = ["Scrape new items once",
+                   f"Keep scraping new items every [{interval_minutes}] minutes (CTRL+C to stop)",
+                   "[GO BACK]"]
+        match Menu.menu_prompt(options, title="SCRAPE NEW ITEMS"):
+            case 0:
+                for follower in followers:
+                    follower.follow_once()
+            case 1:
+                TailFollower.follow(followers, interval_minutes * 60, self.log)
+
+    def refresh_open_items(self) -> None:
+        """Re-scrape the stored work order requests and work orders that may still change and update the ones that
+        changed."""
+        limit = self.config.get('Scraper', 'i_refresh_limit')
+        min_age_hours = self.config.get('Scraper', 'i_refresh_min_age_hours')
+        refresher = Refresher(self.database, self.log)
+        for item_type in ('request', 'order'):
+            refresher.refresh(item_type, limit, min_age_hours)
+
+    def reextract_archive(self) -> None:
+        """Re-extract every archived work order request and work order page with the current XPaths (on all CPU
+        cores) and update the stored items whose content changed."""
+        self.database.request_writer.flush()  # Include pages of items that are still buffered
+        self.database.order_writer.flush()
+        reextractor = Reextractor(self.database, self.log)
+        for item_type in ('request', 'order'):
+            reextractor.reextract(item_type)
+
+    def create_lease_coordinator(self) -> LeaseCoordinator:
+        """Create a lease coordinator on the database of this driver (lease length is stored in the config).
+
+        Returns:
+            A new LeaseCoordinator
+        """
+        return LeaseCoordinator(self.database.db_args, self.log,
+                                lease_seconds=self.config.get("Scraper", "i_lease_minutes") * 60)
+
+    def distributed_menu(self) -> None:
+        """Prompt the user to split a range into scrape leases, show the progress of all leases, or work on leases
+        from this machine."""
+        order_prefix = self.config.get('Program-Variables', 's_work_order_prefix')
+        options = ["Split a range of work order requests into leases",
+                   "Split a range of work orders into leases",
+                   "Show the progress of all leases",
+                   "Work on leases from this machine (until none are left)",
+                   "[GO BACK]"]
+        match Menu.menu_prompt(options, title="DISTRIBUTED SCRAPING"):
+            case 0 | 1 as selected_option:
+                item_type, prefix = ('request', '') if selected_option == 0 else ('order', order_prefix)
+                start = int(input(f"start id (inclusive): {prefix}"))
+                stop = int(input(f"stop id (exclusive): {prefix}"))
+                Menu.clear_lines(2)
+                coordinator = self.create_lease_coordinator()
+                chunk_size = self.config.get("Scraper", "i_lease_chunk_size")
+                try:
+                    coordinator.create_leases(item_type, max(1, start), stop, chunk_size=chunk_size, prefix=prefix)
+                finally:
+                    coordinator.close()
+            case 2:
+                coordinator = self.create_lease_coordinator()
+                try:
+                    for item_type, state, leases, ids, failed in coordinator.get_progress():
+                        self.log.add(f"{item_type} leases {state}: [{leases}] ([{ids}] ids, [{failed}] failed)")
+                finally:
+                    coordinator.close()
+            case 3:
+                self.work_leases(num_processes=max(1, self.config.get("Scraper", "i_parallel_process_count")))
+
+    def work_leases(self, item_type: str = None, num_processes: int = 1, wait_seconds: float = 0) -> None:
+        """Claim and scrape leases (see LeaseCoordinator) one at a time until none are left. Each lease is renewed
+        while it is scraped and marked as done once all of its items are written, so a worker that dies never loses a
+        lease and its items are never written twice (existing items are skipped when a lease is re-issued).
+
+        Args:
+            item_type: Type of item to work on (either 'request' or 'order', None for both)
+            num_processes: Number of parallel processes to scrape each lease with
+            wait_seconds: Time (in seconds) to wait for new leases when none are left (0 to stop instead)
+        """
+        coordinator = self.create_lease_coordinator()
+        max_attempts = self.config.get("Scraper", "i_lease_max_attempts")
+        lease_id = None
+        try:
+            while True:
+                lease = coordinator.claim(item_type, max_attempts=max_attempts)
+                if lease is None:
+                    if wait_seconds <= 0:
+                        self.log.add(f"[{coordinator.worker_name}] no leases left")
+                        return None
+                    time.sleep(wait_seconds)
+                    continue
+
+                lease_id, lease_type, start, stop, prefix, attempts = lease
+                with coordinator.hold(lease_id):
+                    progress, item_ids = self.get_range_progress(lease_type, start, stop, prefix, interactive=False)
+                    counts = self.scrape_range(lease_type, item_ids, num_processes, progress)
+                coordinator.complete(lease_id, failed=counts[ProgressMap.FAILED], max_attempts=max_attempts)
+                lease_id = None
+        finally:
+            if lease_id is not None:  # Interrupted (e.g. CTRL+C): hand the lease to another worker right away
+                coordinator.release(lease_id)
+            coordinator.close()
+            self.log_metrics_summary()
+
+    def export_prompt(self) -> None:
+        """Prompt the user to export the work order request or work order table (optionally only some columns, an id
+        range or a date range) to a file in \\bWork\\Exports\\."""
+        item_type = ('request', 'order')[Menu.menu_prompt(["Work order requests", "Work orders"], title="EXPORT TABLE")]
+        file_format = Exporter.formats[Menu.menu_prompt(["CSV", "JSON Lines", "Parquet (requires pyarrow)"],
+                                                        title="EXPORT FORMAT")]
+        compress = Menu.menu_prompt(["No", "Yes"], title="COMPRESS THE FILE?") == 1
+        prefix = self.config.get('Program-Variables', 's_work_order_prefix') if item_type == 'order' else ''
+
+        columns = Menu.input_prompt("Columns to export (comma-separated, blank for all): ")
+        columns = [column.strip() for column in columns.split(',') if column.strip()] or None
+
+        os.makedirs(Path.cwd() / 'Exports', exist_ok=True)
+        path = Path.cwd() / 'Exports' / f"{item_type}s_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_format}"
+        try:
+            id_range = None
+            first_id = Menu.input_prompt(f"First id (inclusive, blank for all): {prefix}").strip()
+            if first_id:
+                id_range = (int(first_id), int(Menu.input_prompt(f"Last id (inclusive): {prefix}")))
+
+            date_column = Menu.input_prompt("Date column to filter by (blank for none): ").strip() or None
+            date_range = None
+            if date_column is not None:
+                first_date = Menu.input_prompt("First date (YYYY-MM-DD, inclusive, blank for no bound): ").strip()
+                last_date = Menu.input_prompt("Last date (YYYY-MM-DD, inclusive, blank for no bound): ").strip()
+                date_range = (datetime.strptime(first_date, '%Y-%m-%d') if first_date else None,
+                              datetime.strptime(last_date, '%Y-%m-%d') + timedelta(days=1, microseconds=-1)
+                              if last_date else None)
+
+            Exporter(self.database.db_args, self.log).export(item_type, path, file_format, columns, id_range,
+                                                             date_column, date_range, compress)
+        except (ValueError, ImportError) as e:  # Invalid id, date, column or format, or pyarrow missing
+            self.log.add(f"export failed: {e}", level='error')
+
+    def get_range_progress(self, item_type: str, start: int, stop: int, prefix: str = "",
+                           interactive: bool = True) -> tuple[ProgressMap, list]:
+        """Load the progress map of a range (offering to resume it if it was interrupted) or start a new one.
+
+        A new progress map marks every item that already exists in the database (or is known to be missing) as done
+        (found with a single query).
+        Resuming skips the database check and only returns the items the progress map has not recorded as done.
+
+        Args:
+            item_type: Type of item in the range (either 'request' or 'order')
+            start: First item id of the range (inclusive)
+            stop: Last item id of the range (exclusive)
+            prefix: Prefix to append to work order numbers (ignore for requests)
+            interactive: False to always start a new progress map without asking (e.g. on a headless worker)
+
+        Returns:
+            The progress map of the range and the list of request ids or order numbers (WITH PREFIXES) to scrape
         """
-        host, dbname, user, password, port = db_args
-        database = MaintenanceDatabase(log=log, chrome_path=chrome_path, chromedriver_path=chromedriver_path,
-                                       calnet_user=calnet_user, process_id=process_id, headless=headless, host=host,
-                                       dbname=dbname, user=user, password=password, port=port)
+        progress_path = ProgressMap.get_path(item_type, start, stop)
+        if interactive and progress_path.exists():
+            progress = ProgressMap(progress_path)
+            counts = progress.get_counts()
+            remaining = counts[ProgressMap.UNKNOWN] + counts[ProgressMap.FAILED]
+            if remaining > 0:
+                title = (f"AN INTERRUPTED RUN OF THIS RANGE WAS FOUND\n[{counts[ProgressMap.DONE]}] done, "
+                         f"[{counts[ProgressMap.EMPTY]}] empty, [{counts[ProgressMap.FAILED]}] failed, "
+                         f"[{remaining}] remaining")
+                options = ["Resume the interrupted run", "Start over"]
+                if Menu.menu_prompt(options, title=title) == 0:
+                    item_ids = progress.get_pending()
+                    if item_type == 'order':
+                        item_ids = [prefix + str(n) for n in item_ids]
+                    return progress, item_ids
+            progress.close()
+
+        progress = ProgressMap.create(progress_path, start, stop)
+        if item_type == 'request':
+            all_ids = list(range(start, stop))
+            item_ids = self.database.get_missing_request_ids(all_ids)
+        else:
+            all_ids = [prefix + str(n) for n in range(start, stop)]
+            item_ids = self.database.get_missing_order_numbers(all_ids)
+
+        missing_ids = set(item_ids)
+        for item_id in all_ids:
+            if item_id not in missing_ids:
+                progress.mark(item_id, ProgressMap.DONE)
+        self.log.add(f"[{len(all_ids) - len(item_ids)}] items already exist or are known to be missing ... scraping "
+                     f"[{len(item_ids)}] items")
+        return progress, item_ids
+
+    def get_scraper_pool(self, num_processes: int, headless: bool) -> ScraperPool:
+        """Get the warm scraper pool, starting a new one if none is running yet or if its settings changed.
 
+        Args:
+            num_processes: number of parallel processes the pool should have
+            headless: True if the pool's browsers should be headless
+
+        Returns:
+            A started ScraperPool
+        """
+        database_options = self.get_database_options()
+        recycle_after = self.config.get("Scraper", "i_pool_recycle_items")
+        rate_settings = (self.config.get("Scraper", "b_adaptive_concurrency"),
+                         self.config.get("Scraper", "i_max_requests_per_second"))
+        settings = (num_processes, headless, database_options, recycle_after, rate_settings)
+        if self.scraper_pool is not None:
+            if self.scraper_pool.is_alive() and self.scraper_pool_settings == settings:
+                return self.scraper_pool
+            self.scraper_pool.close()
+            self.scraper_pool = None
+
+        # Reuse the detail page URLs already discovered by the primary scraper
+        worker_options = dict(database_options)
+        page_urls = self.database.get_page_urls()
+        if page_urls is not None:
+            pool_size = worker_options['http_args'][2]
+            worker_options['http_args'] = (*page_urls, pool_size)
+
+        # Workers start from throwaway profiles and reuse the primary scraper's Calnet session (no Duo Mobile login)
+        session = self.database.browser_scraper.export_session()
+        # Fetches of all workers are limited together (each worker keeps up to i_concurrent_fetches in flight)
+        rate_controller = self.create_rate_controller(num_processes * database_options['concurrency'])
+        scraper_pool = ScraperPool(num_processes, self.log, self.get_chrome_dir(), self.get_chromedriver_dir(),
+                                   self.user, headless, self.database.db_args, worker_options, session,
+                                   recycle_after=recycle_after, rate_controller=rate_controller)
         try:
-            if item_type == 'request':
-                database.add_requests(item_ids)
-            elif item_type == 'order':
-                database.add_orders(item_ids)
-            database.close()
-        except KeyboardInterrupt:  # Allows user to exit program to interrupt scraping a large range of items
-            database.close()
-
-    def add_item_range_parallel(self, item_type: str, start: int, stop: int, num_processes: int, headless: bool = False,
-                                prefix: str = "") -> None:
-        """Scrape and add a range of work order requests or work orders to the database (in parallel).
+            scraper_pool.start()
+        except (RuntimeError, KeyboardInterrupt):
+            scraper_pool.close()
+            raise
+
+        self.scraper_pool = scraper_pool
+        self.scraper_pool_settings = settings
+        return scraper_pool
+
+    def add_item_range_parallel(self, item_type: str, item_ids: list, num_processes: int, progress_path: Path,
+                                headless: bool = False) -> None:
+        """Scrape and add a list of work order requests or work orders to the database (in parallel).
+
+        The parallel processes are kept running between ranges (see ScraperPool), so only the first range pays for
+        starting and logging in their browsers. Item ids are handed out in small chunks to whichever process is free
+        (see WorkQueue), so a slow process does not hold up the whole run.
 
         Args:
             item_type: Type of item to be scraped (either 'request' or 'order')
-            start: First item id to scrape/add (inclusive)
-            stop: Last item id to scrape/add (exclusive)
+            item_ids: List of request ids or order numbers (WITH PREFIXES) that do not exist in the database yet
             num_processes: number of parallel processes to use
+            progress_path: Path to the progress map of the range being scraped
             headless: True to run processes in a headless browsers
-            prefix: Prefix to append to work order numbers (leave empty for requests)
         """
-        log = self.log
-        chrome_path = self.get_chrome_dir()
-        chromedriver_path = self.get_chromedriver_dir()
-        calnet_user = self.user
-        db_args = self.database.db_args
-
-        # Uniformly assign item ids to different processes
-        # An item id is assigned to a process with: <process id> = <item id> (mod <number of processes>)
-        id_dict = defaultdict(list)
-        for item_id in range(start, stop):
-            process_num = item_id % num_processes
-            if item_type == 'request':
-                id_dict[process_num].append(item_id)
-            elif item_type == 'order':
-                id_dict[process_num].append(prefix + str(item_id))
-
-        # Generate a list of argument tuples
-        # Each tuple will be passed to add_item_range_parallel to create a new process
-        args = []
-        for process_id in range(num_processes):
-            item_ids = id_dict[process_id]
-            args.append((item_type, item_ids, log, chrome_path, chromedriver_path, calnet_user,
-                         process_id + 1, headless, db_args))  # Process 0 is reserved for the primary (driver) database
-
-        # Main scraper needs to be closed to allow for its Chrome profile to be cloned for each parallel process
-        self.database.close()
-        del self.database
-        with multiprocessing.Pool(processes=num_processes) as pool:
-            pool.starmap(Driver.add_item_range_parallel_helper, args)
-        self.database = self.connect_primary_database()  # Restart primary (driver) database
+        scraper_pool = self.get_scraper_pool(num_processes, headless)
+        start_time = time.perf_counter()
+        work_queue = scraper_pool.run_job(item_type, item_ids, progress_path,
+                                          target_chunk_time=self.config.get("Scraper", "i_target_chunk_seconds"))
+        work_queue.print_summary(time.perf_counter() - start_time)
 
     def get_chrome_dir(self) -> Path:
         """Get the path to the directory of the currently-enabled Chrome version (e.g. path to chrome-win64).
@@ -211,10 +569,45 @@ class Driver:
 
     def run(self):
         """Run this driver. Load and display the main menu."""
-        self.main_menu()
+        try:
+            self.main_menu()
+        finally:
+            if self.scraper_pool is not None:
+                self.scraper_pool.close()
+            self.log.close()
 
 
 # Main program run point
 if __name__ == "__main__":
-    driver = Driver()
-    driver.run()
+    parser = argparse.ArgumentParser(description="bWork: scrape the UC Berkeley maintenance site into PostgreSQL")
+    parser.add_argument('--worker', action='store_true',
+                        help="run headless as a distributed scraping worker (no menus) until no leases are left")
+    parser.add_argument('--item-type', choices=['request', 'order'], default=None,
+                        help="only work on leases of this item type (worker only)")
+    parser.add_argument('--processes', type=int, default=1, help="parallel processes per lease (worker only)")
+    parser.add_argument('--wait', type=float, default=0,
+                        help="seconds to wait for new leases when none are left instead of exiting (worker only)")
+    arguments = parser.parse_args()
+
+    if arguments.worker:
+        # Calnet credentials are taken from the environment if set (Duo Mobile still has to approve the login)
+        worker_config = Config()
+        worker_log = Log(max_bytes=worker_config.get("Options", "i_log_max_megabytes") * 1024 * 1024,
+                         quiet=worker_config.get("Options", "b_quiet_console"))
+        if 'BWORK_CALNET_USERNAME' in os.environ and 'BWORK_CALNET_PASSWORD' in os.environ:
+            worker_user = User(os.environ['BWORK_CALNET_USERNAME'], os.environ['BWORK_CALNET_PASSWORD'])
+        else:
+            worker_user = login_prompt(hidden=worker_config.get("Options", "b_password_inputs_hidden"))
+        Metrics.clear_files()
+        worker = Driver.create_headless(worker_config, worker_log, worker_user)
+        worker.database = worker.connect_primary_database()
+        try:
+            worker.work_leases(arguments.item_type, arguments.processes, arguments.wait)
+        finally:
+            if worker.scraper_pool is not None:
+                worker.scraper_pool.close()
+            worker.database.close()
+            worker_log.close()
+    else:
+        driver = Driver()
+        driver.run()
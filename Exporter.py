@@ -0,0 +1,252 @@
+import csv
+import gzip
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+import psycopg2
+from psycopg2 import sql
+from Log import Log
+
+try:  # Optional: only needed for Parquet exports
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class Exporter:
+    formats = ('csv', 'jsonl', 'parquet')
+    _tables = {'request': ('request', 'id'), 'order': ('order', 'order_number')}  # Item type -> (table, key column)
+
+    def __init__(self, db_args: tuple, log: Log, chunk_size: int = 10000):
+        """Exports the request and order tables to files, streaming rows from PostgreSQL through a named (server-side)
+        cursor in fixed-size chunks so that memory use stays constant no matter how large the table is.
+
+        Exports run on their own read-only connection, so they never interfere with (or commit) scraping writes.
+
+        Args:
+            db_args: Tuple of arguments to connect to the database (see Config.get_database_args)
+            log: Log object to record progress and errors to
+            chunk_size: Number of rows fetched from the server (and written) at a time
+        """
+        self.db_args = db_args
+        self.log = log
+        self.chunk_size = chunk_size
+
+    def get_column_types(self, cursor, table: str) -> dict[str, str]:
+        """Get the datatype of every column of a table.
+
+        Args:
+            cursor: Open cursor to query with
+            table: Name of the table (unquoted)
+
+        Returns:
+            Dictionary mapping each column name to its datatype (as named by information_schema), in table order
+        """
+        cursor.execute("""SELECT column_name, data_type FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position""", (table,))
+        return dict(cursor.fetchall())
+
+    def build_query(self, item_type: str, column_types: dict[str, str], columns: list[str] = None,
+                    id_range: tuple[int, int] = None, date_column: str = None,
+                    date_range: tuple[datetime, datetime] = None) -> tuple[sql.Composed, list, list[str]]:
+        """Build the SELECT query of an export.
+
+        Args:
+            item_type: Type of item to export (either 'request' or 'order')
+            column_types: Datatype of every column of the table (see Exporter.get_column_types)
+            columns: Names of the columns to export (None for all columns)
+            id_range: Request ids or work order numbers (without prefix) to export, as (first, last) (both inclusive)
+            date_column: Timestamp column to filter by
+            date_range: Dates to export, as (first, last) (both inclusive; either can be None for no bound)
+
+        Returns:
+            The query, its parameters, and the exported column names
+
+        Raises:
+            ValueError if a column does not exist or the date column is not a timestamp column
+        """
+        table, key_column = Exporter._tables[item_type]
+        columns = columns or list(column_types)
+        unknown = [column for column in columns if column not in column_types]
+        if unknown:
+            raise ValueError(f"unknown {item_type} columns {unknown} (available: {list(column_types)})")
+
+        conditions = []
+        params = []
+        if id_range is not None:
+            key = sql.Identifier(key_column)
+            if item_type == 'order':  # Compare the number after the prefix
+                key = sql.SQL("CAST(substring({} FROM '[0-9]+$') AS BIGINT)").format(key)
+            conditions.append(sql.SQL("{} BETWEEN %s AND %s").format(key))
+            params += list(id_range)
+        if date_column is not None and date_range is not None:
+            if not column_types.get(date_column, '').startswith(('timestamp', 'date')):
+                raise ValueError(f"[{date_column}] is not a date column of table [{table}]")
+            first, last = date_range
+            if first is not None:
+                conditions.append(sql.SQL("{} >= %s").format(sql.Identifier(date_column)))
+                params.append(first)
+            if last is not None:
+                conditions.append(sql.SQL("{} <= %s").format(sql.Identifier(date_column)))
+                params.append(last)
+
+        query = sql.SQL("SELECT {} FROM {}").format(sql.SQL(', ').join(map(sql.Identifier, columns)),
+                                                    sql.Identifier(table))
+        if conditions:
+            query += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions)
+        query += sql.SQL(" ORDER BY {}").format(sql.Identifier(key_column))
+        return query, params, columns
+
+    def export(self, item_type: str, path: Path, file_format: str = 'csv', columns: list[str] = None,
+               id_range: tuple[int, int] = None, date_column: str = None, date_range: tuple[datetime, datetime] = None,
+               compress: bool = False) -> int:
+        """Stream the request or order table (or a selection of it) into a CSV, JSON Lines or Parquet file.
+
+        Args:
+            item_type: Type of item to export (either 'request' or 'order')
+            path: Path of the output file ('.gz' is appended to compressed CSV and JSON Lines files)
+            file_format: Format of the output file (one of Exporter.formats)
+            columns: Names of the columns to export (None for all columns)
+            id_range: Request ids or work order numbers (without prefix) to export, as (first, last) (both inclusive)
+            date_column: Timestamp column to filter by (e.g. 'accept_date' or 'request_date')
+            date_range: Dates to export, as (first, last) (both inclusive; either can be None for no bound)
+            compress: True to gzip CSV and JSON Lines files or to zstd-compress Parquet files (instead of snappy)
+
+        Returns:
+            The number of exported rows
+
+        Raises:
+            ValueError if the format, a column or the date column is invalid
+            ImportError if a Parquet export is requested but pyarrow is not installed
+        """
+        if file_format not in Exporter.formats:
+            raise ValueError(f"unknown export format [{file_format}] (available: {Exporter.formats})")
+        if file_format == 'parquet' and pyarrow is None:
+            raise ImportError("Parquet exports require pyarrow (pip install pyarrow)")
+        if compress and file_format != 'parquet':
+            path = path.with_name(path.name + '.gz')
+
+        host, dbname, user, password, port = self.db_args
+        connection = psycopg2.connect(host=host, dbname=dbname, user=user, password=password, port=port)
+        connection.set_session(readonly=True)
+        start_time = time.perf_counter()
+        try:
+            with connection.cursor() as cursor:
+                column_types = self.get_column_types(cursor, Exporter._tables[item_type][0])
+            query, params, columns = self.build_query(item_type, column_types, columns, id_range, date_column,
+                                                      date_range)
+
+            # A named cursor keeps the result set on the server; only chunk_size rows are held in memory at a time
+            with connection.cursor(name=f'bwork_export_{item_type}') as cursor:
+                cursor.itersize = self.chunk_size
+                cursor.execute(query, params)
+                if file_format == 'parquet':
+                    num_rows = self.write_parquet(cursor, path, columns, column_types, compress)
+                else:
+                    open_file = gzip.open if compress else open
+                    with open_file(path, 'wt', encoding='utf-8', newline='') as file:
+                        if file_format == 'csv':
+                            num_rows = self.write_csv(cursor, file, columns)
+                        else:
+                            num_rows = self.write_jsonl(cursor, file, columns)
+        finally:
+            connection.rollback()
+            connection.close()
+
+        self.log.add(f"exported [{num_rows}] {item_type}s to [{path}] in [{time.perf_counter() - start_time:.1f}] "
+                     f"seconds")
+        return num_rows
+
+    def fetch_chunks(self, cursor):
+        """Yield the rows of an executed query in chunks of chunk_size rows.
+
+        Args:
+            cursor: Named cursor the export query was executed on
+
+        Yields:
+            Lists of row tuples
+        """
+        while rows := cursor.fetchmany(self.chunk_size):
+            yield rows
+
+    def write_csv(self, cursor, file, columns: list[str]) -> int:
+        """Write the rows of an executed query as CSV (with a header row; values are quoted where necessary).
+
+        Args:
+            cursor: Named cursor the export query was executed on
+            file: Text file to write to
+            columns: Names of the exported columns
+
+        Returns:
+            The number of written rows
+        """
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        num_rows = 0
+        for rows in self.fetch_chunks(cursor):
+            writer.writerows(rows)
+            num_rows += len(rows)
+        return num_rows
+
+    @staticmethod
+    def to_json(value) -> str:
+        """Convert a value that JSON does not support (dates, decimals) to text.
+
+        Args:
+            value: The value
+
+        Returns:
+            The value in ISO 8601 format for dates, otherwise as text
+        """
+        return value.isoformat() if isinstance(value, datetime) else str(value)
+
+    def write_jsonl(self, cursor, file, columns: list[str]) -> int:
+        """Write the rows of an executed query as JSON Lines (one object per row; dates in ISO 8601 format).
+
+        Args:
+            cursor: Named cursor the export query was executed on
+            file: Text file to write to
+            columns: Names of the exported columns
+
+        Returns:
+            The number of written rows
+        """
+        num_rows = 0
+        for rows in self.fetch_chunks(cursor):
+            file.writelines(json.dumps(dict(zip(columns, row)), default=Exporter.to_json) + '\n' for row in rows)
+            num_rows += len(rows)
+        return num_rows
+
+    def write_parquet(self, cursor, path: Path, columns: list[str], column_types: dict[str, str],
+                      compress: bool) -> int:
+        """Write the rows of an executed query as Parquet (one row group per chunk).
+
+        Args:
+            cursor: Named cursor the export query was executed on
+            path: Path of the output file
+            columns: Names of the exported columns
+            column_types: Datatype of every column of the table (see Exporter.get_column_types)
+            compress: True to use zstd compression (instead of snappy)
+
+        Returns:
+            The number of written rows
+        """
+        def get_type(data_type: str):
+            if data_type in ('integer', 'bigint', 'smallint'):
+                return pyarrow.int64()
+            if data_type.startswith('timestamp'):
+                return pyarrow.timestamp('us')
+            if data_type == 'date':
+                return pyarrow.date32()
+            return pyarrow.string()
+
+        schema = pyarrow.schema([(column, get_type(column_types[column])) for column in columns])
+        num_rows = 0
+        with pyarrow.parquet.ParquetWriter(path, schema, compression='zstd' if compress else 'snappy') as writer:
+            for rows in self.fetch_chunks(cursor):
+                data = {column: [row[i] for row in rows] for i, column in enumerate(columns)}
+                writer.write_table(pyarrow.Table.from_pydict(data, schema=schema))
+                num_rows += len(rows)
+        return num_rows
@@ -0,0 +1,94 @@
+import re
+from datetime import datetime
+from Metrics import Metrics
+
+
+class FieldParser:
+    """Contains utility functions for converting scraped text into typed values (done once, when a page is parsed)."""
+
+    # Date/time formats used by the maintenance site (tried in order)
+    timestamp_formats = ["%m/%d/%Y %I:%M:%S %p", "%m/%d/%Y %I:%M %p", "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M",
+                         "%m/%d/%Y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"]
+    _leading_int = re.compile(r"^\s*(\d+)")
+    # strptime directives of the timestamp formats -> (regular expression, PostgreSQL to_timestamp pattern)
+    _sql_directives = {'%m': (r"\d{1,2}", "MM"), '%d': (r"\d{1,2}", "DD"), '%Y': (r"\d{4}", "YYYY"),
+                       '%I': (r"\d{1,2}", "HH12"), '%H': (r"\d{1,2}", "HH24"), '%M': (r"\d{2}", "MI"),
+                       '%S': (r"\d{2}", "SS"), '%p': (r"[AaPp][Mm]", "AM")}
+
+    @staticmethod
+    def parse_timestamp(text: str) -> datetime | None:
+        """Parse a date or date and time.
+
+        Args:
+            text: Scraped text of the date
+
+        Returns:
+            The parsed date or None if it is not in a known format (counted as fields_unparsed; the raw text is kept
+            with the record, see PageParser.set_field, and in the page archive to re-extract once the format is known,
+            see Reextractor)
+        """
+        for timestamp_format in FieldParser.timestamp_formats:
+            try:
+                return datetime.strptime(text, timestamp_format)
+            except ValueError:
+                pass
+        Metrics.count('fields_unparsed')
+        return None
+
+    @staticmethod
+    def get_sql_timestamp_patterns() -> list[tuple[str, str]]:
+        """Translate FieldParser.timestamp_formats for PostgreSQL, so the database converts dates exactly like
+        FieldParser.parse_timestamp (a plain cast would read them according to the server's DateStyle, e.g. swapping
+        day and month).
+
+        Returns:
+            List of (regular expression matching the whole text, to_timestamp pattern) in the order of the formats
+        """
+        patterns = []
+        for timestamp_format in FieldParser.timestamp_formats:
+            regex, sql_format = "^", ""
+            for part in re.split(r"(%[a-zA-Z])", timestamp_format):
+                if part in FieldParser._sql_directives:
+                    regex += FieldParser._sql_directives[part][0]
+                    sql_format += FieldParser._sql_directives[part][1]
+                else:  # Separators (slashes, dashes, colons and spaces) mean the same in both
+                    regex += part
+                    sql_format += part
+            patterns.append((regex + "$", sql_format))
+        return patterns
+
+    @staticmethod
+    def parse_int(text: str) -> int | None:
+        """Parse the leading integer of a value (e.g. '4 Urgent' -> 4 for work order priorities).
+
+        Args:
+            text: Scraped text of the value
+
+        Returns:
+            The parsed integer or None if it does not start with an integer (counted as fields_unparsed, like
+            FieldParser.parse_timestamp)
+        """
+        match = FieldParser._leading_int.match(text)
+        if match is None:
+            Metrics.count('fields_unparsed')
+            return None
+        return int(match.group(1))
+
+    @staticmethod
+    def parse_value(text: str | None, field_type: type) -> datetime | int | str | None:
+        """Convert the scraped text of a field to the field's type.
+
+        Args:
+            text: Scraped text of the field (or None if the field is missing)
+            field_type: Type of the field (datetime, int or str)
+
+        Returns:
+            The typed value (None if the field is missing or empty)
+        """
+        if not text:
+            return None
+        if field_type is datetime:
+            return FieldParser.parse_timestamp(text)
+        if field_type is int:
+            return FieldParser.parse_int(text)
+        return text
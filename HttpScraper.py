@@ -0,0 +1,180 @@
+import requests
+from requests.adapters import HTTPAdapter
+from Metrics import Metrics
+from PageParser import PageParser
+from Scraper import Scraper
+from SessionExpiredError import SessionExpiredError
+from WorkOrder import WorkOrder
+from WorkOrderRequest import WorkOrderRequest
+
+
+class HttpScraper:
+    def __init__(self, cookies: list[dict], request_url: str, order_url: str, pool_size: int = 10,
+                 timeout: float = 10.0):
+        """A browserless webscraper that fetches work order and work order request pages directly over HTTP using the
+        cookies of an already-authenticated session.
+
+        Args:
+            cookies: List of dictionary-representations of session cookies (as returned by Scraper.get_cookies)
+            request_url: URL of a work request detail page with '{}' in place of the request id
+            order_url: URL of a work order detail page with '{}' in place of the order number
+            pool_size: Maximum number of pooled connections kept open to the maintenance site
+            timeout: Time (in seconds) to wait for a page before giving up
+        """
+        self.request_url = request_url
+        self.order_url = order_url
+        self.timeout = timeout
+        self.archive = None  # PageArchive to store every scraped page in (if any)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.add_cookies(cookies)
+
+    @staticmethod
+    def from_scraper(scraper: Scraper, request_url: str = 'auto', order_url: str = 'auto', pool_size: int = 10,
+                     timeout: float = 10.0, prefix: str = 'HM-') -> 'HttpScraper':
+        """Create an HttpScraper that reuses the Calnet session of a logged-in (browser) Scraper.
+
+        Args:
+            scraper: Logged-in Scraper to take cookies (and, if necessary, detail page URLs) from
+            request_url: Work request detail page URL template ('auto' to discover it through the scraper)
+            order_url: Work order detail page URL template ('auto' to discover it through the scraper)
+            pool_size: Maximum number of pooled connections kept open to the maintenance site
+            timeout: Time (in seconds) to wait for a page before giving up
+            prefix: Prefix of work order numbers (used to discover the work order URL template)
+
+        Returns:
+            An HttpScraper sharing the scraper's session
+        """
+        if request_url == 'auto':
+            request_url = scraper.discover_page_url('request')
+        if order_url == 'auto':
+            order_url = scraper.discover_page_url('order', prefix)
+        return HttpScraper(scraper.get_cookies(), request_url, order_url, pool_size=pool_size, timeout=timeout)
+
+    def add_cookies(self, cookies: list[dict]) -> None:
+        """Add a list of cookies to the HTTP session.
+
+        Args:
+            cookies: List of dictionary-representations of cookies (as returned by Scraper.get_cookies)
+        """
+        for cookie in cookies:
+            self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''),
+                                     path=cookie.get('path', '/'), secure=cookie.get('secure', False))
+
+    def set_cookies(self, cookies: list[dict]) -> None:
+        """Replace all cookies of the HTTP session (e.g. with those of a new Calnet login, see
+        MaintenanceDatabase.renew_session).
+
+        Args:
+            cookies: List of dictionary-representations of cookies (as returned by Scraper.get_cookies)
+        """
+        self.session.cookies.clear()
+        self.add_cookies(cookies)
+
+    def get_cookies(self) -> list[dict]:
+        """Get a list of the cookies currently held by the HTTP session.
+
+        Returns:
+            List of dictionary-representations of cookies
+        """
+        return [{'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path, 'secure': c.secure}
+                for c in self.session.cookies]
+
+    def fetch_page(self, url: str) -> str:
+        """Fetch the raw HTML of a single page.
+
+        Args:
+            url: URL of the page
+
+        Returns:
+            The HTML of the page
+
+        Raises:
+            requests.RequestException if the page cannot be fetched
+        """
+        with Metrics.span('http_fetch'):
+            response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.text
+
+    def fetch_item_page(self, url: str) -> str | None:
+        """Fetch the raw HTML of a work request or work order page.
+
+        Args:
+            url: URL of the page
+
+        Returns:
+            The HTML of the page or None if the site reports that the page does not exist (HTTP 404)
+
+        Raises:
+            requests.RequestException if the page cannot be fetched for any other reason
+        """
+        try:
+            return self.fetch_page(url)
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return None
+            raise
+
+    def fetch_item(self, item_type: str, item_id: int | str) -> str | None:
+        """Fetch the raw HTML of a single work request or work order page (without parsing it, see Pipeline).
+
+        Args:
+            item_type: Type of item to fetch (either 'request' or 'order')
+            item_id: The id of the work request or the order number of the work order
+
+        Returns:
+            The HTML of the item's page or None if no such item exists
+
+        Raises:
+            requests.RequestException if the page cannot be fetched
+            SessionExpiredError if the site served a login page instead of the item's page
+        """
+        url = self.request_url if item_type == 'request' else self.order_url
+        page_source = self.fetch_item_page(url.format(item_id))
+        if page_source is not None and PageParser.is_logged_out(page_source):
+            raise SessionExpiredError(f"a login page was served instead of {item_type} [{item_id}]")
+        if page_source is not None and self.archive is not None:
+            self.archive.add(item_type, item_id, page_source)
+        return page_source
+
+    def scrape_request(self, request_id: int) -> WorkOrderRequest:
+        """Scrape a single work request.
+
+        Args:
+            request_id: The id of the work request
+
+        Returns:
+            The scraped work request as a WorkOrderRequest object (empty if no such request exists)
+
+        Raises:
+            requests.RequestException if the page cannot be fetched
+            SessionExpiredError if the site served a login page instead of the item's page
+            PageLoadError if the page failed to load (see PageParser.parse_item)
+        """
+        page_source = self.fetch_item('request', request_id)
+        return PageParser.parse_item('request', page_source, request_id)
+
+    def scrape_order(self, order_number: str) -> WorkOrder:
+        """Scrape a single work order.
+
+        Args:
+            order_number: The order number of the work order
+
+        Returns:
+            The scraped work order as a WorkOrder object (empty if no such work order exists)
+
+        Raises:
+            requests.RequestException if the page cannot be fetched
+            SessionExpiredError if the site served a login page instead of the item's page
+            PageLoadError if the page failed to load (see PageParser.parse_item)
+        """
+        page_source = self.fetch_item('order', order_number)
+        return PageParser.parse_item('order', page_source, order_number)
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self.session.close()
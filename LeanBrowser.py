@@ -0,0 +1,171 @@
+import json
+from urllib.parse import urlsplit
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.webdriver import WebDriver
+from Metrics import Metrics
+
+
+class LeanBrowser:
+    # URL extensions of each resource type that can be blocked (Network.setBlockedURLs matches URLs, not types)
+    type_extensions = {
+        'image': ('gif', 'png', 'jpg', 'jpeg', 'ico', 'svg', 'webp', 'bmp'),
+        'stylesheet': ('css',),
+        'font': ('woff', 'woff2', 'ttf', 'otf', 'eot'),
+        'media': ('mp4', 'webm', 'mp3', 'wav', 'ogg'),
+        'script': ('js',),
+    }
+    default_rules = {'image': 'deny', 'stylesheet': 'deny', 'font': 'deny', 'media': 'deny', 'script': 'allow'}
+    flags = ('--disable-gpu', '--disable-extensions', '--disable-background-networking')
+    usage_interval = 50  # Number of pages between reads of the browser's network log
+
+    def __init__(self, rules: dict[str, str] = None):
+        """Settings and network accounting of a lean Chrome: resources of denied types (e.g. images, stylesheets and
+        fonts, which scraping never looks at) are blocked, pages count as loaded once their HTML is parsed (the 'eager'
+        page load strategy) and the GPU, extensions and background networking are turned off.
+
+        The requests and bytes the browser loads and the requests it was kept from making (and their sizes) are
+        counted in Metrics from the browser's network log. Blocked resources are never requested from any server to
+        find out their sizes. Instead, each browser loads its first item page in full, and the sizes of that page's
+        resources are recorded from the network log before blocking starts. Blocked resources that page did not load
+        count as 0 bytes, so the bytes avoided are a lower bound.
+
+        Args:
+            rules: Dictionary mapping resource types (see LeanBrowser.type_extensions) to 'allow' or 'deny' (types that
+                are not listed are allowed; None for LeanBrowser.default_rules)
+
+        Raises:
+            ValueError if a rule names an unknown resource type or action
+        """
+        self.rules = dict(LeanBrowser.default_rules if rules is None else rules)
+        for resource_type, action in self.rules.items():
+            if resource_type not in LeanBrowser.type_extensions:
+                raise ValueError(f"unknown resource type [{resource_type}] (available: "
+                                 f"{list(LeanBrowser.type_extensions)})")
+            if action not in ('allow', 'deny'):
+                raise ValueError(f"unknown action [{action}] for resource type [{resource_type}] (use allow or deny)")
+
+        self.denied_extensions = {extension for resource_type, action in self.rules.items() if action == 'deny'
+                                  for extension in LeanBrowser.type_extensions[resource_type]}
+        self.pending = {}  # Request id -> URL of requests whose outcome is not in the network log yet
+        self.sizes = {}  # URL -> size (in bytes) of resources of denied types, measured while they were not blocked
+        self.pages = 0  # Number of pages loaded since the network log was last read
+        self.blocking = False  # True once the denied resource types are blocked (after the first page, see start)
+
+    @staticmethod
+    def parse_rules(text: str) -> dict[str, str]:
+        """Parse resource rules from the config (e.g. "image:deny, stylesheet:deny, script:allow").
+
+        Args:
+            text: Comma-separated list of <resource type>:<allow or deny>
+
+        Returns:
+            Dictionary mapping resource types to 'allow' or 'deny'
+        """
+        rules = {}
+        for rule in text.split(','):
+            if rule.strip():
+                resource_type, _, action = rule.partition(':')
+                rules[resource_type.strip().lower()] = action.strip().lower()
+        return rules
+
+    def get_blocked_patterns(self) -> list[str]:
+        """Get the URL patterns of every denied resource type.
+
+        Returns:
+            List of URL patterns ('*' matches any text)
+        """
+        patterns = []
+        for resource_type, action in self.rules.items():
+            if action == 'deny':
+                for extension in LeanBrowser.type_extensions[resource_type]:
+                    patterns += [f"*.{extension}", f"*.{extension}?*"]
+        return patterns
+
+    def configure(self, chrome_options: Options) -> None:
+        """Apply the lean settings to the options of a webdriver that has not started yet.
+
+        Args:
+            chrome_options: Options of the webdriver
+        """
+        for flag in LeanBrowser.flags:
+            chrome_options.add_argument(flag)
+        chrome_options.page_load_strategy = 'eager'
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})  # Network log (see record_usage)
+
+    def is_denied(self, url: str) -> bool:
+        """Check whether a URL is a resource of a denied type (see LeanBrowser.get_blocked_patterns).
+
+        Args:
+            url: URL of the resource
+
+        Returns:
+            True if the resource is (or will be) blocked, False otherwise
+        """
+        _, _, extension = urlsplit(url).path.rpartition('.')
+        return extension.lower() in self.denied_extensions
+
+    def start(self, driver: WebDriver) -> None:
+        """Start recording the network use of a started webdriver. Blocking starts after its first item page (see
+        LeanBrowser.record_usage_if_due).
+
+        Args:
+            driver: The webdriver
+        """
+        driver.execute_cdp_cmd('Network.enable', {})
+
+    def block(self, driver: WebDriver) -> None:
+        """Start blocking the denied resource types in a started webdriver.
+
+        Args:
+            driver: The webdriver
+        """
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.get_blocked_patterns()})
+        self.blocking = True
+
+    def record_usage_if_due(self, driver: WebDriver) -> None:
+        """Count a page about to be loaded and read the network log every LeanBrowser.usage_interval pages (reading
+        the log is a round trip of its own). Before the second page, the sizes of the resources of the first (fully
+        loaded) page are recorded and blocking starts.
+
+        Args:
+            driver: The webdriver
+        """
+        if not self.blocking and self.pages > 0:
+            self.record_usage(driver)
+            self.block(driver)
+        self.pages += 1
+        if self.pages >= LeanBrowser.usage_interval:
+            self.record_usage(driver)
+
+    def record_usage(self, driver: WebDriver) -> None:
+        """Read the network log of a webdriver (emptying it) and count the loaded and blocked requests and bytes in
+        Metrics (browser_requests_loaded, browser_bytes_loaded, browser_requests_blocked and browser_bytes_blocked).
+        The sizes of loaded resources of denied types are recorded to count the bytes of later blocked requests.
+
+        Args:
+            driver: The webdriver
+        """
+        self.pages = 0
+        blocked = []
+        for entry in driver.get_log('performance'):
+            message = json.loads(entry['message'])['message']
+            params = message.get('params', {})
+            match message.get('method'):
+                case 'Network.requestWillBeSent':
+                    self.pending[params['requestId']] = params['request']['url']
+                case 'Network.loadingFinished':
+                    url = self.pending.pop(params['requestId'], None)
+                    size = params.get('encodedDataLength', 0)
+                    Metrics.count('browser_requests_loaded')
+                    Metrics.count('browser_bytes_loaded', size)
+                    if url is not None and self.is_denied(url):  # Cached loads report 0 bytes
+                        self.sizes[url] = max(self.sizes.get(url, 0), size)
+                case 'Network.loadingFailed':
+                    url = self.pending.pop(params['requestId'], None)
+                    if params.get('blockedReason') is not None and url is not None:
+                        blocked.append(url)
+        if not blocked:
+            return None
+
+        Metrics.count('browser_requests_blocked', len(blocked))
+        Metrics.count('browser_bytes_blocked', sum(self.sizes.get(url, 0) for url in blocked))
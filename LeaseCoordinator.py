@@ -0,0 +1,225 @@
+import os
+import socket
+import threading
+from contextlib import contextmanager
+import psycopg2
+from Log import Log
+
+
+class LeaseCoordinator:
+    def __init__(self, db_args: tuple, log: Log, worker_name: str = None, lease_seconds: int = 600):
+        """Coordinates scraping across any number of machines through a table of leases in the shared database.
+
+        A range of request ids or work order numbers is split into chunks (one row of the scrape_lease table each).
+        Workers claim pending chunks with SELECT ... FOR UPDATE SKIP LOCKED, so no two workers ever get the same chunk
+        and claiming never waits on another worker. A claimed chunk is leased for lease_seconds and renewed while the
+        worker is busy with it (see LeaseCoordinator.hold); if a worker dies, its lease expires and the chunk is issued
+        to the next worker that asks. All lease times use the database's clock, so worker clocks do not matter.
+
+        Args:
+            db_args: Tuple of arguments to connect to the database (see Config.get_database_args)
+            log: Log object to record progress and errors to
+            worker_name: Name recorded on the leases of this worker (<hostname>:<process id> by default)
+            lease_seconds: Time (in seconds) a lease lasts without being renewed
+        """
+        self.log = log
+        self.worker_name = worker_name if worker_name is not None else f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+
+        host, dbname, user, password, port = db_args
+        self.connection = psycopg2.connect(host=host, dbname=dbname, user=user, password=password, port=port)
+        self.connection.autocommit = True  # Every statement is its own (short) transaction
+        self.cursor = self.connection.cursor()
+        self.lock = threading.Lock()  # The cursor is shared with the renewing thread (see LeaseCoordinator.hold)
+        self.initialize_lease_table()
+
+    def initialize_lease_table(self) -> None:
+        """Create the table of scrape leases if none exists yet."""
+        with self.lock:
+            self.cursor.execute("""CREATE TABLE IF NOT EXISTS scrape_lease (
+                id SERIAL PRIMARY KEY,
+                item_type VARCHAR(10) NOT NULL,
+                start_id INTEGER NOT NULL,
+                stop_id INTEGER NOT NULL,
+                prefix VARCHAR(10) NOT NULL DEFAULT '',
+                status VARCHAR(10) NOT NULL DEFAULT 'pending',
+                worker VARCHAR(100),
+                lease_expires TIMESTAMP,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER,
+                completed_at TIMESTAMP,
+                UNIQUE (item_type, start_id)
+                )
+                """)
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS scrape_lease_open_idx ON scrape_lease (id) "
+                                "WHERE status <> 'done'")
+
+    def create_leases(self, item_type: str, start: int, stop: int, chunk_size: int = 1000, prefix: str = '') -> int:
+        """Split a range of request ids or work order numbers into pending leases (chunks that already have a lease
+        are left as they are, so a range can safely be split again).
+
+        Args:
+            item_type: Type of item in the range (either 'request' or 'order')
+            start: First id of the range (inclusive)
+            stop: Last id of the range (exclusive)
+            chunk_size: Number of ids per lease
+            prefix: Prefix of the work order numbers (ignore for requests)
+
+        Returns:
+            The number of leases created
+        """
+        with self.lock:
+            self.cursor.execute("""INSERT INTO scrape_lease (item_type, start_id, stop_id, prefix)
+                SELECT %s, s, LEAST(s + %s, %s), %s FROM generate_series(%s, %s - 1, %s) AS s
+                ON CONFLICT (item_type, start_id) DO NOTHING
+                """, (item_type, chunk_size, stop, prefix, start, stop, chunk_size))
+            created = self.cursor.rowcount
+        self.log.add(f"created [{created}] {item_type} leases of up to [{chunk_size}] ids from [{prefix}{start}] to "
+                     f"[{prefix}{stop}]")
+        return created
+
+    def claim(self, item_type: str = None, max_attempts: int = 3) -> tuple[int, str, int, int, str, int] | None:
+        """Claim the oldest pending (or expired) lease. Expired leases that were already issued max_attempts times
+        (e.g. every worker that took them crashed) are marked as failed instead of being issued again.
+
+        Args:
+            item_type: Type of item to claim a lease of (None for any type)
+            max_attempts: Number of times a lease is issued before it is given up on
+
+        Returns:
+            Tuple of (lease id, item type, start id, stop id, prefix, attempt number) or None if no lease is available
+        """
+        with self.lock:
+            self.cursor.execute("""UPDATE scrape_lease SET status = 'failed', lease_expires = NULL, completed_at = now()
+                WHERE status = 'leased' AND lease_expires < now() AND attempts >= %s
+                    AND (%s IS NULL OR item_type = %s)
+                RETURNING id, worker
+                """, (max_attempts, item_type, item_type))
+            abandoned = self.cursor.fetchall()
+            self.cursor.execute("""UPDATE scrape_lease SET status = 'leased', worker = %s, attempts = attempts + 1,
+                    lease_expires = now() + make_interval(secs => %s)
+                WHERE id = (SELECT id FROM scrape_lease
+                            WHERE (status = 'pending'
+                                   OR (status = 'leased' AND lease_expires < now() AND attempts < %s))
+                                AND (%s IS NULL OR item_type = %s)
+                            ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED)
+                RETURNING id, item_type, start_id, stop_id, prefix, attempts
+                """, (self.worker_name, self.lease_seconds, max_attempts, item_type, item_type))
+            lease = self.cursor.fetchone()
+        for lease_id, worker in abandoned:
+            self.log.add(f"[{self.worker_name}] gave up on lease [{lease_id}] after [{max_attempts}] attempts (it last "
+                         f"expired on [{worker}])", level='warning')
+        if lease is not None:
+            lease_id, lease_type, start, stop, prefix, attempts = lease
+            retry = f" (attempt [{attempts}])" if attempts > 1 else ""
+            self.log.add(f"[{self.worker_name}] claimed lease [{lease_id}]: {lease_type}s [{prefix}{start}] to "
+                         f"[{prefix}{stop}]{retry}")
+        return lease
+
+    def renew(self, lease_id: int) -> bool:
+        """Extend a lease held by this worker by another lease_seconds.
+
+        Args:
+            lease_id: id of the lease
+
+        Returns:
+            True if the lease was renewed, False if this worker no longer holds it (it expired and was re-issued)
+        """
+        with self.lock:
+            self.cursor.execute("""UPDATE scrape_lease SET lease_expires = now() + make_interval(secs => %s)
+                WHERE id = %s AND worker = %s AND status = 'leased'
+                """, (self.lease_seconds, lease_id, self.worker_name))
+            return self.cursor.rowcount == 1
+
+    @contextmanager
+    def hold(self, lease_id: int):
+        """Keep renewing a lease (from a background thread, three times per lease period) while a block of code works
+        on it.
+
+        Args:
+            lease_id: id of the lease
+        """
+        stopped = threading.Event()
+
+        def renew_until_stopped() -> None:
+            while not stopped.wait(self.lease_seconds / 3):
+                try:
+                    if not self.renew(lease_id):
+                        self.log.add(f"[{self.worker_name}] lost lease [{lease_id}] (it expired and was re-issued)",
+                                     level='warning')
+                        return None
+                except psycopg2.Error as e:  # Try again at the next renewal (the lease has not expired yet)
+                    self.log.add(f"[{self.worker_name}] failed to renew lease [{lease_id}]: {e}", level='warning')
+
+        renewer = threading.Thread(target=renew_until_stopped, daemon=True)
+        renewer.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            renewer.join()
+
+    def complete(self, lease_id: int, failed: int = 0, max_attempts: int = 3) -> bool:
+        """Mark a lease held by this worker as done, or return it to the pending leases if some of its items failed
+        and it has attempts left.
+
+        Args:
+            lease_id: id of the lease
+            failed: Number of items of the lease that could not be scraped
+            max_attempts: Number of times a lease with failed items is issued before it is marked as done anyway
+
+        Returns:
+            True if the lease was marked as done, False if it was returned or this worker no longer holds it
+        """
+        with self.lock:
+            self.cursor.execute("""UPDATE scrape_lease SET failed = %s, lease_expires = NULL,
+                    status = CASE WHEN %s > 0 AND attempts < %s THEN 'pending' ELSE 'done' END,
+                    completed_at = CASE WHEN %s > 0 AND attempts < %s THEN NULL ELSE now() END
+                WHERE id = %s AND worker = %s AND status = 'leased'
+                RETURNING status
+                """, (failed, failed, max_attempts, failed, max_attempts, lease_id, self.worker_name))
+            row = self.cursor.fetchone()
+        if row is None:
+            self.log.add(f"[{self.worker_name}] lease [{lease_id}] was re-issued before it was finished",
+                         level='warning')
+            return False
+        if row[0] == 'pending':
+            self.log.add(f"[{self.worker_name}] returned lease [{lease_id}] with [{failed}] failed items for a retry")
+            return False
+        self.log.add(f"[{self.worker_name}] completed lease [{lease_id}]")
+        return True
+
+    def release(self, lease_id: int) -> None:
+        """Return a lease held by this worker to the pending leases without counting the attempt (e.g. when the
+        worker is stopped).
+
+        Args:
+            lease_id: id of the lease
+        """
+        with self.lock:
+            self.cursor.execute("""UPDATE scrape_lease SET status = 'pending', lease_expires = NULL,
+                    attempts = attempts - 1
+                WHERE id = %s AND worker = %s AND status = 'leased'
+                """, (lease_id, self.worker_name))
+        self.log.add(f"[{self.worker_name}] released lease [{lease_id}]")
+
+    def get_progress(self) -> list[tuple[str, str, int, int, int]]:
+        """Get the number of leases (and ids) in each state for each item type.
+
+        Returns:
+            List of (item type, state, leases, ids, failed items) where state is 'pending', 'leased', 'expired', 'done'
+            or 'failed' (given up on after expiring too often, see LeaseCoordinator.claim)
+        """
+        with self.lock:
+            self.cursor.execute("""SELECT item_type,
+                    CASE WHEN status = 'leased' AND lease_expires < now() THEN 'expired' ELSE status END AS state,
+                    count(*), sum(stop_id - start_id), coalesce(sum(failed), 0)
+                FROM scrape_lease GROUP BY 1, 2 ORDER BY 1, 2
+                """)
+            return [(item_type, state, leases, int(ids), int(failed))
+                    for item_type, state, leases, ids, failed in self.cursor.fetchall()]
+
+    def close(self) -> None:
+        """Close the connection to the database."""
+        self.cursor.close()
+        self.connection.close()
@@ -1,35 +1,127 @@
+import atexit
+import json
+import multiprocessing
+import os
+import queue
+import threading
 from datetime import datetime
 from pathlib import Path
 
 
 class Log:
-    def __init__(self):
-        """A log to capture certain events/errors throughout the program's execution (bound to a specific .log file)."""
-        filename = f"Log {datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    levels = ('debug', 'info', 'warning', 'error')
+
+    def __init__(self, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5, quiet: bool = False,
+                 batch_size: int = 500):
+        """A log to capture certain events/errors throughout the program's execution (bound to a specific .jsonl file).
+
+        Messages are written as JSON lines (time, level, process id, message and optionally the item id, phase and
+        duration they concern). Every process (including parallel scrapers the log is passed to) only puts its records
+        on a shared queue; a single writer thread in the process that created the log writes them to the file in
+        batches, so processes never write to the file at once and scraping never waits on file I/O.
+
+        Args:
+            max_bytes: Size (in bytes) after which the log file is rotated (0 to never rotate)
+            backup_count: Number of rotated log files to keep (<name>.1 is the most recent)
+            quiet: True to only print warnings and errors to the console (everything is still written to the file)
+            batch_size: Maximum number of records written at once
+        """
+        filename = f"Log {datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
         self.filepath = Path.cwd() / 'Logs' / filename
-        with open(self.filepath, 'w') as log:
-            log.write(f"log created at time: {datetime.now()}\n\n")
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.quiet = quiet
+        self.batch_size = batch_size
 
-    def add(self, message: str) -> None:
-        """Add a timestamped message to the log and print it to the console.
+        self.records = multiprocessing.Queue()  # Records of all processes (None to stop the writer)
+        self.file = open(self.filepath, 'w', encoding='utf-8')
+        self.writer = threading.Thread(target=self.write_records, daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+        self.add_quiet(f"log created at time: {datetime.now()}")
+
+    def __getstate__(self) -> dict:
+        """Leave out the file and writer thread when the log is passed to another process (which only queues
+        records)."""
+        state = self.__dict__.copy()
+        state['file'] = None
+        state['writer'] = None
+        return state
+
+    def add(self, message: str, level: str = 'info', item_id: int | str = None, phase: str = None,
+            duration: float = None) -> None:
+        """Add a timestamped message to the log and print it to the console (unless quiet and not a warning/error).
 
         Args:
             message: The message to add to the log and print (excluding timestamp)
+            level: Severity of the message (one of Log.levels)
+            item_id: Request id or order number the message concerns (if any)
+            phase: Phase of scraping or writing the message concerns (if any, e.g. 'insert_commit')
+            duration: Duration (in seconds) of the phase (if any)
         """
-        print(self.add_quiet(message))
+        output = self.add_quiet(message, level=level, item_id=item_id, phase=phase, duration=duration)
+        if not self.quiet or level in ('warning', 'error'):
+            print(output)
 
-    def add_quiet(self, message: str) -> str:
+    def add_quiet(self, message: str, level: str = 'info', item_id: int | str = None, phase: str = None,
+                  duration: float = None) -> str:
         """Add a timestamped message to the log (without printing it to the console).
 
         Args:
             message: The message to add to the log (excluding timestamp)
+            level: Severity of the message (one of Log.levels)
+            item_id: Request id or order number the message concerns (if any)
+            phase: Phase of scraping or writing the message concerns (if any)
+            duration: Duration (in seconds) of the phase (if any)
 
         Returns:
             The timestamped log message
         """
-        output = f"[{datetime.now()}] " + message
+        now = datetime.now()
+        record = {'time': now.isoformat(), 'level': level, 'pid': os.getpid(), 'message': message}
+        if item_id is not None:
+            record['item_id'] = item_id
+        if phase is not None:
+            record['phase'] = phase
+        if duration is not None:
+            record['duration'] = round(duration, 6)
+        self.records.put(record)
+        return f"[{now}] " + message
+
+    def write_records(self) -> None:
+        """Write queued records to the log file in batches until the log is closed (run by the writer thread)."""
+        while True:
+            batch = [self.records.get()]
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = [json.dumps(record, default=str) for record in batch if record is not None]
+            if lines:
+                self.file.write('\n'.join(lines) + '\n')
+                self.file.flush()
+                if 0 < self.max_bytes <= self.file.tell():
+                    self.rotate()
+            if batch[-1] is None:
+                return None
 
-        with open(self.filepath, 'a') as log:
-            log.write(output + "\n")
+    def rotate(self) -> None:
+        """Move the current log file to <name>.1 (shifting older rotated files up by one) and start a new one."""
+        self.file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            older = self.filepath.with_name(f"{self.filepath.name}.{index}")
+            if older.exists():
+                os.replace(older, self.filepath.with_name(f"{self.filepath.name}.{index + 1}"))
+        if self.backup_count > 0:
+            os.replace(self.filepath, self.filepath.with_name(f"{self.filepath.name}.1"))
+        self.file = open(self.filepath, 'w', encoding='utf-8')
 
-        return output
+    def close(self) -> None:
+        """Write all remaining records and close the log file (only in the process that created the log)."""
+        if self.writer is None or not self.writer.is_alive():
+            return None
+        self.records.put(None)
+        self.writer.join()
+        self.file.close()
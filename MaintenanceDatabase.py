@@ -1,15 +1,37 @@
+import functools
+import threading
 import psycopg2
+import requests
+from psycopg2.extensions import cursor as Cursor
+from selenium.common import exceptions
 from Scraper import *
+from HttpScraper import HttpScraper
+from AsyncEngine import AsyncEngine
+from Pipeline import Pipeline
+from BatchWriter import BatchWriter
+from FieldParser import FieldParser
+from ProgressMap import ProgressMap
+from Metrics import Metrics
+from PageArchive import PageArchive
+from PageParser import PageParser
+from RateController import RateController
+from SessionExpiredError import SessionExpiredError
 from Log import *
 import traceback
+from datetime import datetime
+from WorkOrder import WorkOrder
 from User import *
-from typing import Iterable
+from typing import Callable, Iterable
 from pathlib import Path
 
 
 class MaintenanceDatabase:
     def __init__(self, log: Log, chrome_path: Path, chromedriver_path: Path, calnet_user: User, host: str, dbname: str,
-                 user: str, password: str, port: int, process_id: int = 0, headless=True):
+                 user: str, password: str, port: int, process_id: int = 0, headless=True, backend: str = 'browser',
+                 http_args: tuple = ('auto', 'auto', 10), concurrency: int = 1, batch_size: int = 100,
+                 flush_interval: float = 5.0, session: dict = None, missing_recheck_days: int = 30,
+                 rate_controller: RateController = None, archive_pages: bool = True, pipeline_queue_size: int = 64,
+                 direct_navigation: bool = False, lean_browser: dict[str, str] = None, order_prefix: str = 'HM-'):
         """A connection to a PostgreSQL database with utilities to add work order and work order request data.
 
         Args:
@@ -24,12 +46,40 @@ class MaintenanceDatabase:
             port: Port for the database
             process_id: Unique process id for this database connection (for parallel processing)
             headless: True to run the scraper's webdriver in headless mode
+            backend: Scraping backend to use ('browser' to scrape through Chrome, 'http' to fetch pages directly over
+                HTTP with the browser's Calnet session)
+            http_args: Tuple of (request page URL, order page URL, connection pool size) for the 'http' backend
+            concurrency: Number of page fetches to keep in flight at once (values above 1 require the 'http' backend)
+            batch_size: Number of scraped items to buffer before writing them to the database in one insert
+            flush_interval: Maximum time (in seconds) a scraped item may stay buffered before being written
+            session: Calnet session exported from a logged-in scraper to reuse instead of logging in again (see
+                Scraper.export_session)
+            missing_recheck_days: Time (in days) after which an id found not to exist is scraped again
+            rate_controller: Controller limiting page fetches across all processes that share it (None for no limit)
+            archive_pages: True to store the raw HTML of every scraped page in the PageArchive
+            pipeline_queue_size: Maximum number of items waiting between two stages of the scraping Pipeline (0 to
+                scrape and write items one after another on a single thread instead)
+            direct_navigation: True to open detail pages in the browser directly by their URL (the URLs in http_args)
+                instead of searching for every item through the sidebar (see Scraper.enable_direct_navigation)
+            lean_browser: Resource types the browser blocks ('deny') or loads ('allow') in lean mode (see
+                LeanBrowser), or None for a full browser
+            order_prefix: Prefix of work order numbers (used to discover the work order page URL if it is 'auto')
         """
-        self.scraper = Scraper(chrome_path=chrome_path, chromedriver_path=chromedriver_path, user=calnet_user,
-                               process_id=process_id, headless=headless)
+        self.archive = PageArchive() if archive_pages else None
+        self.session_lock = threading.Lock()  # Held while the scraper logs into Calnet again
+        self.session_ready = threading.Event()  # Cleared while the scraper logs into Calnet again (pauses fetches)
+        self.session_ready.set()
+        self.session_generation = 0  # Number of times the scraper logged into Calnet again
+        self.scraper_args = (chrome_path, chromedriver_path, calnet_user, process_id, headless, backend, http_args,
+                             direct_navigation, lean_browser, order_prefix)
+        self.start_scraper(session)
         self.log = log
         self.db_name = dbname
         self.db_args = (host, dbname, user, password, port)
+        self.concurrency = concurrency
+        self.missing_recheck_days = missing_recheck_days
+        self.rate_controller = rate_controller
+        self.pipeline_queue_size = pipeline_queue_size
 
         self.all_columns_requests = ["id", "room", "status", "building", "tag", "accept_date", "reject_date",
                                      "reject_reason", "location", "item_description", "work_order_num",
@@ -40,16 +90,97 @@ class MaintenanceDatabase:
                                    "date_last_posted", "trade", "contractor_name", "est_completion_date",
                                    "task_description", "requested_action", "corrective_action"]
 
+        self.indexed_order_columns = ["request_date", "schedule_date", "date_closed"]  # Date columns to index
+
         self.connection = psycopg2.connect(host=host, dbname=dbname, user=user, password=password, port=port)
         self.cursor = self.connection.cursor()
 
+        # Serialize table setup/migrations between parallel processes (released on commit)
+        self.cursor.execute("SELECT pg_advisory_xact_lock(hashtext('bwork_schema'))")
         self.initialize_requests_table()
         self.initialize_orders_table()
+        self.initialize_missing_table()
 
         self.connection.commit()
+        self.migrate_order_column_types()
+        self.initialize_link_view()
+        # Typed order columns still stored as TEXT (by an older version, or kept as TEXT by the migration)
+        self.text_order_columns = set(self.get_order_columns_of_type('text', list(WorkOrder.field_types)))
+        self.connection.commit()
+
+        self.progress = None  # Optional ProgressMap of the range currently being scraped
+        self.request_writer = BatchWriter(self.connection, 'request', self.all_columns_requests, log, key_column='id',
+                                          batch_size=batch_size, flush_interval=flush_interval,
+                                          on_write=self.record_write, hash_column='content_hash')
+        self.order_writer = BatchWriter(self.connection, '"order"', self.all_columns_orders, log,
+                                        key_column='order_number', batch_size=batch_size,
+                                        flush_interval=flush_interval, on_write=self.record_write,
+                                        hash_column='content_hash', text_columns=self.text_order_columns)
+        self.missing_writer = BatchWriter(self.connection, 'missing_item', ['item_type', 'item_id'], log,
+                                          key_column='item_type, item_id', batch_size=batch_size,
+                                          flush_interval=flush_interval,
+                                          conflict_action="DO UPDATE SET checked_at = now()")
+
+    def start_scraper(self, session: dict = None) -> None:
+        """Start the scraper (and log it into Calnet) with the scraper arguments given to the constructor.
+
+        Args:
+            session: Calnet session to reuse instead of logging in again (see Scraper.export_session)
+        """
+        (chrome_path, chromedriver_path, calnet_user, process_id, headless, backend, http_args, direct_navigation,
+         lean_browser, order_prefix) = self.scraper_args
+
+        # The browser scraper is always started as it is needed for the Calnet login
+        self.browser_scraper = Scraper(chrome_path=chrome_path, chromedriver_path=chromedriver_path, user=calnet_user,
+                                       process_id=process_id, headless=headless, session=session,
+                                       resource_rules=lean_browser)
+        if backend == 'http':
+            request_url, order_url, pool_size = http_args
+            self.scraper = HttpScraper.from_scraper(self.browser_scraper, request_url=request_url,
+                                                    order_url=order_url, pool_size=pool_size, prefix=order_prefix)
+        else:
+            self.scraper = self.browser_scraper
+            if direct_navigation:
+                request_url, order_url, pool_size = http_args
+                self.browser_scraper.enable_direct_navigation(request_url=request_url, order_url=order_url,
+                                                              prefix=order_prefix)
+        self.scraper.archive = self.archive
+
+    def get_page_urls(self) -> tuple[str, str] | None:
+        """Get the detail page URL templates the scraper opens directly (discovered when it started, if they were set
+        to 'auto'), so other scrapers can reuse them.
+
+        Returns:
+            Tuple of (request page URL, order page URL) or None if the scraper searches for every item instead
+        """
+        if isinstance(self.scraper, HttpScraper):
+            return self.scraper.request_url, self.scraper.order_url
+        if self.browser_scraper.page_urls:
+            return self.browser_scraper.page_urls['request'], self.browser_scraper.page_urls['order']
+        return None
+
+    def close_scraper(self) -> None:
+        """Close the scraper (and its webdriver)."""
+        if self.scraper is not self.browser_scraper:
+            self.scraper.close()
+        self.browser_scraper.close()
+
+    def restart_scraper(self) -> None:
+        """Replace the scraper with a freshly started one (e.g. if its webdriver crashed or has used too much memory).
+        The database connection is kept and the old scraper's Calnet session is reused if it can still be exported."""
+        session = None
+        try:
+            session = self.browser_scraper.export_session()
+        except Exception as e:  # The webdriver may already be gone
+            self.log.add_quiet(f"{traceback.format_exc()}\n", level='error')
+        try:
+            self.close_scraper()
+        except Exception as e:
+            self.log.add_quiet(f"{traceback.format_exc()}\n", level='error')
+        self.start_scraper(session)
 
     def initialize_requests_table(self) -> None:
-        """Create database table for work requests if none exists yet."""
+        """Create database table for work requests if none exists yet (and ensure its ids are unique)."""
         self.cursor.execute("""CREATE TABLE IF NOT EXISTS request (
             id INT,
             room VARCHAR(20),
@@ -66,74 +197,569 @@ class MaintenanceDatabase:
             requested_action TEXT
             )
             """)
+        self.initialize_unique_key('request', 'request_id_key', 'id', self.all_columns_requests)
+        self.initialize_refresh_columns('request')
 
     def initialize_orders_table(self) -> None:
-        """Create database table for work orders if none exists yet."""
+        """Create database table for work orders if none exists yet (and ensure its order numbers are unique)."""
         self.cursor.execute("""CREATE TABLE IF NOT EXISTS "order" (
             order_number VARCHAR(15),
             facility VARCHAR(50),
             building VARCHAR(50),
             location_id VARCHAR(20),
-            priority TEXT,
-            request_date TEXT,
-            schedule_date TEXT,
+            priority INT,
+            request_date TIMESTAMP,
+            schedule_date TIMESTAMP,
             work_status TEXT,
-            date_closed TEXT,
+            date_closed TIMESTAMP,
             main_charge_account TEXT,
             task_code TEXT,
             reference_number TEXT,
             tag_number TEXT,
             item_description TEXT,
             request_time TEXT,
-            date_last_posted TEXT,
+            date_last_posted TIMESTAMP,
             trade TEXT,
             contractor_name TEXT,
-            est_completion_date TEXT,
+            est_completion_date TIMESTAMP,
             task_description TEXT,
             requested_action TEXT,
             corrective_action TEXT
             )
             """)
+        self.initialize_unique_key('"order"', 'order_order_number_key', 'order_number', self.all_columns_orders)
+        self.initialize_refresh_columns('"order"')
+        for column in self.get_order_columns_of_type('timestamp without time zone', self.indexed_order_columns):
+            self.cursor.execute(f'CREATE INDEX IF NOT EXISTS order_{column}_idx ON "order" ({column})')
+
+    def get_order_columns_of_type(self, data_type: str, columns: list[str]) -> list[str]:
+        """Find which of a list of columns of the order table currently have a given datatype.
+
+        Args:
+            data_type: Datatype as named by information_schema (e.g. 'text' or 'timestamp without time zone')
+            columns: Names of the columns to check
+
+        Returns:
+            The names of the columns with the datatype
+        """
+        self.cursor.execute("""SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'order' AND data_type = %s
+                AND column_name = ANY(%s)
+            """, (data_type, list(columns)))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def get_order_column_comment(self, column: str) -> str | None:
+        """Get the comment of a column of the order table.
+
+        Args:
+            column: Name of the column
+
+        Returns:
+            The comment of the column (None if it has none)
+        """
+        self.cursor.execute("""SELECT col_description('"order"'::regclass, ordinal_position::int)
+            FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'order' AND column_name = %s
+            """, (column,))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+
+    def get_unmigrated_order_columns(self) -> list[str]:
+        """Get the date and priority columns of the order table that are still TEXT and have not been given up on by
+        an earlier migration (see MaintenanceDatabase.migrate_order_column_types).
+
+        Returns:
+            The names of the columns left to migrate
+        """
+        # Columns kept as TEXT by an earlier migration are marked with a comment and not retried
+        return [column for column in self.get_order_columns_of_type('text', list(WorkOrder.field_types))
+                if self.get_order_column_comment(column) != 'bwork: kept as text']
+
+    def migrate_order_column_types(self, batch_size: int = 10000) -> None:
+        """Convert the date and priority columns of an order table created by older versions of bWork (which stored
+        every column as TEXT) to TIMESTAMP and INT, and index the date columns.
+
+        The migration is online: values are converted into new columns in small batches (each in its own transaction),
+        so other processes can keep reading and writing the table. Only the final swap of the old and new columns (and
+        a catch-up for rows written in the meantime) briefly locks the table. A column whose values cannot all be
+        converted is kept as TEXT so that no data is lost. Only one process migrates at a time.
+
+        Args:
+            batch_size: Number of rows to convert per transaction
+        """
+        sql_types = {int: 'INT', datetime: 'TIMESTAMP'}
+        columns = self.get_unmigrated_order_columns()
+        if not columns:
+            self.connection.commit()
+            return None
+        self.cursor.execute("SELECT pg_try_advisory_lock(hashtext('bwork_order_types'))")
+        if not self.cursor.fetchone()[0]:  # Another process is migrating
+            self.connection.commit()
+            return None
+
+        try:
+            self.log.add(f"migrating columns {columns} of table [order] to typed columns")
+            # Dates are only read in the formats FieldParser knows (never by the server's DateStyle)
+            formats = ' '.join(f"IF value ~ '{regex}' THEN RETURN to_timestamp(value, '{sql_format}')::TIMESTAMP; "
+                               f"END IF;" for regex, sql_format in FieldParser.get_sql_timestamp_patterns())
+            self.cursor.execute(f"""CREATE OR REPLACE FUNCTION pg_temp.bwork_to_timestamp(value TEXT) RETURNS TIMESTAMP
+                AS $$ BEGIN value := trim(value); {formats} RETURN NULL; EXCEPTION WHEN others THEN RETURN NULL; END; $$
+                LANGUAGE plpgsql STABLE""")
+            self.cursor.execute(r"""CREATE OR REPLACE FUNCTION pg_temp.bwork_to_int(value TEXT) RETURNS INT
+                AS $$ BEGIN RETURN substring(value FROM '^\s*(\d+)')::INT; EXCEPTION WHEN others THEN RETURN NULL;
+                END; $$ LANGUAGE plpgsql IMMUTABLE""")
+            conversions = []
+            for column in columns:
+                sql_type = sql_types[WorkOrder.field_types[column]]
+                self.cursor.execute(f'ALTER TABLE "order" ADD COLUMN IF NOT EXISTS {column}_typed {sql_type}')
+                conversions.append(f"{column}_typed = pg_temp.bwork_to_{sql_type.lower()}({column})")
+            self.connection.commit()
+
+            # Convert in batches of consecutive order numbers
+            last_order_number = ''
+            converted = 0
+            while True:
+                self.cursor.execute("""SELECT max(order_number), count(*) FROM (
+                    SELECT order_number FROM "order" WHERE order_number > %s ORDER BY order_number LIMIT %s
+                    ) AS batch""", (last_order_number, batch_size))
+                batch_end, batch_count = self.cursor.fetchone()
+                if batch_count == 0:
+                    break
+                self.cursor.execute(f"""UPDATE "order" SET {', '.join(conversions)}
+                    WHERE order_number > %s AND order_number <= %s""", (last_order_number, batch_end))
+                self.connection.commit()
+                last_order_number = batch_end
+                converted += batch_count
+                self.log.add(f"converted [{converted}] rows of table [order]")
+
+            # Catch up on rows written during the migration and swap the columns (blocks writes until committed)
+            self.cursor.execute('LOCK TABLE "order" IN SHARE ROW EXCLUSIVE MODE')
+            self.drop_link_view()  # The view depends on the columns being swapped (recreated below)
+            pending = ' OR '.join(f"({column} IS NOT NULL AND {column}_typed IS NULL)" for column in columns)
+            self.cursor.execute(f'UPDATE "order" SET {", ".join(conversions)} WHERE {pending}')
+            for column in columns:
+                self.cursor.execute(f"""SELECT count(*) FROM "order"
+                    WHERE trim({column}) <> '' AND {column}_typed IS NULL""")
+                unconverted = self.cursor.fetchone()[0]
+                if unconverted > 0:
+                    self.log.add(f"kept column [{column}] of table [order] as TEXT ([{unconverted}] values could not "
+                                 f"be converted)")
+                    self.cursor.execute(f'ALTER TABLE "order" DROP COLUMN {column}_typed')
+                    self.cursor.execute(f"""COMMENT ON COLUMN "order".{column} IS 'bwork: kept as text'""")
+                else:
+                    self.cursor.execute(f'ALTER TABLE "order" DROP COLUMN {column}')
+                    self.cursor.execute(f'ALTER TABLE "order" RENAME COLUMN {column}_typed TO {column}')
+            self.create_link_view()
+            self.connection.commit()
+
+            # Index the date columns without blocking writes
+            self.connection.autocommit = True
+            for column in self.get_order_columns_of_type('timestamp without time zone', self.indexed_order_columns):
+                self.cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS order_{column}_idx ON "order" ({column})')
+            self.log.add("finished migrating table [order]")
+        finally:
+            self.connection.rollback()
+            self.connection.autocommit = False
+            self.cursor.execute("SELECT pg_advisory_unlock(hashtext('bwork_order_types'))")
+            self.connection.commit()
+
+    def initialize_link_view(self) -> None:
+        """Create the request_order view (every stored request joined with the work order it links to) and the index
+        used to join them, if they do not exist yet.
+
+        The view is not created while order columns are left to migrate, as it depends on them (the migration creates
+        it once it has swapped the columns). A materialized view left by an older version is replaced.
+        """
+        if self.get_unmigrated_order_columns():
+            self.connection.commit()
+            return None
+        self.cursor.execute("SELECT pg_advisory_xact_lock(hashtext('bwork_schema'))")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS request_work_order_num_idx ON request (work_order_num)")
+        if self.get_link_view_kind() != 'v':
+            self.drop_link_view()
+            self.create_link_view()
+        self.connection.commit()
+
+    def get_link_view_kind(self) -> str | None:
+        """Get the kind of the request_order relation.
+
+        Returns:
+            'v' for a view, 'm' for a materialized view (older versions) or None if it does not exist
+        """
+        self.cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('request_order')")
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+
+    def drop_link_view(self) -> None:
+        """Drop the request_order view (of either kind) if it exists, without committing."""
+        match self.get_link_view_kind():
+            case 'v':
+                self.cursor.execute("DROP VIEW request_order")
+            case 'm':
+                self.cursor.execute("DROP MATERIALIZED VIEW request_order")
+
+    def create_link_view(self) -> None:
+        """Create the request_order view, without committing. It is a plain view, so it always reflects the current
+        requests and work orders (the join uses request_work_order_num_idx and the order table's primary key)."""
+        self.cursor.execute("""CREATE VIEW request_order AS
+            SELECT r.id AS request_id, o.order_number, r.status AS request_status, o.work_status, r.accept_date,
+                o.request_date, o.date_closed
+            FROM request r JOIN "order" o ON o.order_number = r.work_order_num
+            """)
+
+    def initialize_missing_table(self) -> None:
+        """Create the database table of ids known not to exist (the negative cache) if none exists yet.
+
+        Older versions stored such ids as rows with only an id, so those rows are moved into the new table.
+        """
+        self.cursor.execute("SELECT to_regclass('missing_item')")
+        if self.cursor.fetchone()[0] is not None:
+            return None
 
-    def add_request(self, request_id: int) -> None:
+        self.cursor.execute("""CREATE TABLE missing_item (
+            item_type VARCHAR(10),
+            item_id VARCHAR(25),
+            checked_at TIMESTAMP DEFAULT now(),
+            PRIMARY KEY (item_type, item_id)
+            )
+            """)
+        self.cursor.execute(f"""WITH moved AS (
+                DELETE FROM request WHERE num_nonnulls({', '.join(self.all_columns_requests[1:])}) = 0 RETURNING id
+            )
+            INSERT INTO missing_item (item_type, item_id) SELECT 'request', id::text FROM moved ON CONFLICT DO NOTHING
+            """)
+        num_requests = self.cursor.rowcount
+        self.cursor.execute(f"""WITH moved AS (
+                DELETE FROM "order" WHERE num_nonnulls({', '.join(self.all_columns_orders[1:])}) = 0
+                RETURNING order_number
+            )
+            INSERT INTO missing_item (item_type, item_id) SELECT 'order', order_number FROM moved
+            ON CONFLICT DO NOTHING
+            """)
+        num_orders = self.cursor.rowcount
+        if num_requests + num_orders > 0:
+            self.log.add(f"moved [{num_requests}] empty requests and [{num_orders}] empty orders to table "
+                         f"[missing_item]")
+
+    def initialize_refresh_columns(self, table: str) -> None:
+        """Add the columns used to refresh stored items to a table if they do not exist yet.
+
+        content_hash holds a hash of the scraped content of each row (NULL for rows stored by older versions) and
+        checked_at holds the last time the row was scraped (NULL for rows stored by older versions).
+
+        Args:
+            table: Name of the table (quoted if necessary, e.g. '"order"')
+        """
+        self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS content_hash CHAR(32)")
+        self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS checked_at TIMESTAMP")
+        self.cursor.execute(f"ALTER TABLE {table} ALTER COLUMN checked_at SET DEFAULT now()")
+
+    def initialize_unique_key(self, table: str, index_name: str, key_column: str, columns: list[str]) -> None:
+        """Create a unique index on the key column of a table if none exists yet.
+
+        Tables created by older versions have no unique key and may contain duplicate rows, so duplicates are removed
+        first (keeping the most complete row for each key).
+
+        Args:
+            table: Name of the table (quoted if necessary, e.g. '"order"')
+            index_name: Name of the unique index
+            key_column: Column that uniquely identifies each item
+            columns: All columns of the table (used to find the most complete duplicate)
+        """
+        self.cursor.execute("SELECT to_regclass(%s)", (index_name,))
+        if self.cursor.fetchone()[0] is not None:
+            return None
+
+        self.cursor.execute(f"""DELETE FROM {table} WHERE ctid IN (
+            SELECT ctid FROM (
+                SELECT ctid, row_number() OVER (PARTITION BY {key_column}
+                                                ORDER BY num_nonnulls({', '.join(columns)}) DESC) AS rank
+                FROM {table}
+                WHERE {key_column} IS NOT NULL
+            ) AS ranked
+            WHERE rank > 1
+            )
+            """)
+        if self.cursor.rowcount > 0:
+            self.log.add(f"removed [{self.cursor.rowcount}] duplicate rows from table [{table}]")
+        self.cursor.execute(f"CREATE UNIQUE INDEX {index_name} ON {table} ({key_column})")
+
+    def mark_progress(self, item_id: int | str, state: int) -> None:
+        """Record the state of a request id or order number in the current progress map (if there is one).
+
+        Args:
+            item_id: Request id or order number
+            state: New state of the item (see ProgressMap)
+        """
+        if self.progress is not None:
+            self.progress.mark(item_id, state)
+
+    def mark_failed(self, item_id: int | str) -> None:
+        """Record that scraping a request id or order number failed in the current progress map (if there is one).
+
+        Args:
+            item_id: Request id or order number
+        """
+        self.mark_progress(item_id, ProgressMap.FAILED)
+
+    def record_write(self, row: tuple, success: bool) -> None:
+        """Record the result of writing a row in the current progress map (if there is one).
+
+        Args:
+            row: The written row (the first value is the request id or order number)
+            success: True if the row was written, False otherwise
+        """
+        if not success:
+            state = ProgressMap.FAILED
+        elif all(value is None for value in row[1:]):
+            state = ProgressMap.EMPTY  # Only the id was found
+        else:
+            state = ProgressMap.DONE
+        self.mark_progress(row[0], state)
+
+    def add_missing(self, item_type: str, item_id: int | str) -> None:
+        """Record that a request id or order number does not exist on the maintenance site (written in batches), so
+        that it is skipped by later scrapes until it is due to be checked again.
+
+        Args:
+            item_type: Type of the item (either 'request' or 'order')
+            item_id: Request id or order number
+        """
+        self.missing_writer.add_row((item_type, str(item_id)))
+        self.mark_progress(item_id, ProgressMap.EMPTY)
+        self.log.add(f"{item_type} [{item_id}] does not exist ... recording it as missing", item_id=item_id)
+
+    def renew_session(self, generation: int) -> None:
+        """Log the scraper into Calnet again after its session expired (with the stored Calnet user), pausing every
+        other fetch of this database until the login completes.
+
+        Args:
+            generation: Session generation that expired (if another thread already logged in again since then, the
+                new session is used as it is)
+        """
+        with self.session_lock:
+            if self.session_generation != generation:
+                return None
+            self.session_ready.clear()
+            try:
+                self.browser_scraper.login_calnet()
+                if self.scraper is not self.browser_scraper:
+                    self.scraper.set_cookies(self.browser_scraper.get_cookies())
+                self.session_generation += 1
+                Metrics.count('relogins')
+                self.log.add(f"logged into Calnet again (login [{self.session_generation}] of this run)")
+            finally:
+                self.session_ready.set()
+
+    def call_with_session(self, item_id: int | str, function: Callable, *args):
+        """Call a scraper function, logging into Calnet again and retrying it once if the session has expired.
+
+        Args:
+            item_id: Request id or order number the function scrapes
+            function: Scraper function (e.g. Scraper.fetch_item)
+            *args: Arguments of the function
+
+        Returns:
+            The result of the function
+
+        Raises:
+            SessionExpiredError if the session has expired again right after logging in
+        """
+        self.session_ready.wait()
+        generation = self.session_generation
+        try:
+            return function(*args)
+        except SessionExpiredError as e:
+            Metrics.count('session_expiries')
+            self.log.add(f"session expired while scraping item [{item_id}] ({e}) ... logging into Calnet again",
+                         level='warning', item_id=item_id)
+        self.renew_session(generation)
+        return function(*args)
+
+    def scrape_item(self, item_type: str, item_id: int | str) -> WorkOrderRequest | WorkOrder:
+        """Scrape a single work request or work order (waiting for the rate controller's permission, if there is one).
+
+        Args:
+            item_type: Type of item to scrape (either 'request' or 'order')
+            item_id: Request id or order number
+
+        Returns:
+            The scraped WorkOrderRequest or WorkOrder
+        """
+        start_time = self.rate_controller.acquire() if self.rate_controller is not None else None
+        success = False
+        try:
+            with Metrics.span('scrape_item'):
+                if item_type == 'request':
+                    item = self.call_with_session(item_id, self.scraper.scrape_request, item_id)
+                else:
+                    item = self.call_with_session(item_id, self.scraper.scrape_order, item_id)
+            success = True
+            Metrics.count('items_missing' if item.is_empty() else 'items_scraped')
+            return item
+        except Exception as e:
+            Metrics.count('items_failed')
+            if isinstance(e, (exceptions.TimeoutException, requests.Timeout)):
+                Metrics.count('timeouts')
+            raise
+        finally:
+            if self.rate_controller is not None:
+                self.rate_controller.release(start_time, success)
+
+    def fetch_item(self, item_type: str, item_id: int | str) -> str | None:
+        """Fetch the raw page of a single work request or work order without parsing it (waiting for the rate
+        controller's permission, if there is one).
+
+        Args:
+            item_type: Type of item to fetch (either 'request' or 'order')
+            item_id: Request id or order number
+
+        Returns:
+            The HTML of the item's page (None if the site reported that the item does not exist)
+        """
+        start_time = self.rate_controller.acquire() if self.rate_controller is not None else None
+        success = False
+        try:
+            with Metrics.span('fetch_item'):
+                page_source = self.call_with_session(item_id, self.scraper.fetch_item, item_type, item_id)
+            success = True
+            return page_source
+        except Exception as e:
+            Metrics.count('items_failed')
+            if isinstance(e, (exceptions.TimeoutException, requests.Timeout)):
+                Metrics.count('timeouts')
+            raise
+        finally:
+            if self.rate_controller is not None:
+                self.rate_controller.release(start_time, success)
+
+    def parse_item(self, item_type: str, page_source: str | None, item_id: int | str) -> WorkOrderRequest | WorkOrder:
+        """Parse a page fetched with MaintenanceDatabase.fetch_item.
+
+        Args:
+            item_type: Type of the item (either 'request' or 'order')
+            page_source: HTML of the item's page (None if the item does not exist)
+            item_id: Request id or order number
+
+        Returns:
+            The parsed WorkOrderRequest or WorkOrder
+        """
+        try:
+            item = PageParser.parse_item(item_type, page_source, item_id)
+        except Exception as e:
+            Metrics.count('items_failed')
+            raise
+        Metrics.count('items_missing' if item.is_empty() else 'items_scraped')
+        return item
+
+    def request_exists(self, request_id: int) -> bool:
+        """Check if an entry for a work request already exists in the database.
+
+        Args:
+            request_id: id of the work request
+
+        Returns:
+            True if an entry with the same id already exists, False otherwise
+        """
+        select_query = f"SELECT 1 FROM request WHERE id = {request_id}"
+        with Metrics.span('existence_check'):
+            self.cursor.execute(select_query)
+            return self.cursor.fetchone() is not None
+
+    def get_missing_request_ids(self, request_ids: Iterable[int], cursor: Cursor = None) -> list[int]:
+        """Find which request ids do not exist in the database yet (with a single query).
+
+        Ids recently found not to exist on the maintenance site (see MaintenanceDatabase.add_missing) are left out.
+
+        Args:
+            request_ids: Iterable of request ids to check
+            cursor: Cursor to query with (the database's own cursor by default)
+
+        Returns:
+            List of the request ids that do not exist in the database (in their original order)
+        """
+        cursor = cursor if cursor is not None else self.cursor
+        with Metrics.span('existence_check'):
+            cursor.execute("""SELECT t.id FROM unnest(%s::int[]) WITH ORDINALITY AS t(id, n)
+                WHERE NOT EXISTS (SELECT 1 FROM request WHERE request.id = t.id)
+                    AND NOT EXISTS (SELECT 1 FROM missing_item m WHERE m.item_type = 'request'
+                                    AND m.item_id = t.id::text
+                                    AND m.checked_at > now() - make_interval(days => %s))
+                ORDER BY t.n
+                """, (list(request_ids), self.missing_recheck_days))
+            return [row[0] for row in cursor.fetchall()]
+
+    def insert_request(self, request: WorkOrderRequest) -> None:
+        """Buffer an already-scraped work request for insertion into the database (written in batches).
+
+        Requests that do not exist are recorded as missing instead.
+
+        Args:
+            request: The scraped work request
+        """
+        if request.is_empty():
+            self.add_missing('request', request.id)
+            return None
+        self.log_unparsed('request', request.id, request)
+        self.request_writer.add(request)
+        self.log.add(f"successfully scraped request [{request.id}]", item_id=request.id, phase='scrape_item')
+
+    def add_request(self, request_id: int, check_exists: bool = True) -> None:
         """Scrape and insert a work request into the database.
 
         Args:
             request_id: id of the work request
+            check_exists: False to skip checking if the request already exists (if already checked in bulk)
         """
         try:
             # Skip this request if an entry with the same id already exists
-            select_query = f"SELECT 1 FROM request WHERE id = {request_id}"
-            self.cursor.execute(select_query)
-            if self.cursor.fetchone():
+            if check_exists and self.request_exists(request_id):
                 self.log.add(f"entry with id [{request_id}] already exists ... skipping this insert request")
                 return None
 
             # Scrape request
-            request = self.scraper.scrape_request(request_id)
-
-            # Filter out all null values and their corresponding columns
-            columns = [c for c in self.all_columns_requests if getattr(request, c)]  # Remove missing attributes from request
-            values = [str(getattr(request, c)).replace("'", "") for c in columns]  # "'" causes SQL query errors
-            columns = ', '.join(columns)
-            values = ', '.join([f"'{v}'" for v in values])
-            insert_query = f"INSERT INTO request ({columns}) VALUES ({values});"
-
-            self.cursor.execute(insert_query)
-            self.connection.commit()
-            self.log.add(f"successfully inserted request [{request_id}] to database [{self.db_name}]")
+            request = self.scrape_item('request', request_id)
         except Exception as e:
-            self.log.add(f"failed to insert request [{request_id}]")
-            self.log.add_quiet(f"{traceback.format_exc()}\n")
+            self.log.add(f"failed to insert request [{request_id}]", level='error', item_id=request_id)
+            self.log.add_quiet(f"{traceback.format_exc()}\n", level='error')
+            self.mark_progress(request_id, ProgressMap.FAILED)
+            return None
+
+        self.insert_request(request)
 
-    def add_requests(self, request_ids: Iterable[int]) -> None:
+    def add_requests(self, request_ids: Iterable[int], skip_existing: bool = True) -> None:
         """Scrape and insert work requests to database (for an iterable of request ids).
 
+        Requests that already exist in the database are skipped (checked in bulk before they are scraped).
+        Requests are scraped concurrently if this database was created with a concurrency greater than 1.
+
         Args:
             request_ids: Iterable of request ids to scrape and insert
+            skip_existing: False to scrape every id without checking the database first (if already checked in bulk)
         """
-        for request_id in request_ids:
-            self.add_request(request_id)
+        if self.pipeline_queue_size > 0:
+            try:
+                self.add_items_pipelined('request', request_ids, skip_existing)
+            finally:
+                self.request_writer.flush()
+                self.missing_writer.flush()
+            return None
+
+        missing_ids = list(request_ids)
+        if skip_existing:
+            num_requests = len(missing_ids)
+            missing_ids = self.get_missing_request_ids(missing_ids)
+            self.log.add(f"skipping [{num_requests - len(missing_ids)}] requests that already exist ... scraping "
+                         f"[{len(missing_ids)}] requests")
+        try:
+            if self.concurrency > 1:
+                self.add_items_concurrent('request', missing_ids)
+            else:
+                for request_id in missing_ids:
+                    self.add_request(request_id, check_exists=False)
+        finally:  # Also write buffered requests if interrupted (e.g. KeyboardInterrupt)
+            self.request_writer.flush()
+            self.missing_writer.flush()
 
     def add_request_range(self, start: int, stop: int) -> None:
         """Scrape and insert a range of work requests into the database.
@@ -142,49 +768,116 @@ class MaintenanceDatabase:
             start: First request id to scrape and insert (inclusive).
             stop: Last request id to scrape and insert (exclusive).
         """
-        for request_id in range(start, stop):
-            self.add_request(request_id)
+        self.add_requests(range(start, stop))
+
+    def order_exists(self, order_number: str) -> bool:
+        """Check if an entry for a work order already exists in the database.
+
+        Args:
+            order_number: The order number of the order
+
+        Returns:
+            True if an entry with the same order number already exists, False otherwise
+        """
+        select_query = f"SELECT 1 FROM \"order\" WHERE order_number = '{order_number}'"
+        with Metrics.span('existence_check'):
+            self.cursor.execute(select_query)
+            return self.cursor.fetchone() is not None
+
+    def get_missing_order_numbers(self, order_numbers: Iterable[str], cursor: Cursor = None) -> list[str]:
+        """Find which order numbers do not exist in the database yet (with a single query).
+
+        Args:
+            order_numbers: Iterable of order numbers (WITH PREFIXES) to check
+            cursor: Cursor to query with (the database's own cursor by default)
+
+        Returns:
+            List of the order numbers that do not exist in the database (in their original order)
+        """
+        cursor = cursor if cursor is not None else self.cursor
+        with Metrics.span('existence_check'):
+            cursor.execute("""SELECT t.order_number FROM unnest(%s::text[]) WITH ORDINALITY AS t(order_number, n)
+                WHERE NOT EXISTS (SELECT 1 FROM "order" WHERE "order".order_number = t.order_number)
+                    AND NOT EXISTS (SELECT 1 FROM missing_item m WHERE m.item_type = 'order'
+                                    AND m.item_id = t.order_number
+                                    AND m.checked_at > now() - make_interval(days => %s))
+                ORDER BY t.n
+                """, (list(order_numbers), self.missing_recheck_days))
+            return [row[0] for row in cursor.fetchall()]
+
+    def insert_order(self, order: WorkOrder) -> None:
+        """Buffer an already-scraped work order for insertion into the database (written in batches).
 
-    def add_order(self, order_number: str) -> None:
+        Work orders that do not exist are recorded as missing instead.
+
+        Args:
+            order: The scraped work order
+        """
+        if order.is_empty():
+            self.add_missing('order', order.order_number)
+            return None
+        self.log_unparsed('order', order.order_number, order)
+        self.order_writer.add(order)
+        self.log.add(f"successfully scraped order [{order.order_number}]", item_id=order.order_number,
+                     phase='scrape_item')
+
+    def add_order(self, order_number: str, check_exists: bool = True) -> None:
         """Scrape and insert a work order into the database.
 
         Args:
             order_number: The order number of the order.
+            check_exists: False to skip checking if the order already exists (if already checked in bulk)
         """
         try:
             # Skip this request if an entry with the same id already exists
-            select_query = f"SELECT 1 FROM \"order\" WHERE order_number = '{order_number}'"
-            self.cursor.execute(select_query)
-            if self.cursor.fetchone():
+            if check_exists and self.order_exists(order_number):
                 self.log.add(f"entry with order number [{order_number}] already exists ... skipping this insert "
                              f"request")
                 return None
 
             # Scrape order
-            order = self.scraper.scrape_order(order_number)
-
-            # Filter out all null values and their corresponding columns
-            columns = [c for c in self.all_columns_orders if getattr(order, c)]  # Remove missing attributes from request
-            values = [str(getattr(order, c)).replace("'", "") for c in columns]  # "'" causes SQL query errors
-            columns = ', '.join(columns)
-            values = ', '.join([f"'{v}'" for v in values])
-            insert_query = f"INSERT INTO \"order\" ({columns}) VALUES ({values});"
-
-            self.cursor.execute(insert_query)
-            self.connection.commit()
-            self.log.add(f"successfully inserted order [{order_number}] to database [{self.db_name}]")
+            order = self.scrape_item('order', order_number)
         except Exception as e:
-            self.log.add(f"failed to insert order [{order_number}]")
-            self.log.add_quiet(f"{traceback.format_exc()}\n")
+            self.log.add(f"failed to insert order [{order_number}]", level='error', item_id=order_number)
+            self.log.add_quiet(f"{traceback.format_exc()}\n", level='error')
+            self.mark_progress(order_number, ProgressMap.FAILED)
+            return None
+
+        self.insert_order(order)
 
-    def add_orders(self, order_numbers: Iterable[str]) -> None:
+    def add_orders(self, order_numbers: Iterable[str], skip_existing: bool = True) -> None:
         """Scrape and insert work orders for an iterable of order numbers.
 
+        Orders that already exist in the database are skipped (checked in bulk before they are scraped).
+        Orders are scraped concurrently if this database was created with a concurrency greater than 1.
+
         Args:
             order_numbers: Iterable of order numbers (WITH PREFIXES).
+            skip_existing: False to scrape every order without checking the database first (if already checked in bulk)
         """
-        for order_number in order_numbers:
-            self.add_order(order_number)
+        if self.pipeline_queue_size > 0:
+            try:
+                self.add_items_pipelined('order', order_numbers, skip_existing)
+            finally:
+                self.order_writer.flush()
+                self.missing_writer.flush()
+            return None
+
+        missing_numbers = list(order_numbers)
+        if skip_existing:
+            num_orders = len(missing_numbers)
+            missing_numbers = self.get_missing_order_numbers(missing_numbers)
+            self.log.add(f"skipping [{num_orders - len(missing_numbers)}] orders that already exist ... scraping "
+                         f"[{len(missing_numbers)}] orders")
+        try:
+            if self.concurrency > 1:
+                self.add_items_concurrent('order', missing_numbers)
+            else:
+                for order_number in missing_numbers:
+                    self.add_order(order_number, check_exists=False)
+        finally:  # Also write buffered orders if interrupted (e.g. KeyboardInterrupt)
+            self.order_writer.flush()
+            self.missing_writer.flush()
 
     def add_order_range(self, start: int, stop: int, prefix: str = 'HM-') -> None:
         """Scrape and insert a range of work orders into the database.
@@ -194,11 +887,209 @@ class MaintenanceDatabase:
             stop: Last order number to scrape and insert (exclusive).
             prefix: String to append the beginning of each integer work order number.
         """
-        for int_order_number in range(start, stop):
-            self.add_order(prefix + str(int_order_number))
+        self.add_orders(prefix + str(int_order_number) for int_order_number in range(start, stop))
+
+    def get_highest_request_id(self) -> int:
+        """Get the highest id of a (non-empty) work request stored in the database.
+
+        Returns:
+            The highest stored request id (0 if there are none)
+        """
+        self.cursor.execute("SELECT max(id) FROM request WHERE room IS NOT NULL")
+        return self.cursor.fetchone()[0] or 0
+
+    def get_highest_order_number(self, prefix: str = 'HM-') -> int:
+        """Get the highest integer order number of a (non-empty) work order stored in the database.
+
+        Args:
+            prefix: Prefix of the work order numbers to consider
+
+        Returns:
+            The highest stored integer order number (0 if there are none)
+        """
+        self.cursor.execute("""SELECT max(substring(order_number FROM '[0-9]+$')::int) FROM "order"
+            WHERE facility IS NOT NULL AND left(order_number, length(%s)) = %s
+            """, (prefix, prefix))
+        return self.cursor.fetchone()[0] or 0
+
+    def get_refresh_candidates(self, item_type: str, limit: int, min_age_hours: int) -> list[tuple]:
+        """Get stored items that may still change (requests that are not completed or rejected and orders that are not
+        closed), most likely to change first.
+
+        Pending requests and orders with a work status are ranked first as they change most often, then newer items
+        before older ones (old open items are mostly abandoned). Items checked within the last min_age_hours are
+        skipped so that repeated refreshes rotate through all open items.
+
+        Args:
+            item_type: Type of item to get (either 'request' or 'order')
+            limit: Maximum number of items to get
+            min_age_hours: Minimum time (in hours) since an item was last checked
+
+        Returns:
+            List of (request id or order number, stored content hash) tuples
+        """
+        if item_type == 'request':
+            self.cursor.execute("""SELECT id, content_hash FROM request
+                WHERE room IS NOT NULL
+                    AND lower(coalesce(status, '')) NOT IN ('completed', 'rejected')
+                    AND (checked_at IS NULL OR checked_at < now() - make_interval(hours => %s))
+                ORDER BY lower(coalesce(status, '')) = 'pending' DESC, id DESC
+                LIMIT %s
+                """, (min_age_hours, limit))
+        else:
+            self.cursor.execute("""SELECT order_number, content_hash FROM "order"
+                WHERE facility IS NOT NULL
+                    AND date_closed IS NULL
+                    AND lower(coalesce(work_status, '')) NOT IN ('canceled', 'cancelled', 'completed', 'closed')
+                    AND (checked_at IS NULL OR checked_at < now() - make_interval(hours => %s))
+                ORDER BY work_status IS NOT NULL DESC, substring(order_number FROM '[0-9]+$')::int DESC
+                LIMIT %s
+                """, (min_age_hours, limit))
+        rows = self.cursor.fetchall()
+        self.connection.commit()
+        return rows
+
+    def get_text_columns(self, item_type: str) -> set[str]:
+        """Get the columns of typed fields that are stored as TEXT, which keep the raw text of values that could not
+        be parsed (see BatchWriter.get_row_values).
+
+        Args:
+            item_type: Type of item (either 'request' or 'order')
+
+        Returns:
+            Set of column names (request columns are always typed)
+        """
+        return self.text_order_columns if item_type == 'order' else set()
+
+    def log_unparsed(self, item_type: str, item_id: int | str, record) -> None:
+        """Record the raw text of the typed fields of a record that could not be parsed and are stored as NULL (fields
+        stored in TEXT columns keep their raw text instead, see MaintenanceDatabase.get_text_columns).
+
+        Args:
+            item_type: Type of the record (either 'request' or 'order')
+            item_id: id of the request or order number of the work order
+            record: The scraped WorkOrderRequest or WorkOrder
+        """
+        text_columns = self.get_text_columns(item_type)
+        for field, text in record.unparsed.items():
+            if field not in text_columns:
+                self.log.add(f"could not parse [{field}] of {item_type} [{item_id}] from [{text}] ... storing NULL",
+                             level='warning', item_id=item_id)
+
+    def update_item(self, item_type: str, record, content_hash: str) -> None:
+        """Overwrite a stored work request or work order with newly scraped content.
+
+        Args:
+            item_type: Type of item to update (either 'request' or 'order')
+            record: The newly scraped WorkOrderRequest or WorkOrder
+            content_hash: Content hash of the newly scraped record (see BatchWriter.get_content_hash)
+        """
+        if item_type == 'request':
+            table, columns = 'request', self.all_columns_requests
+        else:
+            table, columns = '"order"', self.all_columns_orders
+        key_column, value_columns = columns[0], columns[1:]
+
+        self.log_unparsed(item_type, getattr(record, key_column), record)
+        values = BatchWriter.get_row_values(record, value_columns, self.get_text_columns(item_type))
+        update_query = (f"UPDATE {table} SET ({', '.join(value_columns)}, content_hash, checked_at) = "
+                        f"({', '.join(['%s'] * len(value_columns))}, %s, now()) WHERE {key_column} = %s")
+        self.cursor.execute(update_query, values + (content_hash, getattr(record, key_column)))
+        self.connection.commit()
+
+    def create_update_writer(self, item_type: str, batch_size: int = 1000) -> BatchWriter:
+        """Create a writer that inserts work requests or work orders and overwrites the stored content of those that
+        already exist (only rows whose content changed are actually updated).
+
+        Args:
+            item_type: Type of item to write (either 'request' or 'order')
+            batch_size: Number of rows to write per insert
+
+        Returns:
+            The new BatchWriter (rows must include the content hash, see BatchWriter.get_content_hash)
+        """
+        if item_type == 'request':
+            table, columns = 'request', self.all_columns_requests
+        else:
+            table, columns = '"order"', self.all_columns_orders
+        assignments = ', '.join(f"{column} = EXCLUDED.{column}" for column in columns[1:] + ['content_hash'])
+        return BatchWriter(self.connection, table, columns, self.log, key_column=columns[0], batch_size=batch_size,
+                           flush_interval=float('inf'), hash_column='content_hash',
+                           text_columns=self.get_text_columns(item_type),
+                           conflict_action=f"DO UPDATE SET {assignments} "
+                                           f"WHERE {table}.content_hash IS DISTINCT FROM EXCLUDED.content_hash")
+
+    def mark_checked(self, item_type: str, item_ids: list) -> None:
+        """Record that stored items were checked just now (without changing their content).
+
+        Args:
+            item_type: Type of the items (either 'request' or 'order')
+            item_ids: List of request ids or order numbers
+        """
+        if item_type == 'request':
+            self.cursor.execute("UPDATE request SET checked_at = now() WHERE id = ANY(%s)", (item_ids,))
+        else:
+            self.cursor.execute('UPDATE "order" SET checked_at = now() WHERE order_number = ANY(%s)', (item_ids,))
+        self.connection.commit()
+
+    def add_items_concurrent(self, item_type: str, item_ids: Iterable) -> None:
+        """Scrape and insert work requests or work orders with many page fetches in flight at once (requires the
+        'http' scraper backend).
+
+        Args:
+            item_type: Type of item to be scraped (either 'request' or 'order')
+            item_ids: Iterable of request ids or order numbers (WITH PREFIXES) that do not exist in the database yet
+        """
+        if not isinstance(self.scraper, HttpScraper):
+            raise ValueError("concurrent scraping requires the 'http' scraper backend")
+
+        if item_type == 'request':
+            engine = AsyncEngine(functools.partial(self.scrape_item, 'request'), self.insert_request, self.log,
+                                 concurrency=self.concurrency, on_failure=self.mark_failed)
+        else:
+            engine = AsyncEngine(functools.partial(self.scrape_item, 'order'), self.insert_order, self.log,
+                                 concurrency=self.concurrency, on_failure=self.mark_failed)
+        engine.run(item_ids)
+
+    def add_items_pipelined(self, item_type: str, item_ids: Iterable, skip_existing: bool = True) -> None:
+        """Scrape and insert work requests or work orders in concurrent stages (see Pipeline): existing items are
+        filtered out on a separate connection and pages are fetched and parsed while earlier items are written.
+
+        Args:
+            item_type: Type of item to be scraped (either 'request' or 'order')
+            item_ids: Iterable of request ids or order numbers (WITH PREFIXES)
+            skip_existing: False to scrape every id without checking the database first (if already checked in bulk)
+        """
+        if self.concurrency > 1 and not isinstance(self.scraper, HttpScraper):
+            raise ValueError("concurrent scraping requires the 'http' scraper backend")
+
+        filter_connection = None
+        filter_ids = None
+        if skip_existing:  # The existence filter runs while items are written, so it gets its own connection
+            host, dbname, user, password, port = self.db_args
+            filter_connection = psycopg2.connect(host=host, dbname=dbname, user=user, password=password, port=port)
+            filter_connection.autocommit = True
+            get_missing = self.get_missing_request_ids if item_type == 'request' else self.get_missing_order_numbers
+            filter_ids = functools.partial(get_missing, cursor=filter_connection.cursor())
+
+        insert = self.insert_request if item_type == 'request' else self.insert_order
+        pipeline = Pipeline(functools.partial(self.fetch_item, item_type),
+                            lambda page_source, item_id: self.parse_item(item_type, page_source, item_id), insert,
+                            self.log, filter_ids=filter_ids, queue_size=self.pipeline_queue_size,
+                            fetch_threads=self.concurrency, on_failure=self.mark_failed)
+        try:
+            pipeline.run(item_ids)
+        finally:
+            if filter_connection is not None:
+                filter_connection.close()
 
     def close(self) -> None:
-        """Close the connection to the database."""
-        self.scraper.close()
+        """Write any buffered items and close the connection to the database."""
+        self.request_writer.flush()
+        self.order_writer.flush()
+        self.missing_writer.flush()
+        self.close_scraper()
+        if self.archive is not None:
+            self.archive.close()
         self.cursor.close()
         self.connection.close()
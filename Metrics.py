@@ -0,0 +1,304 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+class Metrics:
+    """Collects timing histograms and counters of the scraping hot path in the current process.
+
+    Every process keeps its own metrics and periodically rewrites them to a JSON stats file (one per process) which the
+    Driver merges across all processes, either into a summary in the log or into Prometheus text format served from a
+    local HTTP endpoint.
+    """
+
+    # Upper bounds (in seconds) of the histogram buckets (the last bucket holds everything slower)
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    write_interval = 5.0  # Minimum time (in seconds) between rewrites of this process's stats file
+
+    _stats_path = Path.cwd() / 'Stats'
+    _histograms = {}  # Span name -> [count, total seconds, count per bucket...]
+    _counters = defaultdict(float)  # Counter name -> value
+    _gauges = {}  # Gauge name -> current value (e.g. queue depths of a Pipeline)
+    _start_time = time.time()
+    _last_write = time.monotonic()
+    _lock = threading.Lock()  # Fetches may run on several threads (see AsyncEngine)
+
+    @staticmethod
+    def reset() -> None:
+        """Clear all metrics of this process (e.g. in a new worker process that inherited its parent's metrics)."""
+        Metrics._histograms = {}
+        Metrics._counters = defaultdict(float)
+        Metrics._gauges = {}
+        Metrics._start_time = time.time()
+        Metrics._last_write = time.monotonic()
+        Metrics._lock = threading.Lock()
+
+    @staticmethod
+    @contextmanager
+    def span(name: str):
+        """Time a block of code and record its duration in the histogram of a phase (also if the block raises).
+
+        Args:
+            name: Name of the phase (e.g. 'search_item')
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            Metrics.observe(name, time.perf_counter() - start)
+
+    @staticmethod
+    def observe(name: str, seconds: float) -> None:
+        """Record a duration in the histogram of a phase.
+
+        Args:
+            name: Name of the phase
+            seconds: Duration of the phase (in seconds)
+        """
+        with Metrics._lock:
+            histogram = Metrics._histograms.get(name)
+            if histogram is None:
+                histogram = Metrics._histograms[name] = [0, 0.0] + [0] * (len(Metrics.buckets) + 1)
+            histogram[0] += 1
+            histogram[1] += seconds
+            histogram[2 + bisect.bisect_left(Metrics.buckets, seconds)] += 1
+        Metrics.write_if_due()
+
+    @staticmethod
+    def count(name: str, amount: float = 1) -> None:
+        """Increase a counter.
+
+        Args:
+            name: Name of the counter (e.g. 'items_scraped')
+            amount: Amount to increase the counter by
+        """
+        with Metrics._lock:
+            Metrics._counters[name] += amount
+        Metrics.write_if_due()
+
+    @staticmethod
+    def gauge(name: str, value: float) -> None:
+        """Set a gauge to its current value.
+
+        Args:
+            name: Name of the gauge (e.g. 'pipeline_fetch_queue_depth')
+            value: Current value of the gauge
+        """
+        with Metrics._lock:
+            Metrics._gauges[name] = value
+        Metrics.write_if_due()
+
+    @staticmethod
+    def snapshot() -> dict:
+        """Get all metrics of this process.
+
+        Returns:
+            Dictionary of the process's start time, counters and histograms (JSON-serializable)
+        """
+        with Metrics._lock:
+            histograms = {name: {'count': h[0], 'sum': h[1], 'buckets': h[2:]}
+                          for name, h in Metrics._histograms.items()}
+            counters = dict(Metrics._counters)
+            gauges = dict(Metrics._gauges)
+        return {'pid': os.getpid(), 'start_time': Metrics._start_time, 'updated': time.time(), 'counters': counters,
+                'gauges': gauges, 'histograms': histograms}
+
+    @staticmethod
+    def write_if_due() -> None:
+        """Rewrite this process's stats file if write_interval seconds have passed since the last write."""
+        if time.monotonic() - Metrics._last_write >= Metrics.write_interval:
+            Metrics.write()
+
+    @staticmethod
+    def write() -> None:
+        """Rewrite this process's stats file (atomically, so readers never see a partial file)."""
+        Metrics._last_write = time.monotonic()
+        os.makedirs(Metrics._stats_path, exist_ok=True)
+        path = Metrics._stats_path / f"metrics_{os.getpid()}.json"
+        temporary_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        with open(temporary_path, 'w') as file:
+            json.dump(Metrics.snapshot(), file)
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def clear_files() -> None:
+        """Delete the stats files of all processes (e.g. left over from a previous run)."""
+        if Metrics._stats_path.exists():
+            for path in Metrics._stats_path.glob('metrics_*.json'):
+                path.unlink(missing_ok=True)
+
+    @staticmethod
+    def load_all() -> list[dict]:
+        """Load the stats files of all processes (including this one, which is written first).
+
+        Returns:
+            List of the metrics of each process (see Metrics.snapshot)
+        """
+        Metrics.write()
+        snapshots = []
+        for path in Metrics._stats_path.glob('metrics_*.json'):
+            try:
+                with open(path) as file:
+                    snapshots.append(json.load(file))
+            except (OSError, ValueError):  # Deleted or replaced while reading
+                pass
+        return snapshots
+
+    @staticmethod
+    def merge(snapshots: list[dict]) -> dict:
+        """Merge the metrics of several processes by adding up their counters, gauges and histograms.
+
+        Args:
+            snapshots: Metrics of each process (see Metrics.snapshot)
+
+        Returns:
+            The merged metrics (in the same format, with the earliest start time)
+        """
+        counters = defaultdict(float)
+        gauges = defaultdict(float)
+        histograms = {}
+        for snapshot in snapshots:
+            for name, value in snapshot['counters'].items():
+                counters[name] += value
+            for name, value in snapshot.get('gauges', {}).items():
+                gauges[name] += value
+            for name, histogram in snapshot['histograms'].items():
+                empty = {'count': 0, 'sum': 0.0, 'buckets': [0] * len(histogram['buckets'])}
+                merged = histograms.setdefault(name, empty)
+                merged['count'] += histogram['count']
+                merged['sum'] += histogram['sum']
+                merged['buckets'] = [a + b for a, b in zip(merged['buckets'], histogram['buckets'])]
+        start_time = min((snapshot['start_time'] for snapshot in snapshots), default=time.time())
+        return {'start_time': start_time, 'updated': time.time(), 'counters': dict(counters),
+                'gauges': dict(gauges), 'histograms': histograms}
+
+    @staticmethod
+    def get_quantile(histogram: dict, quantile: float) -> float:
+        """Estimate a quantile of a histogram (as the upper bound of the bucket that contains it).
+
+        Args:
+            histogram: Histogram in the format of Metrics.snapshot
+            quantile: Quantile to estimate (between 0 and 1)
+
+        Returns:
+            The estimated quantile (in seconds), or infinity if it falls in the last (unbounded) bucket
+        """
+        rank = quantile * histogram['count']
+        total = 0
+        for upper_bound, count in zip(Metrics.buckets + (float('inf'),), histogram['buckets']):
+            total += count
+            if total >= rank:
+                return upper_bound
+        return float('inf')
+
+    @staticmethod
+    def get_summary(metrics: dict) -> list[str]:
+        """Summarize merged metrics as human-readable lines (throughput, empty-record rate and time per phase).
+
+        Args:
+            metrics: Merged metrics (see Metrics.merge)
+
+        Returns:
+            List of summary lines
+        """
+        counters = metrics['counters']
+        elapsed = max(metrics['updated'] - metrics['start_time'], 1e-9)
+        scraped = counters.get('items_scraped', 0)
+        missing = counters.get('items_missing', 0)
+        lines = [f"[{scraped + missing:.0f}] items in [{elapsed:.0f}] seconds "
+                 f"([{(scraped + missing) / elapsed:.2f}] items/s), [{missing / max(scraped + missing, 1):.1%}] "
+                 f"empty, [{counters.get('items_failed', 0):.0f}] failed, [{counters.get('timeouts', 0):.0f}] "
+                 f"timeouts"]
+        network = Metrics.get_network_summary(counters, scraped + missing)
+        if network is not None:
+            lines.append(network)
+        for name, histogram in sorted(metrics['histograms'].items(), key=lambda item: -item[1]['sum']):
+            lines.append(f"{name}: [{histogram['count']}] calls, [{histogram['sum']:.1f}] seconds total, mean "
+                         f"[{histogram['sum'] / max(histogram['count'], 1):.3f}]s, p50 <= "
+                         f"[{Metrics.get_quantile(histogram, 0.5)}]s, p99 <= "
+                         f"[{Metrics.get_quantile(histogram, 0.99)}]s")
+        return lines
+
+    @staticmethod
+    def get_network_summary(counters: dict[str, float], items: float) -> str | None:
+        """Summarize the network use of lean browsers per item (see LeanBrowser.record_usage).
+
+        Args:
+            counters: Merged counters (see Metrics.merge)
+            items: Number of items scraped
+
+        Returns:
+            The summary line or None if no browser network use was recorded
+        """
+        if 'browser_requests_loaded' not in counters and 'browser_requests_blocked' not in counters:
+            return None
+        items = max(items, 1)
+        return (f"browser network per item: [{counters.get('browser_requests_loaded', 0) / items:.1f}] requests "
+                f"([{counters.get('browser_bytes_loaded', 0) / items / 1024:.1f}] KB) loaded, "
+                f"[{counters.get('browser_requests_blocked', 0) / items:.1f}] requests "
+                f"([{counters.get('browser_bytes_blocked', 0) / items / 1024:.1f}] KB) avoided")
+
+    @staticmethod
+    def to_prometheus(metrics: dict) -> str:
+        """Format merged metrics in the Prometheus text exposition format.
+
+        Args:
+            metrics: Merged metrics (see Metrics.merge)
+
+        Returns:
+            The metrics as Prometheus text
+        """
+        lines = []
+        for name, value in sorted(metrics['counters'].items()):
+            lines.append(f"# TYPE bwork_{name}_total counter")
+            lines.append(f"bwork_{name}_total {value}")
+        for name, value in sorted(metrics.get('gauges', {}).items()):
+            lines.append(f"# TYPE bwork_{name} gauge")
+            lines.append(f"bwork_{name} {value}")
+
+        lines.append("# TYPE bwork_phase_seconds histogram")
+        for name, histogram in sorted(metrics['histograms'].items()):
+            cumulative = 0
+            for upper_bound, count in zip(Metrics.buckets + (float('inf'),), histogram['buckets']):
+                cumulative += count
+                le = '+Inf' if upper_bound == float('inf') else upper_bound
+                lines.append(f'bwork_phase_seconds_bucket{{phase="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'bwork_phase_seconds_sum{{phase="{name}"}} {histogram["sum"]}')
+            lines.append(f'bwork_phase_seconds_count{{phase="{name}"}} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def serve(port: int) -> ThreadingHTTPServer:
+        """Serve the merged metrics of all processes in Prometheus text format at http://127.0.0.1:<port>/metrics
+        (from a background thread).
+
+        Args:
+            port: Local port to listen on
+
+        Returns:
+            The running server (call shutdown() on it to stop serving)
+        """
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = Metrics.to_prometheus(Metrics.merge(Metrics.load_all())).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # Keep the console free of request logs
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
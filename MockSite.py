@@ -0,0 +1,414 @@
+import html
+import random
+import re
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+from PageParser import PageParser
+from WorkOrder import WorkOrder
+
+
+class MockSite:
+    """A local stand-in for the maintenance site (and its Calnet and Duo Mobile login) for offline benchmarks.
+
+    It serves the CAS login page, the Duo Mobile "trust this browser" step, the 'botleft'/'botright' frameset with its
+    search sidebar, and generated work request and work order pages (in both work order page layouts) whose structure
+    follows the XPaths in PageParser. Detail pages can be slowed down and made to fail at random, and sessions can be
+    expired mid-run (see MockSite.expire_sessions).
+    """
+
+    _site_title = "TMA iServiceDesk - University of California-Berkeley"
+    _xpath_pattern = re.compile(r"^/html/body/table/tbody/tr\[(\d+)]/td\[(\d+)]((?:/\w+)*)$")
+    _statuses = ["Pending", "Active", "Completed", "Rejected"]
+    _order_statuses = ["Open", "Scheduled", "In Progress", "Closed"]
+    _priorities = ["1 Emergency", "2 Urgent", "3 Routine", "4 Scheduled"]
+    # Markup of the stylesheet and logo every detail page loads (blocked by lean browsers, see LeanBrowser)
+    _page_head = "<link rel=\"stylesheet\" href=\"styles/site.css\">"
+    _page_logo = "<img src=\"images/logo.gif\" alt=\"\">"
+
+    def __init__(self, first_id: int = 1, num_items: int = 1000, missing_rate: float = 0.05, latency: float = 0.05,
+                 jitter: float = 0.02, error_rate: float = 0.0, port: int = 0, seed: int = 0):
+        """Create (but do not start) a mock maintenance site.
+
+        Args:
+            first_id: First request id and work order number that exists
+            num_items: Number of consecutive request ids and work order numbers that can exist
+            missing_rate: Fraction of ids in the range that do not exist (served as not-found pages)
+            latency: Time (in seconds) each search and detail page takes to load
+            jitter: Maximum random time (in seconds) added to the latency of each page
+            error_rate: Fraction of detail page loads that fail with HTTP 500
+            port: Local port to listen on (0 to pick a free port)
+            seed: Seed for the generated items (the same seed always generates the same items)
+        """
+        self.first_id = first_id
+        self.num_items = num_items
+        self.missing_rate = missing_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self.sessions = set()  # Session ids of logged-in browsers
+        self.tickets = set()  # Calnet tickets (CASTGC cookies) of browsers logged into Calnet
+        self.logins = 0  # Number of completed Calnet logins (including silent ones with a valid ticket)
+        self.page_loads = 0
+        self.asset_loads = 0  # Number of images and stylesheets served (see MockSite.get_assets)
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), MockSite.create_handler(self))
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    @property
+    def login_url(self) -> str:
+        """URL of the mock Calnet login page that leads to the mock maintenance site (see WebAutomation.set_site)."""
+        return f"{self.url}cas/login?service={quote(self.url + 'cas2/login.aspx', safe='')}"
+
+    def start(self) -> None:
+        """Start serving (from a background thread)."""
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        """Stop serving."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def expire_sessions(self, calnet: bool = False) -> None:
+        """Expire every maintenance site session (e.g. to test recovering from a session that expires mid-run).
+
+        Args:
+            calnet: True to also expire every Calnet ticket (the next login shows the Calnet login page instead of
+                passing through silently)
+        """
+        with self.lock:
+            self.sessions.clear()
+            if calnet:
+                self.tickets.clear()
+
+    def exists(self, number: int) -> bool:
+        """Check if a request id or work order number exists on the mock site.
+
+        Args:
+            number: Request id or numeric part of a work order number
+
+        Returns:
+            True if the item exists, False otherwise
+        """
+        if not self.first_id <= number < self.first_id + self.num_items:
+            return False
+        return random.Random(f"{self.seed}-missing-{number}").random() >= self.missing_rate
+
+    @staticmethod
+    def get_date(rng: random.Random) -> str:
+        """Generate a random date and time in the format used by the maintenance site.
+
+        Args:
+            rng: Random generator of the item
+
+        Returns:
+            The formatted date
+        """
+        date = datetime(2020, 1, 1) + timedelta(minutes=rng.randrange(5 * 365 * 24 * 60))
+        return date.strftime("%m/%d/%Y %I:%M:%S %p")
+
+    @staticmethod
+    def build_table(cells: dict[tuple[int, int], str], header: str = "") -> str:
+        """Build the main table of a detail page.
+
+        Args:
+            cells: HTML content of each cell by (row, column) (both starting at 1)
+            header: HTML content of the first row (ignored if the first row has cells)
+
+        Returns:
+            The HTML of the table (without <tbody>, which browsers and PageParser insert)
+        """
+        num_rows = max(row for row, _ in cells)
+        rows = []
+        for row in range(1, num_rows + 1):
+            if row == 1 and header and not any(r == 1 for r, _ in cells):
+                rows.append(f"<tr><td colspan=\"4\">{header}</td></tr>")
+                continue
+            rows.append("<tr>" + "".join(f"<td>{cells.get((row, column), '')}</td>" for column in range(1, 5)) +
+                        "</tr>")
+        return "<table>\n" + "\n".join(rows) + "\n</table>"
+
+    @staticmethod
+    def fill_cells(cells: dict[tuple[int, int], str], fields: dict[str, str], values: dict[str, str | None]) -> None:
+        """Place field values (and their labels) into table cells at the positions of PageParser's XPaths.
+
+        Args:
+            cells: HTML content of each cell by (row, column) to add to
+            fields: XPath of each field (see PageParser)
+            values: Text of each field (None to leave the field empty)
+        """
+        for field, xpath in fields.items():
+            row, column, tags = MockSite._xpath_pattern.match(xpath).groups()
+            content = html.escape(values.get(field) or "")
+            for tag in reversed([tag for tag in tags.split('/') if tag]):
+                content = f"<{tag}>{content}</{tag}>"
+            cells[(int(row), int(column))] = content
+            cells.setdefault((int(row), int(column) - 1), field.replace('_', ' ').title() + ':')
+
+    def get_request_page(self, request_id: int) -> str:
+        """Generate the detail page of a work request.
+
+        Args:
+            request_id: id of the work request
+
+        Returns:
+            The HTML of the page
+        """
+        if not self.exists(request_id):
+            return (f"<html><head><title>Work Request</title>{MockSite._page_head}</head><body>{MockSite._page_logo}"
+                    f"<p>No work request found</p></body></html>")
+
+        rng = random.Random(f"{self.seed}-request-{request_id}")
+        status = rng.choice(MockSite._statuses)
+        values = {field: f"{field.replace('_', ' ')} {rng.randrange(1000)}" for field in PageParser.request_fields}
+        values.update({"status": status, "accept_date": MockSite.get_date(rng),
+                       "reject_date": MockSite.get_date(rng) if status == "Rejected" else None,
+                       "reject_reason": "duplicate request" if status == "Rejected" else None,
+                       "work_order_num": f"HM-{request_id}",
+                       "requested_action": "Please fix the flickering light in the hallway."})
+        room = f"Unit {rng.randrange(1, 20)} Room {rng.randrange(100, 500)}"
+
+        # The room and status sit in a small header table whose third row comes before the main table's third row
+        header = (f"<table><tr><td>Work Request {request_id}</td></tr><tr><td></td></tr>"
+                  f"<tr><td><p><font><b>for {html.escape(room)}</b></font></p></td>"
+                  f"<td><strong><font>{status}</font></strong></td></tr></table>")
+        cells = {}
+        MockSite.fill_cells(cells, {field: xpath for field, xpath in PageParser.request_fields.items()
+                                    if field != "status"}, values)
+        return (f"<html><head><title>Work Request</title>{MockSite._page_head}</head><body>{MockSite._page_logo}\n"
+                f"{MockSite.build_table(cells, header)}\n</body></html>")
+
+    def get_order_page(self, order_number: str) -> str:
+        """Generate the detail page of a work order (in one of the two page layouts, see PageParser.order_fields).
+
+        Args:
+            order_number: Order number of the work order (WITH PREFIX)
+
+        Returns:
+            The HTML of the page
+        """
+        digits = re.sub(r"\D", "", order_number)
+        number = int(digits) if digits else -1
+        if not self.exists(number):
+            return (f"<html><head><title>Work Order</title>{MockSite._page_head}</head><body>{MockSite._page_logo}"
+                    f"<p>No work order found</p></body></html>")
+
+        rng = random.Random(f"{self.seed}-order-{number}")
+        layout = 1 if number % 2 else 2
+        status = rng.choice(MockSite._order_statuses)
+        fields = PageParser.order_fields[layout]
+        values = {field: f"{field.replace('_', ' ')} {rng.randrange(1000)}" for field in fields}
+        for field, field_type in WorkOrder.field_types.items():
+            if field_type is datetime:
+                values[field] = MockSite.get_date(rng)
+        values.update({"priority": rng.choice(MockSite._priorities), "work_status": status,
+                       "date_closed": values["date_closed"] if status == "Closed" else None,
+                       "reference_number": str(number)})
+
+        cells = {}
+        MockSite.fill_cells(cells, fields, values)
+        return (f"<html><head><title>Work Order</title>{MockSite._page_head}</head><body>{MockSite._page_logo}\n"
+                f"{MockSite.build_table(cells, f'Work Order {html.escape(order_number)}')}\n</body></html>")
+
+    def wait(self) -> bool:
+        """Simulate the latency of a page load and decide whether it fails.
+
+        Returns:
+            True if the page load should fail (HTTP 500), False otherwise
+        """
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        with self.lock:
+            self.page_loads += 1
+            failed = random.random() < self.error_rate
+            self.errors += failed
+        return failed
+
+    @staticmethod
+    def create_handler(site: 'MockSite') -> type:
+        """Create the request handler class of a mock site.
+
+        Args:
+            site: The mock site to serve
+
+        Returns:
+            The request handler class
+        """
+        assets = MockSite.get_assets()
+
+        class MockSiteHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                cookies = self.get_cookies()
+                logged_in = cookies.get('ASP.NET_SessionId') in site.sessions
+
+                match url.path:
+                    case '/cas/login':
+                        if cookies.get('CASTGC') in site.tickets:  # Already logged into Calnet
+                            self.redirect(query.get('service', site.url + 'cas2/login.aspx'))
+                        else:
+                            self.send_page(MockSite.get_login_page(query.get('service', '')))
+                    case '/duo':
+                        self.send_page(MockSite.get_duo_page(query.get('service', '')))
+                    case '/cas2/login.aspx':
+                        if cookies.get('CASTGC') not in site.tickets and not logged_in:
+                            self.redirect(site.login_url)
+                            return
+                        headers = {}
+                        if not logged_in:
+                            session_id = secrets.token_hex(12)
+                            with site.lock:
+                                site.sessions.add(session_id)
+                                site.logins += 1
+                            headers['Set-Cookie'] = f"ASP.NET_SessionId={session_id}; Path=/; HttpOnly"
+                        self.send_page(MockSite.get_frameset_page(), headers)
+                    case path if path in assets:  # Static files do not require a login
+                        self.send_asset(path)
+                    case _ if not logged_in:
+                        self.redirect(site.login_url)
+                    case '/sidebar.aspx':
+                        self.send_page(MockSite.get_sidebar_page())
+                    case '/blank.aspx':
+                        self.send_page("<html><head><title></title></head><body></body></html>")
+                    case '/search.aspx':
+                        site.wait()
+                        search = quote(query.get('WorkOrderNumber', ''))
+                        if query.get('Search') == 'WR':
+                            self.redirect(f"{site.url}WorkRequest.aspx?RequestID={search}")
+                        else:
+                            self.redirect(f"{site.url}WorkOrder.aspx?WorkOrderNumber={search}")
+                    case '/WorkRequest.aspx' | '/WorkOrder.aspx':
+                        if site.wait():
+                            self.send_error(500)
+                        elif url.path == '/WorkRequest.aspx':
+                            request_id = query.get('RequestID', '')
+                            self.send_page(site.get_request_page(int(request_id) if request_id.isdigit() else -1))
+                        else:
+                            self.send_page(site.get_order_page(query.get('WorkOrderNumber', '')))
+                    case _:
+                        self.send_error(404)
+
+            def do_POST(self):
+                url = urlsplit(self.path)
+                length = int(self.headers.get('Content-Length', 0))
+                form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+                service = form.get('service', site.url + 'cas2/login.aspx')
+                match url.path:
+                    case '/cas/login':
+                        ticket = secrets.token_hex(12)
+                        with site.lock:
+                            site.tickets.add(ticket)
+                        headers = {'Set-Cookie': f"CASTGC={ticket}; Path=/; HttpOnly"}
+                        if 'duo_trusted' in self.get_cookies():
+                            self.redirect(service, headers)
+                        else:
+                            self.redirect(f"{site.url}duo?service={quote(service, safe='')}", headers)
+                    case '/duo/trust':
+                        headers = {'Set-Cookie': "duo_trusted=1; Path=/; Max-Age=2592000"}
+                        self.redirect(service, headers)
+                    case _:
+                        self.send_error(404)
+
+            def get_cookies(self) -> dict[str, str]:
+                cookies = {}
+                for pair in self.headers.get('Cookie', '').split(';'):
+                    name, _, value = pair.strip().partition('=')
+                    if name:
+                        cookies[name] = value
+                return cookies
+
+            def redirect(self, location: str, headers: dict = None):
+                self.send_response(302)
+                self.send_header('Location', location)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def send_page(self, page: str, headers: dict = None):
+                body = page.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_asset(self, path: str):
+                content_type, body = assets[path]
+                with site.lock:
+                    site.asset_loads += 1
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'max-age=3600')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # Keep the console free of request logs
+                pass
+
+        return MockSiteHandler
+
+    @staticmethod
+    def get_login_page(service: str) -> str:
+        """Generate the CAS login page (see WebAutomation.login_calnet)."""
+        return (f"<html><head><title>CAS - Central Authentication Service</title></head><body>\n"
+                f"<form method=\"post\" action=\"/cas/login\">\n"
+                f"<input type=\"hidden\" name=\"service\" value=\"{html.escape(service)}\">\n"
+                f"<input id=\"username\" name=\"username\">\n"
+                f"<input id=\"password\" name=\"password\" type=\"password\">\n"
+                f"<button id=\"submit\" type=\"submit\">Sign In</button>\n</form></body></html>")
+
+    @staticmethod
+    def get_duo_page(service: str) -> str:
+        """Generate the Duo Mobile confirmation page (its 'trust this browser' button appears after a short delay, like
+        after confirming the login on a phone)."""
+        return (f"<html><head><title>Duo Security</title></head><body>\n"
+                f"<form id=\"trust\" method=\"post\" action=\"/duo/trust\" style=\"display: none\">\n"
+                f"<input type=\"hidden\" name=\"service\" value=\"{html.escape(service)}\">\n"
+                f"</form>\n<script>setTimeout(function () {{\n"
+                f"  var button = document.createElement('button');\n"
+                f"  button.id = 'trust-browser-button';\n"
+                f"  button.textContent = 'Yes, this is my device';\n"
+                f"  button.onclick = function () {{ document.getElementById('trust').submit(); }};\n"
+                f"  document.body.appendChild(button);\n"
+                f"}}, 1000);</script></body></html>")
+
+    @staticmethod
+    def get_frameset_page() -> str:
+        """Generate the logged-in maintenance site with its search sidebar ('botleft') and results frame
+        ('botright')."""
+        return (f"<html><head><title>{MockSite._site_title}</title></head>\n"
+                f"<frameset cols=\"250,*\">\n<frame name=\"botleft\" src=\"sidebar.aspx\">\n"
+                f"<frame name=\"botright\" src=\"blank.aspx\">\n</frameset></html>")
+
+    @staticmethod
+    def get_assets() -> dict[str, tuple[str, bytes]]:
+        """Generate the images and stylesheet of the site's pages (placeholder content of realistic sizes).
+
+        Returns:
+            Dictionary mapping the path of every asset to its content type and content
+        """
+        gif = b"GIF89a\x01\x00\x01\x00\x00\x00\x00;"  # A 1x1 image (bytes after its trailer are ignored)
+        return {'/images/arrowbutton.gif': ('image/gif', gif + bytes(1024)),
+                '/images/logo.gif': ('image/gif', gif + bytes(24 * 1024)),
+                '/styles/site.css': ('text/css', b"body { font-family: Arial, sans-serif; }\n" + b" " * 8 * 1024)}
+
+    @staticmethod
+    def get_sidebar_page() -> str:
+        """Generate the search sidebar (see WebAutomation.select_item and WebAutomation.search_item)."""
+        return ("<html><head><title>Search</title></head><body>\n"
+                "<form action=\"search.aspx\" method=\"get\" target=\"botright\">\n"
+                "<select name=\"Search\"><option value=\"WR\">Work Request</option>"
+                "<option value=\"WO\">Work Order</option></select>\n"
+                "<input name=\"WorkOrderNumber\">\n"
+                "<input type=\"image\" src=\"images/arrowbutton.gif\" alt=\"Search\">\n"
+                "</form></body></html>")
@@ -0,0 +1,67 @@
+from typing import Iterator
+import psycopg2
+from Log import Log
+from MaintenanceDatabase import MaintenanceDatabase
+
+
+class OrderPlanner:
+    def __init__(self, database: MaintenanceDatabase, log: Log, prefix: str = 'HM-'):
+        """Plans work order scrapes from the work order numbers that stored work requests link to, instead of blindly
+        scraping the whole range of work order numbers (most of which no stored request refers to).
+
+        Args:
+            database: Database to read the linked work order numbers from
+            log: Log object to record progress to
+            prefix: Prefix of the work order numbers (links with any other prefix are ignored)
+        """
+        self.database = database
+        self.log = log
+        self.prefix = prefix
+
+    def get_order_numbers(self, chunk_size: int = 10000) -> Iterator[str]:
+        """Stream the distinct work order numbers linked from stored requests that are not stored yet (and were not
+        recently found not to exist), in ascending order.
+
+        The numbers are read through a named (server-side) cursor on a separate connection, so they can be scraped
+        and written while they are being read without holding them all in memory.
+
+        Args:
+            chunk_size: Number of work order numbers fetched from the server at a time
+
+        Yields:
+            Work order numbers (WITH PREFIXES)
+        """
+        host, dbname, user, password, port = self.database.db_args
+        connection = psycopg2.connect(host=host, dbname=dbname, user=user, password=password, port=port)
+        connection.set_session(readonly=True)
+        try:
+            with connection.cursor(name='bwork_linked_orders') as cursor:
+                cursor.itersize = chunk_size
+                cursor.execute("""SELECT DISTINCT r.work_order_num, CAST(substring(r.work_order_num FROM '[0-9]+$')
+                        AS BIGINT) AS number
+                    FROM request r
+                    WHERE r.work_order_num ~ ('^' || %s || '[0-9]+$')
+                        AND NOT EXISTS (SELECT 1 FROM "order" o WHERE o.order_number = r.work_order_num)
+                        AND NOT EXISTS (SELECT 1 FROM missing_item m WHERE m.item_type = 'order'
+                                        AND m.item_id = r.work_order_num
+                                        AND m.checked_at > now() - make_interval(days => %s))
+                    ORDER BY number
+                    """, (self.prefix, self.database.missing_recheck_days))
+                for order_number, number in cursor:
+                    yield order_number
+        finally:
+            connection.rollback()
+            connection.close()
+
+    def count_order_numbers(self) -> tuple[int, int]:
+        """Count the work order numbers linked from stored requests.
+
+        Returns:
+            Tuple of (number of distinct linked work order numbers, number of them not stored yet)
+        """
+        self.database.cursor.execute("""SELECT count(DISTINCT r.work_order_num),
+                count(DISTINCT r.work_order_num) FILTER (WHERE NOT EXISTS (
+                    SELECT 1 FROM "order" o WHERE o.order_number = r.work_order_num))
+            FROM request r WHERE r.work_order_num ~ ('^' || %s || '[0-9]+$')
+            """, (self.prefix,))
+        return self.database.cursor.fetchone()
@@ -14,6 +14,7 @@ def check_and_install_dependencies(path='requirements.txt') -> None:
         from collections import defaultdict
         from MaintenanceDatabase import MaintenanceDatabase
         from Scraper import Scraper
+        from HttpScraper import HttpScraper
         from Log import Log
         from Config import Config
         from User import User
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+
+
+class PageArchive:
+    _archive_path = Path.cwd() / 'Archive'
+
+    def __init__(self, path: Path = None, compression_level: int = 6):
+        """An append-only archive of the raw HTML of every fetched work request and work order page, so that changed
+        or added fields can be re-extracted offline (see Reextractor) instead of re-scraping every page.
+
+        Each process appends zlib-compressed pages to its own pack file per item type (so processes never write to the
+        same file) and records where each page starts in an index file next to it. An index line is only written after
+        its page, so a crash can never leave the index pointing at a partial page.
+
+        Args:
+            path: Directory of the archive (\\bWork\\Archive\\ by default)
+            compression_level: zlib compression level (1 is fastest, 9 is smallest)
+        """
+        self.path = path if path is not None else PageArchive._archive_path
+        self.compression_level = compression_level
+        self.files = {}  # Item type -> (pack file, index file) of this process
+        self.lock = threading.Lock()  # Pages may be fetched on several threads (see AsyncEngine)
+
+    def add(self, item_type: str, item_id: int | str, page_source: str) -> None:
+        """Append a fetched page to the archive.
+
+        Args:
+            item_type: Type of the page's item (either 'request' or 'order')
+            item_id: Request id or order number (WITH PREFIX) of the page
+            page_source: Raw HTML of the page
+        """
+        data = zlib.compress(page_source.encode('utf-8'), self.compression_level)
+        with self.lock:
+            if item_type not in self.files:
+                os.makedirs(self.path / item_type, exist_ok=True)
+                name = f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+                self.files[item_type] = (open(self.path / item_type / f"{name}.pack", 'ab'),
+                                         open(self.path / item_type / f"{name}.idx", 'a', encoding='utf-8'))
+            pack, index = self.files[item_type]
+            offset = pack.tell()
+            pack.write(data)
+            pack.flush()
+            index.write(f"{item_id}\t{offset}\t{len(data)}\t{time.time():.3f}\n")
+            index.flush()
+
+    def close(self) -> None:
+        """Close this process's pack and index files."""
+        with self.lock:
+            for pack, index in self.files.values():
+                pack.close()
+                index.close()
+            self.files = {}
+
+    @staticmethod
+    def load_index(item_type: str, path: Path = None) -> dict[str, tuple[Path, int, int]]:
+        """Load the index of every pack file of an item type, keeping only the most recently fetched page of each item.
+
+        Args:
+            item_type: Type of item (either 'request' or 'order')
+            path: Directory of the archive (\\bWork\\Archive\\ by default)
+
+        Returns:
+            Dictionary mapping each request id or order number (as text) to the pack file, offset and length of its
+            newest page
+        """
+        path = path if path is not None else PageArchive._archive_path
+        newest = {}  # Item id -> (fetch time, pack path, offset, length)
+        for index_path in sorted((path / item_type).glob('*.idx')):
+            pack_path = index_path.with_suffix('.pack')
+            with open(index_path, encoding='utf-8') as index:
+                for line in index:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) != 4:  # Partially written last line
+                        continue
+                    item_id, offset, length, fetch_time = fields
+                    if item_id not in newest or float(fetch_time) >= newest[item_id][0]:
+                        newest[item_id] = (float(fetch_time), pack_path, int(offset), int(length))
+        return {item_id: entry[1:] for item_id, entry in newest.items()}
+
+    @staticmethod
+    def read_page(pack, offset: int, length: int) -> str:
+        """Read a single page from an open pack file.
+
+        Args:
+            pack: Pack file opened in binary mode
+            offset: Position of the page in the pack file
+            length: Compressed length of the page
+
+        Returns:
+            The raw HTML of the page
+        """
+        pack.seek(offset)
+        return zlib.decompress(pack.read(length)).decode('utf-8')
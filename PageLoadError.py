@@ -0,0 +1,4 @@
+class PageLoadError(Exception):
+    """Raised when there is positive evidence that a work request or work order page failed to load (the site answered
+    with a server error or the page came back blank), so the item must be retried rather than recorded as missing (see
+    PageParser.parse_item)."""
@@ -0,0 +1,281 @@
+import re
+from lxml import html
+from lxml.html import HtmlElement
+from FieldParser import FieldParser
+from Metrics import Metrics
+from PageLoadError import PageLoadError
+from WorkOrder import WorkOrder
+from WorkOrderRequest import WorkOrderRequest
+
+
+class PageParser:
+    """Contains utility functions for extracting work order and work order request data from raw page HTML."""
+
+    # Titles of the pages served instead of a detail page once the session has expired (Calnet login, Duo Mobile)
+    login_titles = ("CAS - Central Authentication Service", "Duo Security")
+    _title_pattern = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+    _frame_pattern = re.compile(r"<frame\b[^>]*name=[\"']?botleft", re.IGNORECASE)
+
+    # XPaths of each work request field (the room is handled separately as it marks whether the request exists)
+    request_room_xpath = "//tr[3]/td[1]/p/font/b"
+    request_fields = {
+        "status": "//tr[3]/td[2]/strong/font",
+        "building": "/html/body/table/tbody/tr[2]/td[2]",
+        "tag": "/html/body/table/tbody/tr[3]/td[2]",
+        "accept_date": "/html/body/table/tbody/tr[4]/td[2]",
+        "reject_date": "/html/body/table/tbody/tr[5]/td[2]",
+        "reject_reason": "/html/body/table/tbody/tr[6]/td[2]",
+        "location": "/html/body/table/tbody/tr[2]/td[4]",
+        "item_description": "/html/body/table/tbody/tr[3]/td[4]",
+        "work_order_num": "/html/body/table/tbody/tr[4]/td[4]",
+        "area_description": "/html/body/table/tbody/tr[5]/td[4]",
+        "requested_action": "/html/body/table/tbody/tr[8]/td[2]",
+    }
+
+    # Work order pages can have one of two layouts which changes the XPaths of data
+    # Each layout is identified by the position of its 'Facility:' label
+    order_layout_markers = {
+        1: "/html/body/table/tbody/tr[6]/td[1]",
+        2: "/html/body/table/tbody/tr[4]/td[1]",
+    }
+    order_fields = {
+        1: {
+            "facility": "/html/body/table/tbody/tr[6]/td[2]",
+            "building": "/html/body/table/tbody/tr[7]/td[2]",
+            "location_id": "/html/body/table/tbody/tr[8]/td[2]",
+            "priority": "/html/body/table/tbody/tr[9]/td[2]",
+            "request_date": "/html/body/table/tbody/tr[10]/td[2]",
+            "schedule_date": "/html/body/table/tbody/tr[11]/td[2]",
+            "work_status": "/html/body/table/tbody/tr[12]/td[2]",
+            "date_closed": "/html/body/table/tbody/tr[13]/td[2]",
+            "main_charge_account": "/html/body/table/tbody/tr[14]/td[2]",
+            "task_code": "/html/body/table/tbody/tr[15]/td[2]/font",
+            "reference_number": "/html/body/table/tbody/tr[6]/td[4]",
+            "tag_number": "/html/body/table/tbody/tr[8]/td[4]",
+            "item_description": "/html/body/table/tbody/tr[9]/td[4]",
+            "request_time": "/html/body/table/tbody/tr[10]/td[4]",
+            "date_last_posted": "/html/body/table/tbody/tr[11]/td[4]",
+            "trade": "/html/body/table/tbody/tr[12]/td[4]",
+            "contractor_name": "/html/body/table/tbody/tr[13]/td[4]",
+            "est_completion_date": "/html/body/table/tbody/tr[14]/td[4]",
+            "task_description": "/html/body/table/tbody/tr[15]/td[4]",
+            "requested_action": "/html/body/table/tbody/tr[17]/td[2]",
+            "corrective_action": "/html/body/table/tbody/tr[18]/td[2]",
+        },
+        2: {
+            "facility": "/html/body/table/tbody/tr[4]/td[2]",
+            "building": "/html/body/table/tbody/tr[5]/td[2]",
+            "location_id": "/html/body/table/tbody/tr[6]/td[2]",
+            "priority": "/html/body/table/tbody/tr[7]/td[2]",
+            "request_date": "/html/body/table/tbody/tr[8]/td[2]",
+            "schedule_date": "/html/body/table/tbody/tr[9]/td[2]",
+            "work_status": "/html/body/table/tbody/tr[10]/td[2]",
+            "date_closed": "/html/body/table/tbody/tr[11]/td[2]",
+            "main_charge_account": "/html/body/table/tbody/tr[12]/td[2]",
+            "task_code": "/html/body/table/tbody/tr[13]/td[2]",
+            "reference_number": "/html/body/table/tbody/tr[4]/td[4]/p",
+            "tag_number": "/html/body/table/tbody/tr[6]/td[4]",
+            "item_description": "/html/body/table/tbody/tr[7]/td[4]",
+            "request_time": "/html/body/table/tbody/tr[8]/td[4]",
+            "date_last_posted": "/html/body/table/tbody/tr[9]/td[4]",
+            "trade": "/html/body/table/tbody/tr[10]/td[4]",
+            "contractor_name": "/html/body/table/tbody/tr[11]/td[4]",
+            "est_completion_date": "/html/body/table/tbody/tr[12]/td[4]",
+            "task_description": "/html/body/table/tbody/tr[13]/td[4]",
+            "requested_action": "/html/body/table/tbody/tr[15]/td[2]",
+            "corrective_action": "/html/body/table/tbody/tr[16]/td[2]",
+        },
+    }
+
+    @staticmethod
+    def parse_document(page_source: str) -> HtmlElement:
+        """Parse raw page HTML into a document tree that matches the DOM a browser would build.
+
+        Browsers insert a <tbody> into every table that lacks one (all XPaths above rely on this) and render <br> tags
+        as line breaks, so both are replicated here.
+
+        Args:
+            page_source: Raw HTML of the page
+
+        Returns:
+            The root element of the parsed document
+        """
+        with Metrics.span('parse_document'):
+            document = html.document_fromstring(page_source)
+
+            for table in document.iter('table'):
+                rows = [child for child in table if child.tag == 'tr']
+                if rows:
+                    tbody = table.makeelement('tbody', {})
+                    rows[0].addprevious(tbody)
+                    tbody.extend(rows)
+
+            for br in document.iter('br'):
+                br.tail = '\n' + (br.tail or '')
+
+        return document
+
+    @staticmethod
+    def find_text(document: HtmlElement, xpath: str) -> str | None:
+        """Find an element by xpath, convert to string, strip spaces and commas.
+
+        Args:
+            document: Parsed document to search in
+            xpath: XPath to find element with
+
+        Returns:
+            String value of element (commas and spaces are stripped) or None if no element exists at the XPath
+        """
+        elements = document.xpath(xpath)
+        if not elements:
+            return None
+
+        # Collapse whitespace within each line (as rendered by the browser) while keeping line breaks
+        lines = [' '.join(line.split()) for line in elements[0].text_content().splitlines()]
+        return '\n'.join(line for line in lines if line).strip(", ")
+
+    @staticmethod
+    def get_page_layout(document: HtmlElement) -> int | None:
+        """Determine the page layout type of a work order page.
+
+        Args:
+            document: Parsed work order page
+
+        Returns:
+            The key of the matching layout in PageParser.order_fields or None if the layout cannot be determined
+        """
+        for layout, xpath in PageParser.order_layout_markers.items():
+            if PageParser.find_text(document, xpath) == 'Facility:':
+                return layout
+        return None
+
+    @staticmethod
+    def parse_request(page_source: str, request_id: int) -> WorkOrderRequest:
+        """Extract a work request from the HTML of its detail page.
+
+        Args:
+            page_source: Raw HTML of the work request page
+            request_id: id of the work request
+
+        Returns:
+            WorkOrderRequest object containing data about the work request (empty if the request cannot be found)
+        """
+        document = PageParser.parse_document(page_source)
+        request = WorkOrderRequest(request_id)
+
+        request_room = PageParser.find_text(document, PageParser.request_room_xpath)
+        if request_room is None:
+            return request  # Return an empty request if request cannot be found
+        if request_room.startswith("for "):
+            request_room = request_room[4:]
+        request.room = request_room
+
+        with Metrics.span('field_extraction'):
+            for field, xpath in PageParser.request_fields.items():
+                field_type = WorkOrderRequest.field_types.get(field, str)
+                PageParser.set_field(request, field, PageParser.find_text(document, xpath), field_type)
+
+        return request
+
+    @staticmethod
+    def set_field(record: WorkOrderRequest | WorkOrder, field: str, text: str | None, field_type: type) -> None:
+        """Set a field of a record to the typed value of its scraped text. The raw text of a value that cannot be
+        parsed is kept in the record's unparsed dictionary (see MaintenanceDatabase.get_text_columns).
+
+        Args:
+            record: The WorkOrderRequest or WorkOrder
+            field: Name of the field
+            text: Scraped text of the field (or None if the field is missing)
+            field_type: Type of the field (datetime, int or str)
+        """
+        value = FieldParser.parse_value(text, field_type)
+        if value is None and text:
+            record.unparsed[field] = text
+        setattr(record, field, value)
+
+    @staticmethod
+    def parse_order(page_source: str, order_number: str) -> WorkOrder:
+        """Extract a work order from the HTML of its detail page.
+
+        Args:
+            page_source: Raw HTML of the work order page
+            order_number: Order number of the work order
+
+        Returns:
+            WorkOrder object containing data about the work order (empty if the order cannot be found)
+        """
+        document = PageParser.parse_document(page_source)
+        order = WorkOrder(order_number)
+
+        with Metrics.span('page_layout'):
+            page_layout = PageParser.get_page_layout(document)
+        if page_layout is None:
+            return order  # Return an empty work order if none can be found
+
+        with Metrics.span('field_extraction'):
+            for field, xpath in PageParser.order_fields[page_layout].items():
+                field_type = WorkOrder.field_types.get(field, str)
+                PageParser.set_field(order, field, PageParser.find_text(document, xpath), field_type)
+
+        return order
+
+    @staticmethod
+    def is_logged_out(page_source: str) -> bool:
+        """Check whether a page is what the site serves in place of a detail page once the session has expired: the
+        Calnet login page, the Duo Mobile confirmation, or (after a silent Calnet re-login) the site's start frameset.
+
+        Only the title and frame tags are matched, so this is much cheaper than parsing the page.
+
+        Args:
+            page_source: Raw HTML of the page
+
+        Returns:
+            True if the page shows that the session has expired, False otherwise
+        """
+        title = PageParser._title_pattern.search(page_source)
+        if title is not None and title.group(1).strip() in PageParser.login_titles:
+            return True
+        return PageParser._frame_pattern.search(page_source) is not None
+
+    @staticmethod
+    def is_blank(page_source: str) -> bool:
+        """Check whether a page has no visible text at all (e.g. an empty response or a frame that never loaded).
+
+        Args:
+            page_source: Raw HTML of the page
+
+        Returns:
+            True if the page is blank, False otherwise
+        """
+        if not page_source.strip():
+            return True
+        root = html.fromstring(page_source)
+        body = root.find('body')
+        return not (body if body is not None else root).text_content().strip()
+
+    @staticmethod
+    def parse_item(item_type: str, page_source: str | None, item_id: int | str) -> WorkOrderRequest | WorkOrder:
+        """Extract a work request or work order from the HTML of its detail page.
+
+        Args:
+            item_type: Type of the item (either 'request' or 'order')
+            page_source: Raw HTML of the item's page (None if the site reported that the item does not exist)
+            item_id: id of the work request or order number of the work order
+
+        Returns:
+            The WorkOrderRequest or WorkOrder (empty if the item cannot be found)
+
+        Raises:
+            PageLoadError if the page is blank (it failed to load, so the item may still exist)
+        """
+        if page_source is None:
+            return WorkOrderRequest(item_id) if item_type == 'request' else WorkOrder(item_id)
+        if not page_source.strip():
+            raise PageLoadError(f"the page of {item_type} [{item_id}] is empty")
+        if item_type == 'request':
+            record = PageParser.parse_request(page_source, item_id)
+        else:
+            record = PageParser.parse_order(page_source, item_id)
+        if record.is_empty() and PageParser.is_blank(page_source):
+            raise PageLoadError(f"the page of {item_type} [{item_id}] is blank")
+        return record
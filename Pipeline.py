@@ -0,0 +1,254 @@
+import queue
+import threading
+import time
+import traceback
+from typing import Callable, Iterable
+from Log import Log
+from Metrics import Metrics
+
+
+class Pipeline:
+    stages = ('source', 'filter', 'fetch', 'parse', 'write')
+    _done = object()  # End-of-stream marker passed down the queues
+
+    def __init__(self, fetch: Callable, parse: Callable, insert: Callable, log: Log, filter_ids: Callable = None,
+                 queue_size: int = 64, fetch_threads: int = 1, filter_batch_size: int = 500,
+                 report_interval: float = 5.0, on_failure: Callable = None):
+        """Scrapes and writes items in concurrent stages connected by bounded queues, so that pages keep loading while
+        the database checks which ids exist and commits earlier items (and the other way around):
+
+            id source -> existence filter -> fetch -> parse -> write
+
+        Every stage runs on its own thread (the fetch stage on fetch_threads threads) except for the write stage, which
+        runs on the calling thread so the database connection is only ever written from one thread. A full queue blocks
+        the stage feeding it (backpressure), so memory stays bounded and a slow database only limits throughput when it
+        is the actual bottleneck. Queue depths are reported as gauges (see Metrics.gauge) and in the log.
+
+        Args:
+            fetch: Function that fetches the raw page of a single item given its id (see MaintenanceDatabase.fetch_item)
+            parse: Function that parses a fetched page given the page and the item's id
+            insert: Function that inserts a single parsed item into the database (see MaintenanceDatabase.insert_*)
+            log: Log object to record progress and errors to
+            filter_ids: Function that returns which of a list of ids should be scraped (None to scrape every id)
+            queue_size: Maximum number of items waiting between two stages
+            fetch_threads: Number of threads fetching pages at once (values above 1 require a thread-safe fetch)
+            filter_batch_size: Number of ids checked by the existence filter at once
+            report_interval: Time (in seconds) between reports of throughput and queue depths
+            on_failure: Function called with the id of every item that could not be fetched or parsed
+        """
+        self.fetch = fetch
+        self.parse = parse
+        self.insert = insert
+        self.log = log
+        self.filter_ids = filter_ids
+        self.queue_size = queue_size
+        self.fetch_threads = fetch_threads
+        self.filter_batch_size = filter_batch_size
+        self.report_interval = report_interval
+        self.on_failure = on_failure
+
+        self.queues = {}  # Stage -> input queue of the stage
+        self.waits = {}  # Stage -> [seconds waiting for input, seconds waiting on a full output queue]
+        self.max_depths = {}  # Stage -> highest observed depth of its input queue
+        self.stopped = threading.Event()  # Set when the pipeline finishes, fails or is interrupted
+        self.error = None  # First exception raised by a stage thread
+        self.filtered = 0  # Number of ids left out by the existence filter
+        self.completed = 0  # Number of items written so far
+
+    def run(self, item_ids: Iterable) -> int:
+        """Scrape and write every item in an iterable of item ids.
+
+        Args:
+            item_ids: Iterable of request ids or order numbers
+
+        Returns:
+            The number of items written (including items recorded as missing)
+
+        Raises:
+            The first exception raised by a stage (after all stages have stopped)
+        """
+        # Ids travel to the existence filter in batches, so its queue holds a couple of batches
+        self.queues = {'filter': queue.Queue(maxsize=2), 'fetch': queue.Queue(maxsize=self.queue_size),
+                       'parse': queue.Queue(maxsize=self.queue_size), 'write': queue.Queue(maxsize=self.queue_size)}
+        self.waits = {stage: [0.0, 0.0] for stage in Pipeline.stages}
+        self.max_depths = dict.fromkeys(self.queues, 0)
+        self.stopped.clear()
+        self.error = None
+        self.filtered = 0
+        self.completed = 0
+        start_time = time.perf_counter()
+
+        threads = [threading.Thread(target=self.run_stage, args=('source', self.read_ids, iter(item_ids))),
+                   threading.Thread(target=self.run_stage, args=('filter', self.filter_stage))]
+        threads += [threading.Thread(target=self.run_stage, args=('fetch', self.fetch_stage))
+                    for _ in range(self.fetch_threads)]
+        threads += [threading.Thread(target=self.run_stage, args=('parse', self.parse_stage)),
+                    threading.Thread(target=self.report_progress)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            self.run_stage('write', self.write_stage)
+        finally:  # Stop every stage (e.g. on KeyboardInterrupt) before the caller flushes its writers
+            self.stopped.set()
+            for thread in threads:
+                thread.join()
+
+        elapsed = time.perf_counter() - start_time
+        self.log.add(f"pipeline wrote [{self.completed}] items in [{elapsed:.1f}] seconds "
+                     f"([{self.completed / max(elapsed, 1e-9):.1f}] items/s, [{self.filtered}] ids already existed)")
+        for stage in Pipeline.stages:
+            starved, blocked = self.waits[stage]
+            depth = f", max input queue depth [{self.max_depths[stage]}]" if stage in self.max_depths else ""
+            self.log.add_quiet(f"pipeline stage [{stage}]: waited [{starved:.1f}]s for input and [{blocked:.1f}]s on a "
+                               f"full output queue{depth}", phase=f'pipeline_{stage}')
+        if self.error is not None:
+            raise self.error
+        return self.completed
+
+    def run_stage(self, stage: str, target: Callable, *args) -> None:
+        """Run a stage until it finishes, stopping the whole pipeline if it fails.
+
+        Args:
+            stage: Name of the stage (one of Pipeline.stages)
+            target: Function that runs the stage
+            *args: Arguments of the function
+        """
+        try:
+            target(*args)
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+            self.log.add(f"pipeline stage [{stage}] failed ... stopping the pipeline", level='error')
+            self.log.add_quiet(f"{traceback.format_exc()}\n", level='error')
+            self.stopped.set()
+
+    def get(self, stage: str):
+        """Take the next item from a stage's input queue (waiting until one is available).
+
+        Args:
+            stage: Name of the stage
+
+        Returns:
+            The next item (Pipeline._done if the pipeline was stopped)
+        """
+        start_time = time.perf_counter()
+        item = Pipeline._done
+        while not self.stopped.is_set():
+            try:
+                item = self.queues[stage].get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        self.waits[stage][0] += time.perf_counter() - start_time
+        return item
+
+    def put(self, stage: str, next_stage: str, item) -> bool:
+        """Put an item on the input queue of the next stage (waiting while it is full).
+
+        Args:
+            stage: Name of the stage putting the item
+            next_stage: Name of the stage to pass the item to
+            item: The item
+
+        Returns:
+            True if the item was queued, False if the pipeline was stopped first
+        """
+        start_time = time.perf_counter()
+        queued = False
+        while not self.stopped.is_set():
+            try:
+                self.queues[next_stage].put(item, timeout=0.1)
+                self.max_depths[next_stage] = max(self.max_depths[next_stage], self.queues[next_stage].qsize())
+                queued = True
+                break
+            except queue.Full:
+                continue
+        self.waits[stage][1] += time.perf_counter() - start_time
+        return queued
+
+    def read_ids(self, item_iterator) -> None:
+        """Source stage: pass the item ids to the existence filter in batches.
+
+        Args:
+            item_iterator: Iterator of request ids or order numbers
+        """
+        batch = []
+        for item_id in item_iterator:
+            batch.append(item_id)
+            if len(batch) >= self.filter_batch_size:
+                if not self.put('source', 'filter', batch):
+                    return None
+                batch = []
+        if batch and not self.put('source', 'filter', batch):
+            return None
+        self.put('source', 'filter', Pipeline._done)
+
+    def filter_stage(self) -> None:
+        """Existence filter stage: leave out the ids that are already stored (or known to be missing)."""
+        while (batch := self.get('filter')) is not Pipeline._done:
+            item_ids = self.filter_ids(batch) if self.filter_ids is not None else batch
+            self.filtered += len(batch) - len(item_ids)
+            for item_id in item_ids:
+                if not self.put('filter', 'fetch', item_id):
+                    return None
+        for _ in range(self.fetch_threads):  # One end marker for every fetch thread
+            self.put('filter', 'fetch', Pipeline._done)
+
+    def fetch_stage(self) -> None:
+        """Fetch stage: fetch the raw page of every id (items that fail to load are recorded as failed)."""
+        while (item_id := self.get('fetch')) is not Pipeline._done:
+            try:
+                page_source = self.fetch(item_id)
+            except Exception as e:
+                self.log.add(f"failed to scrape item [{item_id}]", level='error', item_id=item_id)
+                self.log.add_quiet(f"{traceback.format_exc()}\n", level='error')
+                if self.on_failure is not None:
+                    self.on_failure(item_id)
+                continue
+            if not self.put('fetch', 'parse', (item_id, page_source)):
+                return None
+        self.put('fetch', 'parse', Pipeline._done)
+
+    def parse_stage(self) -> None:
+        """Parse stage: extract an item from every fetched page."""
+        remaining = self.fetch_threads  # Fetch threads that have not finished yet
+        while remaining > 0:
+            entry = self.get('parse')
+            if entry is Pipeline._done:
+                remaining -= 1
+                continue
+            item_id, page_source = entry
+            try:
+                item = self.parse(page_source, item_id)
+            except Exception as e:
+                self.log.add(f"failed to parse item [{item_id}]", level='error', item_id=item_id)
+                self.log.add_quiet(f"{traceback.format_exc()}\n", level='error')
+                if self.on_failure is not None:
+                    self.on_failure(item_id)
+                continue
+            if not self.put('parse', 'write', item):
+                return None
+        self.put('parse', 'write', Pipeline._done)
+
+    def write_stage(self) -> None:
+        """Write stage: insert every parsed item into the database (on the calling thread)."""
+        while (item := self.get('write')) is not Pipeline._done:
+            self.insert(item)
+            self.completed += 1
+
+    def report_progress(self) -> None:
+        """Log the throughput and queue depths (and update the queue depth gauges) every report_interval seconds until
+        the pipeline stops."""
+        previous_completed = 0
+        while not self.stopped.wait(self.report_interval):
+            depths = {}
+            for stage, stage_queue in self.queues.items():
+                depths[stage] = stage_queue.qsize()
+                Metrics.gauge(f'pipeline_{stage}_queue_depth', depths[stage])
+            rate = (self.completed - previous_completed) / self.report_interval
+            previous_completed = self.completed
+            self.log.add_quiet(f"pipeline throughput: [{rate:.1f}] items/s ([{self.completed}] items total), queue "
+                               f"depths: " + ", ".join(f"{stage} [{depth}]" for stage, depth in depths.items()))
+        for stage in self.queues:
+            Metrics.gauge(f'pipeline_{stage}_queue_depth', 0)
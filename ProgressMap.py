@@ -0,0 +1,128 @@
+import mmap
+import os
+import re
+import struct
+from pathlib import Path
+
+
+class ProgressMap:
+    # States of each item id (one byte per id so parallel processes never share a byte)
+    UNKNOWN = 0  # Not scraped yet (or interrupted before being written)
+    DONE = 1  # Scraped and written to the database
+    EMPTY = 2  # Scraped, but no such request/order exists
+    FAILED = 3  # Scraping or writing failed
+
+    _header = struct.Struct('<4s4xqq')  # Magic number, first id (inclusive), last id (exclusive)
+    _magic = b'BWPM'
+    _progress_path = Path.cwd() / 'Progress'
+
+    def __init__(self, path: Path):
+        """A compact on-disk record of the state of every id in a range, memory-mapped so that all worker processes
+        can share it. Updating the state of an id is a single byte write to shared memory.
+
+        Use ProgressMap.create to create a new progress map.
+
+        Args:
+            path: Path to an existing progress map file
+        """
+        self.path = path
+        self.file = open(path, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), 0)
+
+        magic, self.start, self.stop = ProgressMap._header.unpack_from(self.map)
+        if magic != ProgressMap._magic:
+            raise ValueError(f"[{path}] is not a progress map")
+
+    @staticmethod
+    def get_path(item_type: str, start: int, stop: int) -> Path:
+        """Get the path of the progress map for a range of ids.
+
+        Args:
+            item_type: Type of item in the range (either 'request' or 'order')
+            start: First id of the range (inclusive)
+            stop: Last id of the range (exclusive)
+
+        Returns:
+            Path to the progress map file (which may not exist yet)
+        """
+        return ProgressMap._progress_path / f"{item_type}_{start}_{stop}.progress"
+
+    @staticmethod
+    def create(path: Path, start: int, stop: int) -> 'ProgressMap':
+        """Create a new progress map with every id in the range set to UNKNOWN (overwriting any existing file).
+
+        Args:
+            path: Path of the progress map file
+            start: First id of the range (inclusive)
+            stop: Last id of the range (exclusive)
+
+        Returns:
+            The new progress map
+        """
+        os.makedirs(path.parent, exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(ProgressMap._header.pack(ProgressMap._magic, start, stop))
+            file.truncate(ProgressMap._header.size + max(stop - start, 1))  # Zero-filled (UNKNOWN)
+        return ProgressMap(path)
+
+    @staticmethod
+    def get_number(item_id: int | str) -> int:
+        """Get the integer id of a request id or order number (e.g. 'HM-463785' -> 463785).
+
+        Args:
+            item_id: Request id or order number (with or without prefix)
+
+        Returns:
+            The integer id
+        """
+        if isinstance(item_id, int):
+            return item_id
+        return int(re.search(r'\d+$', item_id).group())
+
+    def mark(self, item_id: int | str, state: int) -> None:
+        """Set the state of an id (ids outside the range are ignored).
+
+        Args:
+            item_id: Request id or order number
+            state: New state of the id (ProgressMap.DONE, ProgressMap.EMPTY, ProgressMap.FAILED or ProgressMap.UNKNOWN)
+        """
+        number = ProgressMap.get_number(item_id)
+        if self.start <= number < self.stop:
+            self.map[ProgressMap._header.size + number - self.start] = state
+
+    def get(self, item_id: int | str) -> int:
+        """Get the state of an id.
+
+        Args:
+            item_id: Request id or order number within the range
+
+        Returns:
+            The state of the id
+        """
+        return self.map[ProgressMap._header.size + ProgressMap.get_number(item_id) - self.start]
+
+    def get_pending(self) -> list[int]:
+        """Get all ids that still need to be scraped (UNKNOWN or FAILED).
+
+        Returns:
+            List of integer ids in ascending order
+        """
+        states = self.map[ProgressMap._header.size:ProgressMap._header.size + self.stop - self.start]
+        return [self.start + i for i, state in enumerate(states)
+                if state == ProgressMap.UNKNOWN or state == ProgressMap.FAILED]
+
+    def get_counts(self) -> dict[int, int]:
+        """Count the number of ids in each state.
+
+        Returns:
+            Dictionary mapping each state to its number of ids
+        """
+        states = self.map[ProgressMap._header.size:ProgressMap._header.size + self.stop - self.start]
+        return {state: states.count(state) for state in (ProgressMap.UNKNOWN, ProgressMap.DONE, ProgressMap.EMPTY,
+                                                         ProgressMap.FAILED)}
+
+    def close(self) -> None:
+        """Write all changes to disk and close the progress map."""
+        self.map.flush()
+        self.map.close()
+        self.file.close()
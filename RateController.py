@@ -0,0 +1,118 @@
+import multiprocessing
+import time
+from Log import Log
+
+
+class RateController:
+    def __init__(self, max_concurrency: int, log: Log, initial_concurrency: int = 1, max_rate: float = 0.0,
+                 increase: float = 1.0, decrease: float = 0.5, latency_tolerance: float = 2.0, adaptive: bool = True):
+        """Limits how many page fetches are in flight at once (and how many start per second) across all processes
+        that share it, adapting the limits to the maintenance site's observed latency and errors.
+
+        The concurrency limit follows additive increase, multiplicative decrease (AIMD): every round of successful
+        fetches raises it by `increase`, while a failed fetch or a smoothed latency above latency_tolerance times the
+        lowest smoothed latency seen (a sign that the site is overloaded) multiplies it by `decrease` (at most once per
+        round trip). A token bucket shared by all processes caps the rate of new fetches at max_rate (if set) and is
+        adjusted the same way. If adaptive is False, both limits stay fixed at max_concurrency and max_rate.
+
+        All state is kept in shared memory, so the controller must be passed to worker processes when they are created.
+
+        Args:
+            max_concurrency: Highest allowed number of fetches in flight (e.g. processes times concurrent fetches)
+            log: Log object to record changes of the limits to
+            initial_concurrency: Number of fetches allowed in flight at the start
+            max_rate: Highest allowed number of fetches started per second (0 for no rate limit)
+            increase: Amount the concurrency limit grows by per round of successful fetches
+            decrease: Factor the concurrency limit (and rate) is multiplied by when the site is overloaded
+            latency_tolerance: Factor by which the smoothed latency may exceed its lowest value before the site is
+                considered overloaded
+            adaptive: False to keep the limits fixed instead of adapting them to the site's latency and errors
+        """
+        self.max_concurrency = max_concurrency
+        self.log = log
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.adaptive = adaptive
+        if not adaptive:
+            initial_concurrency = max_concurrency
+
+        self.condition = multiprocessing.Condition()  # Guards all shared values below
+        self.limit = multiprocessing.Value('d', min(initial_concurrency, max_concurrency), lock=False)
+        self.in_flight = multiprocessing.Value('i', 0, lock=False)
+        self.rate = multiprocessing.Value('d', max_rate, lock=False)  # Current token refill rate (per second)
+        self.tokens = multiprocessing.Value('d', 1.0, lock=False)
+        self.last_refill = multiprocessing.Value('d', time.monotonic(), lock=False)
+        self.latency = multiprocessing.Value('d', 0.0, lock=False)  # Moving average of fetch latency (in seconds)
+        self.baseline_latency = multiprocessing.Value('d', 0.0, lock=False)  # Lowest recent moving average
+        self.last_decrease = multiprocessing.Value('d', 0.0, lock=False)
+
+    def refill(self) -> None:
+        """Add the tokens earned since the last refill to the token bucket (must hold the condition)."""
+        now = time.monotonic()
+        burst = max(1.0, self.rate.value)  # At most one second worth of fetches can be saved up
+        self.tokens.value = min(burst, self.tokens.value + (now - self.last_refill.value) * self.rate.value)
+        self.last_refill.value = now
+
+    def acquire(self) -> float:
+        """Wait until another fetch is allowed to start and reserve it.
+
+        Returns:
+            The start time of the fetch (to pass to RateController.release)
+        """
+        with self.condition:
+            while True:
+                rate_limited = self.max_rate > 0
+                if rate_limited:
+                    self.refill()
+                has_slot = self.in_flight.value < int(self.limit.value)
+                has_token = not rate_limited or self.tokens.value >= 1.0
+                if has_slot and has_token:
+                    self.in_flight.value += 1
+                    if rate_limited:
+                        self.tokens.value -= 1.0
+                    return time.monotonic()
+
+                if has_slot:  # Wait for the next token
+                    self.condition.wait(timeout=(1.0 - self.tokens.value) / self.rate.value)
+                else:  # Wait for a fetch to finish
+                    self.condition.wait(timeout=1.0)
+
+    def release(self, start_time: float, success: bool) -> None:
+        """Record the result of a finished fetch and adjust the limits.
+
+        Args:
+            start_time: Start time of the fetch (as returned by RateController.acquire)
+            success: True if the page was fetched, False if fetching failed (e.g. timed out)
+        """
+        now = time.monotonic()
+        with self.condition:
+            self.in_flight.value -= 1
+            if not self.adaptive:
+                self.condition.notify_all()
+                return None
+            if success:
+                latency = now - start_time
+                self.latency.value = latency if self.latency.value == 0 else 0.8 * self.latency.value + 0.2 * latency
+                if self.baseline_latency.value == 0 or self.latency.value < self.baseline_latency.value:
+                    self.baseline_latency.value = self.latency.value
+                else:  # Let the baseline follow lasting changes slowly
+                    self.baseline_latency.value += 0.01 * (self.latency.value - self.baseline_latency.value)
+
+            overloaded = not success or self.latency.value > self.latency_tolerance * self.baseline_latency.value
+            old_limit = int(self.limit.value)
+            if overloaded:
+                if now - self.last_decrease.value > self.latency.value:  # Decrease at most once per round trip
+                    self.limit.value = max(1.0, self.limit.value * self.decrease)
+                    self.rate.value = max(1.0, self.rate.value * self.decrease) if self.max_rate > 0 else 0.0
+                    self.last_decrease.value = now
+            else:  # A full round of successful fetches raises the limit by `increase`
+                self.limit.value = min(self.max_concurrency, self.limit.value + self.increase / self.limit.value)
+                if self.max_rate > 0:
+                    self.rate.value = min(self.max_rate, self.rate.value + self.increase / self.limit.value)
+
+            if int(self.limit.value) != old_limit:
+                self.log.add(f"{'lowered' if overloaded else 'raised'} concurrency limit to [{int(self.limit.value)}] "
+                             f"(latency [{self.latency.value:.2f}]s, baseline [{self.baseline_latency.value:.2f}]s)")
+            self.condition.notify_all()
@@ -0,0 +1,104 @@
+import multiprocessing
+import time
+from collections import defaultdict
+from pathlib import Path
+from BatchWriter import BatchWriter
+from Log import Log
+from MaintenanceDatabase import MaintenanceDatabase
+from Metrics import Metrics
+from PageArchive import PageArchive
+from PageLoadError import PageLoadError
+from PageParser import PageParser
+
+
+class Reextractor:
+    def __init__(self, database: MaintenanceDatabase, log: Log, archive_path: Path = None):
+        """Re-extracts stored work requests and work orders from the archived raw pages (see PageArchive) with the
+        current PageParser, e.g. after an XPath was fixed or a field was added, without visiting the maintenance site.
+
+        Args:
+            database: Database to write the re-extracted items to
+            log: Log object to record progress and errors to
+            archive_path: Directory of the page archive (\\bWork\\Archive\\ by default)
+        """
+        self.database = database
+        self.log = log
+        self.archive_path = archive_path
+
+    def reextract(self, item_type: str, num_processes: int = None, chunk_size: int = 500) -> tuple[int, int]:
+        """Parse the newest archived page of every work request or work order on all CPU cores and bulk-write the
+        results (inserting missing items and updating the ones whose content changed).
+
+        Args:
+            item_type: Type of item to re-extract (either 'request' or 'order')
+            num_processes: Number of parsing processes (None for one per CPU core)
+            chunk_size: Number of pages each parsing task handles
+
+        Returns:
+            The number of pages parsed and the number of items written
+        """
+        index = PageArchive.load_index(item_type, self.archive_path)
+        if not index:
+            self.log.add(f"no archived {item_type} pages found")
+            return 0, 0
+
+        # Tasks read from a single pack file each, in file order
+        columns = self.database.all_columns_requests if item_type == 'request' else self.database.all_columns_orders
+        text_columns = self.database.get_text_columns(item_type)
+        entries = defaultdict(list)
+        for item_id, (pack_path, offset, length) in index.items():
+            entries[pack_path].append((item_id, offset, length))
+        tasks = []
+        for pack_path, pack_entries in entries.items():
+            pack_entries.sort(key=lambda entry: entry[1])
+            for i in range(0, len(pack_entries), chunk_size):
+                tasks.append((item_type, pack_path, pack_entries[i:i + chunk_size], columns, text_columns))
+
+        writer = self.database.create_update_writer(item_type)
+        self.log.add(f"re-extracting [{len(index)}] archived {item_type} pages in [{len(tasks)}] tasks")
+        start_time = time.perf_counter()
+        parsed = 0
+        written = 0
+        with multiprocessing.Pool(num_processes, initializer=Metrics.reset) as pool:
+            try:
+                for num_pages, rows in pool.imap_unordered(Reextractor.parse_pages, tasks):
+                    parsed += num_pages
+                    for row in rows:
+                        writer.add_row(row)
+                    written += len(rows)
+            finally:
+                writer.flush()
+
+        elapsed = time.perf_counter() - start_time
+        self.log.add(f"re-extracted [{parsed}] {item_type} pages in [{elapsed:.1f}] seconds "
+                     f"([{parsed / max(elapsed, 1e-9):.0f}] pages/s) ... wrote [{written}] {item_type}s "
+                     f"([{parsed - written}] pages were empty)")
+        return parsed, written
+
+    @staticmethod
+    def parse_pages(task: tuple) -> tuple[int, list[tuple]]:
+        """Parse a chunk of archived pages from one pack file (run in a pool process).
+
+        Args:
+            task: Tuple of (item type, pack file path, list of (item id, offset, length), table columns, columns of
+                typed fields stored as TEXT)
+
+        Returns:
+            The number of pages parsed and the table rows (with content hashes) of the non-empty items
+        """
+        item_type, pack_path, pack_entries, columns, text_columns = task
+        rows = []
+        with open(pack_path, 'rb') as pack:
+            for item_id, offset, length in pack_entries:
+                page_source = PageArchive.read_page(pack, offset, length)
+                if item_type == 'request':
+                    item_id = int(item_id)
+                try:
+                    record = PageParser.parse_item(item_type, page_source, item_id)
+                except PageLoadError as e:  # An archived blank page
+                    continue
+                if record.is_empty():
+                    continue
+                row = BatchWriter.get_row_values(record, columns, text_columns)
+                rows.append(row + (BatchWriter.get_content_hash(row),))
+        return len(pack_entries), rows
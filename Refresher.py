@@ -0,0 +1,72 @@
+import traceback
+from BatchWriter import BatchWriter
+from Log import Log
+from MaintenanceDatabase import MaintenanceDatabase
+
+
+class Refresher:
+    def __init__(self, database: MaintenanceDatabase, log: Log):
+        """Re-scrapes stored work requests and work orders that may still change and writes only the ones whose
+        content changed.
+
+        Args:
+            database: Database to read stored items from and write changes to
+            log: Log object to record progress to
+        """
+        self.database = database
+        self.log = log
+
+    def refresh(self, item_type: str, limit: int, min_age_hours: int) -> tuple[int, int]:
+        """Re-scrape the open items most likely to have changed and update the ones whose content hash differs. Items
+        that fail to scrape or cannot be found keep their stored data and are also marked checked, so they are retried
+        after min_age_hours like every other item instead of being ranked first on every refresh.
+
+        Args:
+            item_type: Type of item to refresh (either 'request' or 'order')
+            limit: Maximum number of items to re-scrape
+            min_age_hours: Minimum time (in hours) since an item was last checked
+
+        Returns:
+            Tuple of (number of items checked, number of items changed)
+        """
+        candidates = self.database.get_refresh_candidates(item_type, limit, min_age_hours)
+        self.log.add(f"refreshing [{len(candidates)}] open {item_type}s")
+
+        if item_type == 'request':
+            columns = self.database.all_columns_requests
+        else:
+            columns = self.database.all_columns_orders
+
+        unchanged_ids = []
+        skipped_ids = []  # Items that failed or could not be found (also marked checked so they do not stay first)
+        changed = 0
+        try:
+            for item_id, stored_hash in candidates:
+                try:
+                    record = self.database.scrape_item(item_type, item_id)
+                except Exception as e:
+                    self.log.add(f"failed to refresh {item_type} [{item_id}]", level='error', item_id=item_id)
+                    self.log.add_quiet(f"{traceback.format_exc()}\n", level='error')
+                    skipped_ids.append(item_id)
+                    continue
+
+                if record.is_empty():  # Never overwrite stored data with a failed scrape
+                    self.log.add(f"{item_type} [{item_id}] could not be found ... keeping stored data")
+                    skipped_ids.append(item_id)
+                    continue
+
+                row = BatchWriter.get_row_values(record, columns, self.database.get_text_columns(item_type))
+                content_hash = BatchWriter.get_content_hash(row)
+                if content_hash == stored_hash:
+                    unchanged_ids.append(item_id)
+                else:
+                    self.database.update_item(item_type, record, content_hash)
+                    changed += 1
+                    self.log.add(f"updated changed {item_type} [{item_id}]")
+        finally:  # Also record checked items if interrupted (e.g. KeyboardInterrupt)
+            self.database.mark_checked(item_type, unchanged_ids + skipped_ids)
+
+        checked = len(unchanged_ids) + changed
+        self.log.add(f"checked [{checked}] open {item_type}s ... [{changed}] changed, [{len(skipped_ids)}] skipped "
+                     f"until the next refresh")
+        return checked, changed
@@ -1,18 +1,28 @@
 import hashlib
 import os
 import shutil
+import tempfile
 from pathlib import Path
+from LeanBrowser import LeanBrowser
+from Metrics import Metrics
+from PageParser import PageParser
+from SessionExpiredError import SessionExpiredError
 from selenium.common import exceptions
 import User
 from selenium import webdriver
 from WebAutomation import *
+from WorkOrder import *
 from WorkOrderRequest import *
 from User import *
 
 
 class Scraper:
+    _site_title = "TMA iServiceDesk - University of California-Berkeley"  # Title of the logged-in maintenance site
+    # Fields of Network.getAllCookies results accepted by Network.setCookies
+    _cookie_fields = ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite', 'priority')
+
     def __init__(self, chrome_path: Path, chromedriver_path: Path, user: User = None, process_id: int = 0,
-                 headless: bool = True):
+                 headless: bool = True, session: dict = None, resource_rules: dict[str, str] = None):
         """An automated webscraper for retrieving work order and work order request data.
 
         Args:
@@ -21,14 +31,25 @@ class Scraper:
             user: Calnet user for Calnet login and authorization
             process_id: Unique process id for this scraper (for parallel processing)
             headless: True to run the webdriver in headless mode
+            session: Calnet session exported from a logged-in scraper (see Scraper.export_session) to reuse instead of
+                logging in again (the scraper falls back to logging in if the session is no longer valid)
+            resource_rules: Resource types to block ('deny') or load ('allow') in a lean browser (see LeanBrowser), or
+                None for a full browser
         """
         self.chrome_path = chrome_path
         self.chromedriver_path = chromedriver_path
         self.user = user
         self.process_id = process_id
         self.headless = headless
-        self.driver = self.initialize_driver()
-        self.login_calnet()
+        self.profile_path = None
+        self.archive = None  # PageArchive to store every scraped page in (if any)
+        self.page_urls = {}  # Item type -> detail page URL template (see Scraper.enable_direct_navigation)
+        self.frameset_url = None  # URL of the site's frameset (to return to when direct navigation fails)
+        self.lean = LeanBrowser(resource_rules) if resource_rules is not None else None
+        with Metrics.span('driver_startup'):
+            self.driver = self.initialize_driver()
+        if session is None or not self.import_session(session):
+            self.login_calnet()
 
     def initialize_driver(self) -> WebDriver:
         """Initialize the webdriver instance (chromedriver).
@@ -48,26 +69,81 @@ class Scraper:
         if self.headless:
             chrome_options.add_argument("--headless")
 
-        # Load or create a unique Chrome profile for this webdriver instance:
-        # The primary (driver) scraper has process id 0 ("p0")
-        # All parallel scrapers copy the primary scraper's Chrome profile to skip Duo Mobile login (using saved cookies)
-        profile_name = hashlib.sha256(self.user.username.encode('utf-8')).hexdigest()
-        profile_path = Path.cwd() / 'Profiles' / f'{profile_name}'
-        profile_instance_path = profile_path / f'p{self.process_id}'  # The profile instance unique to this scraper
-        if not os.path.exists(profile_instance_path):
-            if self.process_id == 0:  # Base scraper/profile
-                os.makedirs(profile_instance_path)
-            else:  # Parallel scraper/profile
-                base_instance_path = profile_path / 'p0'
-                shutil.copytree(base_instance_path, profile_instance_path)  # Duplicate base profile
+        # Lean mode: block unneeded resources, treat pages as loaded once parsed, and turn off unneeded features
+        if self.lean is not None:
+            self.lean.configure(chrome_options)
+
+        # Load or create the Chrome profile for this webdriver instance:
+        # The primary (driver) scraper has process id 0 ("p0") and keeps its profile (and Duo Mobile trust) on disk
+        # Parallel scrapers start from an empty throwaway profile (in memory where possible) and receive the primary
+        # scraper's session cookies instead (see Scraper.import_session)
+        if self.process_id == 0:
+            profile_name = hashlib.sha256(self.user.username.encode('utf-8')).hexdigest()
+            profile_instance_path = Path.cwd() / 'Profiles' / f'{profile_name}' / 'p0'
+            os.makedirs(profile_instance_path, exist_ok=True)
+        else:
+            self.profile_path = Path(tempfile.mkdtemp(prefix=f'bwork-p{self.process_id}-',
+                                                      dir=Scraper.get_scratch_dir()))
+            profile_instance_path = self.profile_path
+            chrome_options.add_argument("--no-first-run")
+            chrome_options.add_argument("--no-default-browser-check")
         chrome_options.add_argument(f"user-data-dir={profile_instance_path}")  # Use this profile for the scraper
 
         # Initialize driver
         driver = webdriver.Chrome(options=chrome_options, service=chrome_service)
+        if self.lean is not None:
+            self.lean.start(driver)
         if not self.headless:
             driver.set_window_size(1280, 720)
         return driver
 
+    @staticmethod
+    def get_scratch_dir() -> str | None:
+        """Get the directory to create throwaway Chrome profiles in (a memory-backed tmpfs if one is available).
+
+        Returns:
+            Path of the directory, or None to use the system's temporary directory
+        """
+        return '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+    def export_session(self) -> dict:
+        """Export the Calnet session of this (logged-in) scraper so that other scrapers can reuse it.
+
+        Unlike Scraper.get_cookies, this includes the cookies of every domain (Calnet, Duo Mobile and the maintenance
+        site).
+
+        Returns:
+            Dictionary with the current page URL ('url') and a list of cookies ('cookies')
+        """
+        cookies = self.driver.execute_cdp_cmd('Network.getAllCookies', {})['cookies']
+        session_cookies = []
+        for cookie in cookies:
+            session_cookie = {field: cookie[field] for field in Scraper._cookie_fields if field in cookie}
+            if not cookie.get('session', False) and 'expires' in cookie:
+                session_cookie['expires'] = cookie['expires']
+            session_cookies.append(session_cookie)
+        # Direct navigation leaves the browser on a detail page instead of the frameset other scrapers need to load
+        url = self.frameset_url if self.page_urls else self.driver.current_url
+        return {'url': url, 'cookies': session_cookies}
+
+    def import_session(self, session: dict) -> bool:
+        """Load a Calnet session exported from another scraper and check that it is still valid by opening the
+        maintenance site (skipping the Calnet login page entirely if it is).
+
+        Args:
+            session: Session exported with Scraper.export_session
+
+        Returns:
+            True if the session is valid (the maintenance site loaded), False otherwise
+        """
+        try:
+            with Metrics.span('session_import'):
+                self.driver.execute_cdp_cmd('Network.setCookies', {'cookies': session['cookies']})
+                self.driver.get(session['url'])
+                return self.driver.title == Scraper._site_title
+        except exceptions.WebDriverException:
+            return False
+
     def login_calnet(self) -> None:
         """Login to the user's Calnet account (and prompt for credentials if necessary).
 
@@ -77,7 +153,8 @@ class Scraper:
             print('CALNET LOGIN:\n')
             self.user = User.login_prompt()
 
-        WebAutomation.login_calnet(self.driver, self.user)
+        with Metrics.span('login_calnet'):
+            WebAutomation.login_calnet(self.driver, self.user)
 
     def scrape_request(self, request_id: int) -> WorkOrderRequest:
         """Scrape a single work request.
@@ -86,13 +163,15 @@ class Scraper:
             request_id: The id of the work request
 
         Returns:
-            The scraped work request as a WorkOrderRequest object
+            The scraped work request as a WorkOrderRequest object (empty if no such request exists)
+
+        Raises:
+            selenium.common.exceptions.WebDriverException if the page fails to load
+            SessionExpiredError if the site served a login page instead of the item's page
+            PageLoadError if the page failed to load (see PageParser.parse_item)
         """
-        WebAutomation.select_item(self.driver, 'WR')
-        try:
-            return WebAutomation.scrape_request(self.driver, request_id)
-        except:
-            return WorkOrderRequest(request_id)  # Return an empty request if request cannot be found
+        page_source = self.fetch_item('request', request_id)
+        return PageParser.parse_item('request', page_source, request_id)
 
     def scrape_order(self, order_number: str) -> WorkOrder:
         """Scrape a single work order.
@@ -101,13 +180,100 @@ class Scraper:
             order_number: The order number of the work order
 
         Returns:
-            The scraped work order as a WorkOrder object
+            The scraped work order as a WorkOrder object (empty if no such work order exists)
+
+        Raises:
+            selenium.common.exceptions.WebDriverException if the page fails to load
+            SessionExpiredError if the site served a login page instead of the item's page
+            PageLoadError if the page failed to load (see PageParser.parse_item)
         """
-        WebAutomation.select_item(self.driver, 'WO')
-        try:
-            return WebAutomation.scrape_order(self.driver, order_number)
-        except:
-            return WorkOrder(order_number)  # Return an empty work order if none can be found
+        page_source = self.fetch_item('order', order_number)
+        return PageParser.parse_item('order', page_source, order_number)
+
+    def fetch_item(self, item_type: str, item_id: int | str) -> str | None:
+        """Fetch the raw HTML of a single work request or work order page (without parsing it, see Pipeline).
+
+        With direct navigation enabled, the detail page is opened by its URL; the search through the sidebar is only
+        used if that fails.
+
+        Args:
+            item_type: Type of item to fetch (either 'request' or 'order')
+            item_id: The id of the work request or the order number of the work order
+
+        Returns:
+            The HTML of the item's page or None if the site reports that the page does not exist (HTTP 404)
+
+        Raises:
+            selenium.common.exceptions.WebDriverException if the page fails to load
+            SessionExpiredError if the site served a login page instead of the item's page
+            PageLoadError if the site answered with a server error (HTTP 500 or above)
+        """
+        if self.lean is not None:
+            self.lean.record_usage_if_due(self.driver)
+        if item_type in self.page_urls:
+            try:
+                status, page_source = WebAutomation.load_page(self.driver, self.page_urls[item_type].format(item_id),
+                                                              wait_for_load=self.lean is None)
+                if status == 404:
+                    return None
+                if status is None or status < 400:
+                    if PageParser.is_logged_out(page_source):
+                        raise SessionExpiredError(f"a login page was served instead of {item_type} [{item_id}]")
+                    if self.archive is not None:
+                        self.archive.add(item_type, item_id, page_source)
+                    return page_source
+            except exceptions.WebDriverException as e:
+                pass  # Fall back to searching for the item
+            Metrics.count('direct_navigation_fallbacks')
+            self.driver.get(self.frameset_url)  # Return to the frameset to search through the sidebar
+
+        WebAutomation.select_item(self.driver, 'WR' if item_type == 'request' else 'WO')
+        return WebAutomation.fetch_item(self.driver, item_type, item_id, archive=self.archive,
+                                        wait_for_load=self.lean is None)
+
+    def enable_direct_navigation(self, request_url: str = 'auto', order_url: str = 'auto', prefix: str = 'HM-') -> None:
+        """Open detail pages directly by their URL instead of selecting the item type in the sidebar's dropdown menu,
+        typing the id into the search box and switching to the 'botright' frame (saving most WebDriver round trips of
+        every item). Must be called while the browser is on the site's frameset (e.g. right after logging in).
+
+        Args:
+            request_url: Work request detail page URL template ('auto' to discover it with a search)
+            order_url: Work order detail page URL template ('auto' to discover it with a search)
+            prefix: Prefix of work order numbers (used to discover the work order URL template)
+        """
+        self.driver.switch_to.default_content()
+        self.frameset_url = self.driver.current_url
+        if request_url == 'auto':
+            request_url = self.discover_page_url('request')
+        if order_url == 'auto':
+            order_url = self.discover_page_url('order', prefix)
+        self.page_urls = {'request': request_url, 'order': order_url}
+
+    def discover_page_url(self, item_type: str, prefix: str = 'HM-') -> str:
+        """Discover the URL template of work request or work order detail pages by running one search through the
+        sidebar and recording the URL loaded into the results frame.
+
+        Args:
+            item_type: Type of item to discover the detail page URL for (either 'request' or 'order')
+            prefix: Prefix of work order numbers (ignored for requests)
+
+        Returns:
+            URL of a detail page with '{}' in place of the request id or order number
+
+        Raises:
+            ValueError if the searched item does not appear in the detail page URL
+        """
+        sentinel = '987654321'  # Placeholder id that cannot be confused with any other part of the URL
+        if item_type == 'request':
+            query = sentinel
+            url = WebAutomation.get_detail_url(self.driver, 'WR', query)
+        else:
+            query = prefix + sentinel
+            url = WebAutomation.get_detail_url(self.driver, 'WO', query)
+
+        if query not in url:
+            raise ValueError(f"could not discover {item_type} page URL from [{url}] (set it manually in the config)")
+        return url.replace(query, '{}')
 
     def get_cookies(self) -> list[dict]:
         """Get a list of the webdriver cookies that are currently visible (cookies from the current domain).
@@ -130,6 +296,26 @@ class Scraper:
             except exceptions.InvalidCookieDomainException as e:
                 print(f"failed to add cookie with name [{cookie.get('name')}] (wrong domain)")
 
+    def is_healthy(self) -> bool:
+        """Check that the webdriver still responds and is on a loaded page of the maintenance site.
+
+        Returns:
+            True if the webdriver can be used for scraping, False otherwise
+        """
+        try:
+            ready_state = self.driver.execute_script("return document.readyState")
+            on_site = self.driver.current_url.startswith(WebAutomation.site_url)
+            return ready_state == 'complete' and on_site
+        except exceptions.WebDriverException:
+            return False
+
     def close(self) -> None:
-        """Close the webdriver."""
-        self.driver.close()
+        """Close the webdriver (and end its Chrome and chromedriver processes) and delete its throwaway profile."""
+        if self.lean is not None:
+            try:
+                self.lean.record_usage(self.driver)
+            except exceptions.WebDriverException as e:  # The webdriver may already be gone
+                pass
+        self.driver.quit()
+        if self.profile_path is not None:
+            shutil.rmtree(self.profile_path, ignore_errors=True)
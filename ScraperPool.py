@@ -0,0 +1,227 @@
+import multiprocessing
+import queue
+import signal
+import traceback
+from pathlib import Path
+from Log import Log
+from Metrics import Metrics
+from MaintenanceDatabase import MaintenanceDatabase
+from ProgressMap import ProgressMap
+from RateController import RateController
+from User import User
+from WorkQueue import WorkQueue
+
+
+class ScraperPool:
+    def __init__(self, num_workers: int, log: Log, chrome_path: Path, chromedriver_path: Path, calnet_user: User,
+                 headless: bool, db_args: tuple, database_options: dict, session: dict, recycle_after: int = 1000,
+                 rate_controller: RateController = None):
+        """A pool of long-lived worker processes, each with its own warm (logged in) scraper and database connection,
+        that is kept between scrape jobs so that only the first job pays for starting Chrome and logging into Calnet.
+
+        Every job is handed to all workers at once and its item ids are distributed through a WorkQueue. Before each
+        job a worker checks that its webdriver still responds (restarting it if not), and every worker restarts its
+        scraper after scraping recycle_after items to keep Chrome's memory use in check.
+
+        Args:
+            num_workers: Number of worker processes
+            log: Log object to record progress to
+            chrome_path: Path pointing to the chrome directory to be used for Scrapers
+            chromedriver_path: Path pointing to the chromedriver directory to be used for Scrapers
+            calnet_user: Calnet user used to log into maintenance.housing.berkeley.edu
+            headless: True to run the workers' browsers in headless mode
+            db_args: Tuple of arguments to connect to the database
+            database_options: Scraping and writing options for the database (see Driver.get_database_options)
+            session: Calnet session of the primary scraper for workers to reuse (see Scraper.export_session)
+            recycle_after: Number of items a worker scrapes before restarting its scraper (0 to never restart)
+            rate_controller: Controller limiting page fetches across all workers (None for no limit)
+        """
+        self.num_workers = num_workers
+        self.log = log
+
+        self.tasks = multiprocessing.Queue(maxsize=num_workers)  # Chunks of item ids of the current job
+        self.reports = multiprocessing.Queue()  # Finished chunks of the current job (see WorkQueue)
+        self.status = multiprocessing.Queue()  # (worker id, True if the worker started successfully)
+        self.jobs = [multiprocessing.Queue() for _ in range(num_workers)]  # (item type, progress path) or None to exit
+
+        # Process 0 is reserved for the primary (driver) database
+        self.processes = []
+        for worker_id, jobs in enumerate(self.jobs, start=1):
+            args = (worker_id, jobs, self.tasks, self.reports, self.status, log, chrome_path, chromedriver_path,
+                    calnet_user, headless, db_args, database_options, session, recycle_after, rate_controller)
+            self.processes.append(multiprocessing.Process(target=ScraperPool.serve, args=args))
+
+    def start(self) -> None:
+        """Start all worker processes and wait until each has logged in.
+
+        Raises:
+            RuntimeError if a worker failed to start
+        """
+        for process in self.processes:
+            process.start()
+
+        started = 0
+        while started < self.num_workers:
+            try:
+                worker_id, success = self.status.get(timeout=1.0)
+            except queue.Empty:
+                if not self.is_alive():
+                    raise RuntimeError("a scraper pool worker exited during startup")
+                continue
+            if not success:
+                raise RuntimeError(f"scraper pool worker [{worker_id}] failed to start")
+            started += 1
+        self.log.add(f"started scraper pool with [{self.num_workers}] workers")
+
+    def is_alive(self) -> bool:
+        """Check that every worker process is still running.
+
+        Returns:
+            True if all workers are running, False otherwise
+        """
+        return all(process.is_alive() for process in self.processes)
+
+    def run_job(self, item_type: str, item_ids: list, progress_path: Path,
+                target_chunk_time: float = 10.0) -> WorkQueue:
+        """Scrape and add a list of work order requests or work orders to the database with all workers of the pool.
+
+        If interrupted (CTRL+C), the workers finish their current chunk and the pool stays ready for the next job.
+
+        Args:
+            item_type: Type of item to be scraped (either 'request' or 'order')
+            item_ids: List of request ids or order numbers (WITH PREFIXES) that do not exist in the database yet
+            progress_path: Path to the progress map of the range being scraped
+            target_chunk_time: Time (in seconds) a single chunk should take to scrape (see WorkQueue)
+
+        Returns:
+            The WorkQueue of the job (for its statistics)
+        """
+        work_queue = WorkQueue(item_ids, self.num_workers, self.log, target_chunk_time=target_chunk_time,
+                               tasks=self.tasks, reports=self.reports)
+        for jobs in self.jobs:
+            jobs.put((item_type, progress_path))
+        try:
+            work_queue.run(self.processes)
+        except KeyboardInterrupt:
+            self.log.add("interrupted ... waiting for workers to finish their current chunks")
+            self.cancel_job(work_queue)
+        return work_queue
+
+    def cancel_job(self, work_queue: WorkQueue) -> None:
+        """Stop the current job after each worker's current chunk (discarding all chunks that were not taken yet).
+
+        Args:
+            work_queue: The WorkQueue of the current job (after WorkQueue.run returned or was interrupted)
+        """
+        ScraperPool.drain(self.tasks)
+        finished_workers = set(work_queue.finished_workers)
+        for _ in range(self.num_workers - len(finished_workers)):
+            self.tasks.put(None)
+
+        while len(finished_workers) < self.num_workers and self.is_alive():
+            try:
+                worker_id, num_items, elapsed = self.reports.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if num_items is None:
+                finished_workers.add(worker_id)
+
+        # Workers that finished while the job was being stopped leave their stop signal behind
+        ScraperPool.drain(self.tasks)
+
+    @staticmethod
+    def drain(messages: multiprocessing.Queue) -> None:
+        """Remove all messages from a queue.
+
+        Args:
+            messages: The queue to empty
+        """
+        try:
+            while True:
+                messages.get(timeout=0.1)
+        except queue.Empty:
+            pass
+
+    def close(self) -> None:
+        """Stop all worker processes (after their current job) and close their databases and scrapers."""
+        for jobs in self.jobs:
+            jobs.put(None)
+        for process in self.processes:
+            process.join(timeout=30.0)
+            if process.is_alive():  # Stuck (e.g. in an unresponsive webdriver)
+                process.terminate()
+        self.log.add("closed scraper pool")
+
+    @staticmethod
+    def serve(worker_id: int, jobs: multiprocessing.Queue, tasks: multiprocessing.Queue,
+              reports: multiprocessing.Queue, status: multiprocessing.Queue, log: Log, chrome_path: Path,
+              chromedriver_path: Path, calnet_user: User, headless: bool, db_args: tuple, database_options: dict,
+              session: dict, recycle_after: int, rate_controller: RateController) -> None:
+        """Run a single worker of a ScraperPool: start a database and scraper once, then run jobs until told to exit.
+
+        A new database object is created for every process to establish a unique connection and scraper as psycopg2
+        connections and selenium webdrivers cannot be shared between processes. Workers ignore CTRL+C, which is handled
+        by the pool in the main process (see ScraperPool.run_job).
+
+        Args:
+            worker_id: Unique integer id assigned to this worker (and its Chrome profile)
+            jobs: Queue of jobs for this worker
+            tasks: Task queue shared by all workers to take chunks of item ids from
+            reports: Report queue shared by all workers to report finished chunks to
+            status: Queue to report a successful (or failed) startup to
+            log: Log object for recording progress and error messages
+            chrome_path: Path pointing to the chrome directory to be used for Scrapers
+            chromedriver_path: Path pointing to the chromedriver directory to be used for Scrapers
+            calnet_user: Calnet user used to log into maintenance.housing.berkeley.edu
+            headless: True if this worker should be run in a headless or headful browser
+            db_args: Tuple of arguments to connect to the database
+            database_options: Scraping and writing options for the database (see Driver.get_database_options)
+            session: Calnet session of the primary scraper to reuse instead of logging in again
+            recycle_after: Number of items to scrape before restarting the scraper (0 to never restart)
+            rate_controller: Controller limiting page fetches across all workers (None for no limit)
+        """
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        Metrics.reset()  # Forked workers inherit the primary's metrics
+
+        host, dbname, user, password, port = db_args
+        try:
+            database = MaintenanceDatabase(log=log, chrome_path=chrome_path, chromedriver_path=chromedriver_path,
+                                           calnet_user=calnet_user, process_id=worker_id, headless=headless,
+                                           host=host, dbname=dbname, user=user, password=password, port=port,
+                                           session=session, rate_controller=rate_controller, **database_options)
+        except Exception as e:
+            log.add(f"scraper pool worker [{worker_id}] failed to start", level='error')
+            log.add_quiet(f"{traceback.format_exc()}\n", level='error')
+            status.put((worker_id, False))
+            return None
+        status.put((worker_id, True))
+
+        scraped = 0  # Number of items scraped since the scraper was (re)started
+
+        def process_chunk(chunk: list) -> None:
+            nonlocal scraped
+            if 0 < recycle_after <= scraped:
+                log.add(f"worker [{worker_id}]: recycling scraper after [{scraped}] items")
+                database.restart_scraper()
+                scraped = 0
+            if item_type == 'request':
+                database.add_requests(chunk, skip_existing=False)  # Already checked against the database by driver
+            else:
+                database.add_orders(chunk, skip_existing=False)
+            scraped += len(chunk)
+
+        while (job := jobs.get()) is not None:
+            item_type, progress_path = job
+            if not database.browser_scraper.is_healthy():
+                log.add(f"worker [{worker_id}]: scraper is not responding ... restarting it", level='warning')
+                database.restart_scraper()
+                scraped = 0
+
+            database.progress = ProgressMap(progress_path)
+            try:
+                WorkQueue.work(tasks, reports, worker_id, process_chunk)
+            finally:
+                database.progress.close()
+                database.progress = None
+                Metrics.write()  # Make the job's metrics visible to the driver's summary
+        database.close()
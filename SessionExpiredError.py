@@ -0,0 +1,3 @@
+class SessionExpiredError(Exception):
+    """Raised when the maintenance site serves a Calnet login page, the Duo Mobile confirmation or its start frameset
+    instead of the requested page, i.e. the scraper's session has expired (see MaintenanceDatabase.renew_session)."""
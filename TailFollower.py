@@ -0,0 +1,151 @@
+import time
+import traceback
+from MaintenanceDatabase import MaintenanceDatabase
+from Log import Log
+
+
+class TailFollower:
+    def __init__(self, database: MaintenanceDatabase, log: Log, item_type: str, prefix: str = "",
+                 gap_tolerance: int = 5):
+        """Finds the newest work request or work order on the maintenance site and scrapes only the items created since
+        the newest one stored in the database.
+
+        The newest item is found with a galloping search followed by a binary search, so only a logarithmic number of
+        items are scraped as probes. Since ids can have gaps (ids with no item), an id only counts as past the end if
+        none of the next gap_tolerance ids exist either.
+
+        Args:
+            database: Database to read stored items from and write new items to
+            log: Log object to record progress to
+            item_type: Type of item to follow (either 'request' or 'order')
+            prefix: Prefix to append to work order numbers (ignore for requests)
+            gap_tolerance: Number of consecutive missing ids that mark the end of the id sequence
+        """
+        self.database = database
+        self.log = log
+        self.item_type = item_type
+        self.prefix = prefix
+        self.gap_tolerance = gap_tolerance
+        self.probes = {}  # Integer id -> scraped item (probed items are written instead of being scraped again)
+
+    def get_item_id(self, number: int) -> int | str:
+        """Convert an integer id to a request id or order number (WITH PREFIX).
+
+        Args:
+            number: Integer id
+
+        Returns:
+            The request id or order number
+        """
+        return number if self.item_type == 'request' else self.prefix + str(number)
+
+    def probe(self, number: int) -> bool:
+        """Scrape a single id and check if an item exists there.
+
+        Args:
+            number: Integer id to scrape
+
+        Returns:
+            True if a (non-empty) item exists at the id, False otherwise (or if the page failed to load)
+        """
+        if number not in self.probes:
+            try:
+                self.probes[number] = self.database.scrape_item(self.item_type, self.get_item_id(number))
+            except Exception as e:  # Not kept as a probe so the id is never recorded as missing
+                self.log.add(f"failed to probe {self.item_type} [{self.get_item_id(number)}]", level='warning')
+                self.log.add_quiet(f"{traceback.format_exc()}\n", level='error')
+                return False
+        return not self.probes[number].is_empty()
+
+    def exists_at_or_after(self, number: int) -> bool:
+        """Check if an item exists at an id or at any of the following gap_tolerance - 1 ids.
+
+        Args:
+            number: Integer id to start checking at
+
+        Returns:
+            True if an item exists in the window, False otherwise
+        """
+        return any(self.probe(n) for n in range(number, number + self.gap_tolerance))
+
+    def find_newest(self, lower: int) -> int:
+        """Find the highest id that holds an item.
+
+        Args:
+            lower: An id known to hold an item (or 0)
+
+        Returns:
+            The highest id that holds an item (or lower if no newer item exists)
+        """
+        # Galloping search: double the step until an id past the end is found
+        step = 1
+        while self.exists_at_or_after(lower + step):
+            lower += step
+            step *= 2
+        upper = lower + step  # Past the end
+
+        # Binary search between the last id known to exist and the first id known to be past the end
+        while upper - lower > 1:
+            middle = (lower + upper) // 2
+            if self.exists_at_or_after(middle):
+                lower = middle
+            else:
+                upper = middle
+
+        # The window check may have found an item slightly after lower
+        while self.exists_at_or_after(lower + 1):
+            lower += 1
+        self.log.add(f"newest {self.item_type} is [{self.get_item_id(lower)}] (found with [{len(self.probes)}] "
+                     f"probes)")
+        return lower
+
+    def follow_once(self) -> int:
+        """Scrape and write every item created since the newest one stored in the database.
+
+        Returns:
+            The number of new ids scraped
+        """
+        self.probes = {}
+        if self.item_type == 'request':
+            last_stored = self.database.get_highest_request_id()
+        else:
+            last_stored = self.database.get_highest_order_number(self.prefix)
+        newest = self.find_newest(last_stored)
+
+        # Write probed items directly and scrape the rest
+        new_numbers = range(last_stored + 1, newest + 1)
+        unprobed_ids = [self.get_item_id(n) for n in new_numbers if n not in self.probes]
+        if self.item_type == 'request':
+            missing_ids = set(self.database.get_missing_request_ids(new_numbers))
+            for number in new_numbers:
+                if number in self.probes and number in missing_ids:
+                    self.database.insert_request(self.probes[number])
+            self.database.add_requests(unprobed_ids)
+        else:
+            missing_ids = set(self.database.get_missing_order_numbers(self.get_item_id(n) for n in new_numbers))
+            for number in new_numbers:
+                if number in self.probes and self.get_item_id(number) in missing_ids:
+                    self.database.insert_order(self.probes[number])
+            self.database.add_orders(unprobed_ids)
+
+        self.log.add(f"scraped [{len(new_numbers)}] new {self.item_type} ids "
+                     f"([{self.get_item_id(last_stored + 1)}] to [{self.get_item_id(newest)}])")
+        return len(new_numbers)
+
+    @staticmethod
+    def follow(followers: list['TailFollower'], interval: float, log: Log) -> None:
+        """Repeatedly scrape new items for each follower, waiting between rounds, until interrupted (CTRL+C).
+
+        Args:
+            followers: TailFollowers to run every round
+            interval: Time (in seconds) to wait between rounds
+            log: Log object to record progress to
+        """
+        try:
+            while True:
+                for follower in followers:
+                    follower.follow_once()
+                log.add(f"waiting [{interval / 60:.0f}] minutes until the next check (CTRL+C to stop)")
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            log.add("stopped following new items")
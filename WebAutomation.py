@@ -1,16 +1,37 @@
+import os
 from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
+from Metrics import Metrics
+from PageArchive import PageArchive
+from PageLoadError import PageLoadError
+from SessionExpiredError import SessionExpiredError
 from User import User
-from WorkOrder import WorkOrder
-from WorkOrderRequest import WorkOrderRequest
+from PageParser import PageParser
 
 
 class WebAutomation:
     """Contains utility functions for Chrome automation using Selenium."""
 
+    # Maintenance site and its Calnet login page (overridden by the environment to use a local MockSite instead)
+    site_url = os.environ.get('BWORK_SITE_URL', "https://maintenance.housing.berkeley.edu/")
+    login_url = os.environ.get('BWORK_LOGIN_URL', "https://auth.berkeley.edu/cas/login?service="
+                                                  "https://maintenance.housing.berkeley.edu/cas2/login.aspx")
+
+    @staticmethod
+    def set_site(site_url: str, login_url: str) -> None:
+        """Point all scrapers at a different maintenance site (e.g. a local MockSite for benchmarks), including those
+        of processes started later.
+
+        Args:
+            site_url: URL of the root of the maintenance site (ending in '/')
+            login_url: URL of the Calnet login page that leads to the maintenance site
+        """
+        WebAutomation.site_url = os.environ['BWORK_SITE_URL'] = site_url
+        WebAutomation.login_url = os.environ['BWORK_LOGIN_URL'] = login_url
+
     @staticmethod
     def login_calnet(driver: WebDriver, user: User, duo_wait_time: float = 5.0) -> None:
         """Complete the Calnet login and Duo Mobile confirmation for UC Berkeley's maintenance site.
@@ -23,8 +44,7 @@ class WebAutomation:
         Returns:
             True if login is successful, False otherwise
         """
-        url = "https://auth.berkeley.edu/cas/login?service=https://maintenance.housing.berkeley.edu/cas2/login.aspx"
-        driver.get(url)
+        driver.get(WebAutomation.login_url)
 
         if driver.title == "CAS - Central Authentication Service":
             # Prompt user for Calnet login credentials
@@ -51,15 +71,31 @@ class WebAutomation:
             driver: Selenium webdriver instance for automated selection
             item_value: Value of item to be selected from dropdown menu ('WR' for Work Request, 'WO' for Work Order)
         """
-        try:  # Wait for the sidebar to load
-            driver.switch_to.default_content()
-            WebDriverWait(driver, 10).until(EC.frame_to_be_available_and_switch_to_it((By.NAME, "botleft")))
-        except:
-            print("frame 'botleft' could not be found or switched to")
+        with Metrics.span('select_item'):
+            try:  # Wait for the sidebar to load
+                driver.switch_to.default_content()
+                WebDriverWait(driver, 10).until(EC.frame_to_be_available_and_switch_to_it((By.NAME, "botleft")))
+            except:
+                WebAutomation.check_session(driver)
+                print("frame 'botleft' could not be found or switched to")
+
+            # Select item from dropdown menu
+            dropdown_select = Select(driver.find_element(By.XPATH, "//select[@name='Search']"))
+            dropdown_select.select_by_value(item_value)
+
+    @staticmethod
+    def check_session(driver: WebDriver) -> None:
+        """Check that the browser is still logged into the maintenance site (in a single round trip).
+
+        Args:
+            driver: Selenium webdriver to check
 
-        # Select item from dropdown menu
-        dropdown_select = Select(driver.find_element(By.XPATH, "//select[@name='Search']"))
-        dropdown_select.select_by_value(item_value)
+        Raises:
+            SessionExpiredError if the browser was sent to the Calnet login page or the Duo Mobile confirmation
+        """
+        driver.switch_to.default_content()
+        if driver.title in PageParser.login_titles:
+            raise SessionExpiredError(f"redirected to [{driver.title}]")
 
     @staticmethod
     def search_item(driver: WebDriver, query: str) -> None:
@@ -69,20 +105,38 @@ class WebAutomation:
             driver: Selenium webdriver instance for automated search
             query: Work order number or work request id
         """
-        search_box = driver.find_element(By.NAME, "WorkOrderNumber")
-        search_box.clear()
-        search_box.send_keys(query)
+        with Metrics.span('search_item'):
+            search_box = driver.find_element(By.NAME, "WorkOrderNumber")
+            search_box.clear()
+            search_box.send_keys(query)
 
-        submit_button = driver.find_element(By.XPATH, "//input[@src='images/arrowbutton.gif']")
-        submit_button.click()
+            submit_button = driver.find_element(By.XPATH, "//input[@src='images/arrowbutton.gif']")
+            submit_button.click()
 
-        driver.switch_to.default_content()
-        driver.switch_to.frame("botright")
+            driver.switch_to.default_content()
+            driver.switch_to.frame("botright")
 
     @staticmethod
-    def find_xpath_helper(driver: WebDriver, xpath: str, wait_time: float = 3.0) -> str | None:
+    def get_detail_url(driver: WebDriver, item_value: str, query: str) -> str:
+        """Search for an item through the sidebar and return the URL of the page loaded into the 'botright' frame.
+
+        Args:
+            driver: Selenium webdriver instance to search with
+            item_value: Value of item to be selected from dropdown menu ('WR' for Work Request, 'WO' for Work Order)
+            query: Work order number or work request id to search for
+
+        Returns:
+            The URL of the detail page for the searched item
+        """
+        WebAutomation.select_item(driver, item_value)
+        WebAutomation.search_item(driver, query)
+        return driver.execute_script("return window.location.href;")
+
+    @staticmethod
+    def find_xpath_helper(driver: WebDriver, xpath: str, wait_time: float = 1.0) -> str | None:
         """Find an element by xpath, convert to string, strip spaces commas.
-        NOT intended for use outside WebAutomation.scrape_request()!
+        Each call is a separate WebDriver round trip (and a missing element costs the full wait time), so this is only
+        used to benchmark WebAutomation.extract_fields_per_element against single-round-trip extraction.
 
         Args:
             driver: Selenium webdriver to find element in
@@ -93,136 +147,113 @@ class WebAutomation:
             String value of element (commas and spaces are stripped)
         """
         try:
-            return WebDriverWait(driver, 1).until(EC.presence_of_element_located((By.XPATH, xpath))).text.strip(", ")
+            element = WebDriverWait(driver, wait_time).until(EC.presence_of_element_located((By.XPATH, xpath)))
+            return element.text.strip(", ")
         except Exception as e:
             print(f"failed to find element at XPATH: '{xpath}':")
             print(e)
 
     @staticmethod
-    def scrape_request(driver: WebDriver, request_id: int) -> WorkOrderRequest:
-        """Submit a search for a single work order request.
+    def extract_fields_per_element(driver: WebDriver, fields: dict[str, str]) -> dict[str, str | None]:
+        """Extract fields from the current page with one WebDriver lookup per field (the original extraction method).
 
         Args:
-            driver: Selenium webdriver to automate search for
-            request_id: id of the request to search for
+            driver: Selenium webdriver to extract fields from
+            fields: Field table mapping field names to XPaths (see PageParser)
 
         Returns:
-            WorkOrderRequest object containing data about the work request
+            Dictionary mapping each field name to its value
         """
-        WebAutomation.search_item(driver, str(request_id))
-
-        request = WorkOrderRequest(request_id)
-
-        # Scrape data
-        request_room = driver.find_element(By.XPATH, "//tr[3]/td[1]/p/font/b").text
-        if request_room.startswith("for "):
-            request_room = request_room[4:]
-        request.room = request_room
-        request.status = WebAutomation.find_xpath_helper(driver, "//tr[3]/td[2]/strong/font")
-        request.building = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[2]/td[2]")
-        request.tag = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[3]/td[2]")
-        request.accept_date = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[4]/td[2]")
-        request.reject_date = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[5]/td[2]")
-        request.reject_reason = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[6]/td[2]")
-        request.location = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[2]/td[4]")
-        request.item_description = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[3]/td[4]")
-        request.work_order_num = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[4]/td[4]")
-        request.area_description = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[5]/td[4]")
-        request.requested_action = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[8]/td[2]")
-
-        return request
+        return {field: WebAutomation.find_xpath_helper(driver, xpath) for field, xpath in fields.items()}
 
     @staticmethod
-    def get_page_layout(driver: WebDriver, order_number: str) -> int:
-        """Determine the page layout type of the current work order.
-        (Work order pages can have one of two different layouts which changes the XPATHs of data.)
+    def get_page_source(driver: WebDriver, wait_time: float = 10.0, wait_for_load: bool = True) -> str:
+        """Wait for the current frame to finish loading and return its HTML (a single round trip if the page has
+        already loaded).
 
         Args:
-            driver: Selenium webdriver instance to search with
-            order_number: Work order number to search for
+            driver: Selenium webdriver to read the page from
+            wait_time: Maximum time to wait (in seconds) for the page to finish loading
+            wait_for_load: False to return the HTML as soon as it is parsed (without waiting for images, stylesheets
+                and other resources)
+
         Returns:
-            1 if the page layout corresponds to the first scrape_order clause
-            2 if the page layout corresponds to the second scrape_order clause
-        Raises:
-            Exception if the page layout cannot be determined
+            The HTML of the current frame
         """
-        try:
-            if WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[6]/td[1]") == 'Facility:':
-                return 1  # Layout 1
-            elif WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[4]/td[1]") == 'Facility:':
-                return 2  # Layout 2
-            else:
-                raise Exception(f"Failed to determine page layout for work order [{order_number}]")
-        except Exception as e1:
-            try:
-                if WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[4]/td[1]") == 'Facility:':
-                    return 2  # Layout 2
-                else:
-                    raise Exception(f"Failed to determine page layout for work order [{order_number}]")
-            except Exception as e2:
-                print(f"Failed to determine page layout for work order [{order_number}]:")
-                print(e2)
+        ready = "document.readyState === 'complete'" if wait_for_load else "document.readyState !== 'loading'"
+        script = f"return {ready} ? '<!DOCTYPE html>' + document.documentElement.outerHTML : null;"
+        with Metrics.span('page_source'):
+            return WebDriverWait(driver, wait_time).until(lambda d: d.execute_script(script))
 
     @staticmethod
-    def scrape_order(driver: WebDriver, order_number: str) -> WorkOrder:
-        """Submit a search for a single work order.
+    def get_page(driver: WebDriver, wait_time: float = 10.0, wait_for_load: bool = True) -> tuple[int | None, str]:
+        """Wait for the current frame to finish loading and return its HTTP status and HTML (a single round trip if
+        the page has already loaded).
+
+        Args:
+            driver: Selenium webdriver to read the page from
+            wait_time: Maximum time to wait (in seconds) for the page to finish loading
+            wait_for_load: False to return the HTML as soon as it is parsed (without waiting for images, stylesheets
+                and other resources)
+
+        Returns:
+            The HTTP status of the page (None if the browser does not report it) and its HTML
+        """
+        loading = "document.readyState !== 'complete'" if wait_for_load else "document.readyState === 'loading'"
+        script = (f"if ({loading}) return null;"
+                  "const navigation = performance.getEntriesByType('navigation')[0];"
+                  "return [navigation && navigation.responseStatus ? navigation.responseStatus : null,"
+                  "'<!DOCTYPE html>' + document.documentElement.outerHTML];")
+        with Metrics.span('page_source'):
+            status, page_source = WebDriverWait(driver, wait_time).until(lambda d: d.execute_script(script))
+        return status, page_source
+
+    @staticmethod
+    def load_page(driver: WebDriver, url: str, wait_time: float = 10.0,
+                  wait_for_load: bool = True) -> tuple[int | None, str]:
+        """Open a page in the top-level window (outside of the site's frameset) and return its HTTP status and HTML.
+        Apart from the navigation itself, this is a single round trip.
+
+        Args:
+            driver: Selenium webdriver to open the page with
+            url: URL of the page
+            wait_time: Maximum time to wait (in seconds) for the page to finish loading
+            wait_for_load: False to return the HTML as soon as it is parsed (without waiting for images, stylesheets
+                and other resources)
+
+        Returns:
+            The HTTP status of the page (None if the browser does not report it) and its HTML
+        """
+        with Metrics.span('open_page'):
+            driver.get(url)
+        return WebAutomation.get_page(driver, wait_time, wait_for_load)
+
+    @staticmethod
+    def fetch_item(driver: WebDriver, item_type: str, item_id: int | str, archive: PageArchive = None,
+                   wait_for_load: bool = True) -> str:
+        """Submit a search for a single work order request or work order and return the raw HTML of its page (without
+        parsing it).
 
         Args:
             driver: Selenium webdriver to automate search for
-            order_number: id of the request to search for
+            item_type: Type of item to search for (either 'request' or 'order')
+            item_id: id of the request or order number of the order to search for
+            archive: Archive to store the raw page in (if any)
+            wait_for_load: False to return the HTML as soon as it is parsed (see WebAutomation.get_page_source)
 
         Returns:
-            WorkOrder object containing data about the work order
+            The HTML of the item's page
+
+        Raises:
+            SessionExpiredError if the site served a login page instead of the item's page
+            PageLoadError if the site answered with a server error (HTTP 500 or above)
         """
-        WebAutomation.search_item(driver, order_number)
-        order = WorkOrder(order_number)
-        order.order_number = order_number
-
-        page_layout = WebAutomation.get_page_layout(driver, order_number)
-        # Scrape data
-        if page_layout == 1:
-            order.facility = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[6]/td[2]")
-            order.building = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[7]/td[2]")
-            order.location_id = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[8]/td[2]")
-            order.priority = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[9]/td[2]")
-            order.request_date = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[10]/td[2]")
-            order.schedule_date = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[11]/td[2]")
-            order.work_status = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[12]/td[2]")
-            order.date_closed = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[13]/td[2]")
-            order.main_charge_account = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[14]/td[2]")
-            order.task_code = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[15]/td[2]/font")
-            order.reference_number = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[6]/td[4]")
-            order.tag_number = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[8]/td[4]")
-            order.item_description = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[9]/td[4]")
-            order.request_time = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[10]/td[4]")
-            order.date_last_posted = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[11]/td[4]")
-            order.trade = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[12]/td[4]")
-            order.contractor_name = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[13]/td[4]")
-            order.est_completion_date = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[14]/td[4]")
-            order.task_description = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[15]/td[4]")
-            order.requested_action = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[17]/td[2]")
-            order.corrective_action = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[18]/td[2]")
-        elif page_layout == 2:
-            order.facility = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[4]/td[2]")
-            order.building = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[5]/td[2]")
-            order.location_id = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[6]/td[2]")
-            order.priority = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[7]/td[2]")
-            order.request_date = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[8]/td[2]")
-            order.schedule_date = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[9]/td[2]")
-            order.work_status = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[10]/td[2]")
-            order.date_closed = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[11]/td[2]")
-            order.main_charge_account = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[12]/td[2]")
-            order.task_code = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[13]/td[2]")
-            order.reference_number = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[4]/td[4]/p")
-            order.tag_number = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[6]/td[4]")
-            order.item_description = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[7]/td[4]")
-            order.request_time = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[8]/td[4]")
-            order.date_last_posted = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[9]/td[4]")
-            order.trade = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[10]/td[4]")
-            order.contractor_name = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[11]/td[4]")
-            order.est_completion_date = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[12]/td[4]")
-            order.task_description = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[13]/td[4]")
-            order.requested_action = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[15]/td[2]")
-            order.corrective_action = WebAutomation.find_xpath_helper(driver, "/html/body/table/tbody/tr[16]/td[2]")
-
-        return order
+        WebAutomation.search_item(driver, str(item_id))
+        status, page_source = WebAutomation.get_page(driver, wait_for_load=wait_for_load)
+        if status is not None and status >= 500:
+            raise PageLoadError(f"the page of {item_type} [{item_id}] failed to load (HTTP {status})")
+        if PageParser.is_logged_out(page_source):
+            raise SessionExpiredError(f"a login page was served instead of {item_type} [{item_id}]")
+        if archive is not None:
+            archive.add(item_type, item_id, page_source)
+        return page_source
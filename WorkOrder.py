@@ -1,29 +1,50 @@
+from datetime import datetime
+
+
 class WorkOrder:
+    __slots__ = ("order_number", "facility", "building", "location_id", "priority", "request_date", "schedule_date",
+                 "work_status", "date_closed", "main_charge_account", "task_code", "reference_number", "tag_number",
+                 "item_description", "request_time", "date_last_posted", "trade", "contractor_name",
+                 "est_completion_date", "task_description", "requested_action", "corrective_action", "unparsed")
+
+    # Types of the fields that are not text (converted once when scraped, see FieldParser)
+    field_types = {"priority": int, "request_date": datetime, "schedule_date": datetime, "date_closed": datetime,
+                   "date_last_posted": datetime, "est_completion_date": datetime}
+
     def __init__(self, order_number: str):
         """A work order containing all relevant data.
 
         Args:
             order_number: Work order number for this work order (ex. 'HM-463785').
         """
-        self.order_number = order_number
-        self.facility = None
-        self.building = None
-        self.location_id = None
-        self.priority = None
-        self.request_date = None
-        self.schedule_date = None
-        self.work_status = None
-        self.date_closed = None
-        self.main_charge_account = None
-        self.task_code = None
-        self.reference_number = None
-        self.tag_number = None
-        self.item_description = None
-        self.request_time = None
-        self.date_last_posted = None
-        self.trade = None
-        self.contractor_name = None
-        self.est_completion_date = None
-        self.task_description = None
-        self.requested_action = None
-        self.corrective_action = None
+        self.order_number: str = order_number
+        self.facility: str | None = None
+        self.building: str | None = None
+        self.location_id: str | None = None
+        self.priority: int | None = None
+        self.request_date: datetime | None = None
+        self.schedule_date: datetime | None = None
+        self.work_status: str | None = None
+        self.date_closed: datetime | None = None
+        self.main_charge_account: str | None = None
+        self.task_code: str | None = None
+        self.reference_number: str | None = None
+        self.tag_number: str | None = None
+        self.item_description: str | None = None
+        self.request_time: str | None = None
+        self.date_last_posted: datetime | None = None
+        self.trade: str | None = None
+        self.contractor_name: str | None = None
+        self.est_completion_date: datetime | None = None
+        self.task_description: str | None = None
+        self.requested_action: str | None = None
+        self.corrective_action: str | None = None
+        self.unparsed: dict[str, str] = {}  # Raw text of typed fields that could not be parsed (see FieldParser)
+
+    def is_empty(self) -> bool:
+        """Check if this work order contains no data other than its order number (e.g. because it does not exist).
+
+        Returns:
+            True if every datapoint other than the order number is missing, False otherwise
+        """
+        return not any(getattr(self, name) for name in WorkOrder.__slots__ if name != 'order_number')
@@ -1,23 +1,41 @@
+from datetime import datetime
+
+
 class WorkOrderRequest:
+    __slots__ = ("id", "room", "status", "building", "tag", "accept_date", "reject_date", "reject_reason", "location",
+                 "item_description", "work_order_num", "area_description", "requested_action", "unparsed")
+
+    # Types of the fields that are not text (converted once when scraped, see FieldParser)
+    field_types = {"accept_date": datetime, "reject_date": datetime}
+
     def __init__(self, request_id: int):
         """A work order request containing all data pertaining to the request.
 
         Args:
             request_id: id of this work order request (ex. 379422)
         """
-        self.id = request_id
-        self.room = None
-        self.status = None
-        self.building = None
-        self.tag = None
-        self.accept_date = None
-        self.reject_date = None
-        self.reject_reason = None
-        self.location = None
-        self.item_description = None
-        self.work_order_num = None
-        self.area_description = None
-        self.requested_action = None
+        self.id: int = int(request_id)
+        self.room: str | None = None
+        self.status: str | None = None
+        self.building: str | None = None
+        self.tag: str | None = None
+        self.accept_date: datetime | None = None
+        self.reject_date: datetime | None = None
+        self.reject_reason: str | None = None
+        self.location: str | None = None
+        self.item_description: str | None = None
+        self.work_order_num: str | None = None
+        self.area_description: str | None = None
+        self.requested_action: str | None = None
+        self.unparsed: dict[str, str] = {}  # Raw text of typed fields that could not be parsed (see FieldParser)
+
+    def is_empty(self) -> bool:
+        """Check if this request contains no data other than its id (e.g. because it does not exist).
+
+        Returns:
+            True if every datapoint other than the id is missing, False otherwise
+        """
+        return not any(getattr(self, name) for name in WorkOrderRequest.__slots__ if name != 'id')
 
     def to_list(self) -> list:
         """Convert this request into an ordered list of all datapoints.
@@ -0,0 +1,156 @@
+import math
+import multiprocessing
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Callable
+from Log import Log
+
+
+class WorkQueue:
+    def __init__(self, item_ids: list, num_workers: int, log: Log, target_chunk_time: float = 10.0,
+                 initial_chunk_size: int = 5, max_chunk_size: int = 500, tasks: multiprocessing.Queue = None,
+                 reports: multiprocessing.Queue = None):
+        """A shared queue that hands out small chunks of item ids to whichever worker process is free.
+
+        Chunk sizes adapt to the measured per-item latency so that each chunk takes roughly target_chunk_time seconds,
+        and shrink towards the end of a run so that all workers finish at about the same time.
+
+        Args:
+            item_ids: List of request ids or order numbers to distribute
+            num_workers: Number of worker processes that will take chunks from this queue
+            log: Log object to record progress to
+            target_chunk_time: Time (in seconds) a single chunk should take to scrape
+            initial_chunk_size: Size of chunks handed out before any latency has been measured
+            max_chunk_size: Maximum size of a single chunk
+            tasks: Existing task queue to feed (e.g. of a ScraperPool), or None to create a new one
+            reports: Existing report queue to collect reports from (e.g. of a ScraperPool), or None to create a new one
+        """
+        self.item_ids = list(item_ids)
+        self.num_workers = num_workers
+        self.log = log
+        self.target_chunk_time = target_chunk_time
+        self.initial_chunk_size = initial_chunk_size
+        self.max_chunk_size = max_chunk_size
+
+        # Bounded so that chunks are sized with a recent latency estimate just before a worker needs them
+        self.tasks = tasks if tasks is not None else multiprocessing.Queue(maxsize=num_workers)
+        # (worker id, number of items, elapsed seconds) for every chunk
+        self.reports = reports if reports is not None else multiprocessing.Queue()
+
+        self.latency = None  # Moving average of per-item latency (in seconds) across all workers
+        self.worker_stats = defaultdict(lambda: [0, 0.0])  # Worker id -> [items completed, busy seconds]
+        self.finished_workers = set()  # Ids of workers that finished (took a stop signal)
+        self.stopped = False
+
+    def get_chunk_size(self, remaining: int) -> int:
+        """Get the size of the next chunk to hand out.
+
+        Args:
+            remaining: Number of item ids that have not been handed out yet
+
+        Returns:
+            The number of item ids to put in the next chunk
+        """
+        if self.latency is None:
+            chunk_size = self.initial_chunk_size
+        else:
+            chunk_size = int(self.target_chunk_time / max(self.latency, 1e-6))
+
+        # Never hand out more than an even share of the remaining items (keeps the tail of the run balanced)
+        fair_share = math.ceil(remaining / self.num_workers)
+        return max(1, min(chunk_size, fair_share, self.max_chunk_size))
+
+    def feed(self) -> None:
+        """Put chunks of item ids on the task queue until all ids are handed out (then one stop signal per worker)."""
+        position = 0
+        while position < len(self.item_ids) and not self.stopped:
+            chunk_size = self.get_chunk_size(len(self.item_ids) - position)
+            chunk = self.item_ids[position:position + chunk_size]
+            if self.put(chunk):
+                position += chunk_size
+
+        for _ in range(self.num_workers):
+            while not self.stopped and not self.put(None):
+                pass
+
+    def put(self, chunk: list | None) -> bool:
+        """Put a chunk on the task queue (waiting up to one second for a free slot).
+
+        Args:
+            chunk: List of item ids or None to signal a worker to stop
+
+        Returns:
+            True if the chunk was queued, False if the queue stayed full
+        """
+        try:
+            self.tasks.put(chunk, timeout=1.0)
+            return True
+        except queue.Full:
+            return False
+
+    def run(self, processes: list[multiprocessing.Process]) -> None:
+        """Feed chunks to already-started worker processes and collect their reports until all of them finish.
+
+        Args:
+            processes: The worker processes taking chunks from this queue
+        """
+        feeder = threading.Thread(target=self.feed, daemon=True)
+        feeder.start()
+        try:
+            while len(self.finished_workers) < len(processes):
+                try:
+                    worker_id, num_items, elapsed = self.reports.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes):
+                        break  # All workers exited (e.g. crashed or interrupted) without reporting
+                    crashed = sum(process.exitcode not in (None, 0) for process in processes)
+                    if len(self.finished_workers) + crashed >= len(processes):
+                        break  # Every worker either finished or crashed without reporting
+                    continue
+
+                if num_items is None:  # Worker finished
+                    self.finished_workers.add(worker_id)
+                    continue
+
+                self.worker_stats[worker_id][0] += num_items
+                self.worker_stats[worker_id][1] += elapsed
+                if num_items > 0:
+                    chunk_latency = elapsed / num_items
+                    self.latency = chunk_latency if self.latency is None else 0.8 * self.latency + 0.2 * chunk_latency
+        finally:
+            self.stopped = True
+            feeder.join()
+
+    def print_summary(self, elapsed: float) -> None:
+        """Log the throughput of each worker and of the whole run.
+
+        Args:
+            elapsed: Wall time of the whole run (in seconds)
+        """
+        total_items = 0
+        for worker_id in sorted(self.worker_stats):
+            items, busy_time = self.worker_stats[worker_id]
+            total_items += items
+            self.log.add(f"worker [{worker_id}]: scraped [{items}] items in [{busy_time:.1f}] seconds "
+                         f"([{items / max(busy_time, 1e-9):.2f}] items/s)")
+        self.log.add(f"all workers: scraped [{total_items}] items in [{elapsed:.1f}] seconds "
+                     f"([{total_items / max(elapsed, 1e-9):.2f}] items/s)")
+
+    @staticmethod
+    def work(tasks: multiprocessing.Queue, reports: multiprocessing.Queue, worker_id: int,
+             process_chunk: Callable[[list], None]) -> None:
+        """Take and process chunks from a WorkQueue until signalled to stop (runs inside a worker process).
+
+        Args:
+            tasks: The task queue of the WorkQueue
+            reports: The report queue of the WorkQueue
+            worker_id: Unique id of this worker
+            process_chunk: Function that scrapes and inserts a chunk of item ids
+        """
+        while (chunk := tasks.get()) is not None:
+            start = time.perf_counter()
+            process_chunk(chunk)
+            reports.put((worker_id, len(chunk), time.perf_counter() - start))
+        reports.put((worker_id, None, None))
@@ -0,0 +1,83 @@
+import unittest
+from datetime import datetime
+import requests
+from HttpScraper import HttpScraper
+from MockSite import MockSite
+from SessionExpiredError import SessionExpiredError
+
+
+class TestHttpScraper(unittest.TestCase):
+    """Scrapes a local MockSite over HTTP (no browser needed). Run with: python -m pytest test_HttpScraper.py"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.site = MockSite(num_items=40, missing_rate=0.2, latency=0.0, jitter=0.0)
+        cls.site.start()
+        cls.missing_id = next(number for number in range(1, 41) if not cls.site.exists(number))
+        cls.odd_id = next(number for number in range(1, 41, 2) if cls.site.exists(number))
+        cls.even_id = next(number for number in range(2, 41, 2) if cls.site.exists(number))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.site.close()
+
+    def setUp(self):
+        self.scraper = HttpScraper(self.log_in(), f"{self.site.url}WorkRequest.aspx?RequestID={{}}",
+                                   f"{self.site.url}WorkOrder.aspx?WorkOrderNumber={{}}")
+
+    def tearDown(self):
+        self.scraper.close()
+
+    def log_in(self) -> list[dict]:
+        """Log into the mock site through its Calnet and Duo Mobile pages.
+
+        Returns:
+            The session cookies (in the format of Scraper.get_cookies)
+        """
+        session = requests.Session()
+        service = self.site.url + 'cas2/login.aspx'
+        session.post(self.site.url + 'cas/login', data={'service': service})
+        session.post(self.site.url + 'duo/trust', data={'service': service})
+        session.get(self.site.login_url)
+        cookies = [{'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain, 'path': cookie.path,
+                    'secure': cookie.secure} for cookie in session.cookies]
+        session.close()
+        return cookies
+
+    def test_request(self):
+        request = self.scraper.scrape_request(self.odd_id)
+        self.assertFalse(request.is_empty())
+        self.assertEqual(request.id, self.odd_id)
+        self.assertEqual(request.work_order_num, f"HM-{self.odd_id}")
+        self.assertIsInstance(request.accept_date, datetime)
+
+    def test_missing_request(self):
+        self.assertTrue(self.scraper.scrape_request(self.missing_id).is_empty())
+
+    def test_missing_order(self):
+        self.assertTrue(self.scraper.scrape_order(f"HM-{self.missing_id}").is_empty())
+
+    def test_order_layouts(self):
+        for number in (self.odd_id, self.even_id):  # Odd numbers use the first page layout, even ones the second
+            with self.subTest(number=number):
+                order = self.scraper.scrape_order(f"HM-{number}")
+                self.assertFalse(order.is_empty())
+                self.assertEqual(order.reference_number, str(number))
+                self.assertIsInstance(order.priority, int)
+                self.assertIsInstance(order.request_date, datetime)
+
+    def test_expired_session(self):
+        self.site.expire_sessions(calnet=True)
+        with self.assertRaises(SessionExpiredError):
+            self.scraper.scrape_request(self.odd_id)
+        with self.assertRaises(SessionExpiredError):
+            self.scraper.scrape_order(f"HM-{self.even_id}")
+
+    def test_no_session(self):
+        self.scraper.set_cookies([])
+        with self.assertRaises(SessionExpiredError):
+            self.scraper.scrape_request(self.odd_id)
+
+
+if __name__ == '__main__':
+    unittest.main()